@@ -1,18 +1,142 @@
 # makazi/admin.py
 from django.contrib import admin
-from .models import Scrape_MakaziListing, ContactMessage
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.forms.models import BaseModelFormSet, ModelChoiceField
+from django.utils.functional import cached_property
+from .models import Location, Scrape_MakaziListing, ContactMessage
+from .pagination import CachedCountPaginator
+from .ratings import set_reviews_approved
+from .search import search_queryset
+
+
+class OnlyChangeList(ChangeList):
+    """ChangeList that loads only the model admin's `list_only` columns"""
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.model_admin.list_only:
+            # The list_editable forms read their columns from these rows;
+            # deferred, each form would load them with a query of its own
+            queryset = queryset.only(*self.model_admin.list_only, *self.list_editable)
+        return queryset
+
+
+class LoadedRowChoiceField(ModelChoiceField):
+    """Hidden primary key field resolved from rows the formset already loaded"""
+
+    def __init__(self, rows, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = rows
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            key = self.queryset.model._meta.pk.to_python(value)
+        except ValidationError:
+            key = None
+        if key in self.rows:
+            return self.rows[key]
+        return super().to_python(value)
+
+
+class ChangeListFormSet(BaseModelFormSet):
+    """list_editable formset that checks the submitted primary keys against
+    the rows it loaded, instead of with one SELECT per row
+    """
+
+    @cached_property
+    def loaded_rows(self):
+        return {row.pk: row for row in self.get_queryset()}
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields.get(name)
+        if form.is_bound and type(field) is ModelChoiceField:
+            form.fields[name] = LoadedRowChoiceField(
+                self.loaded_rows, field.queryset, initial=field.initial,
+                required=False, widget=field.widget,
+            )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too large to count on every page load.
+
+    The filtered count is cached for a few minutes (pagination.cached_count)
+    and the unfiltered total is not counted at all. Rows load only the
+    `list_only` columns, including those of list_select_related objects
+    shown in the list, e.g. ('title', 'listing__title'), plus the
+    list_editable ones. Rows saved from list_editable are loaded whole
+    through get_queryset(), so save() sees every field.
+    """
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    list_only = ()
+
+    def get_changelist(self, request, **kwargs):
+        return OnlyChangeList
+
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs.setdefault('formset', ChangeListFormSet)
+        return super().get_changelist_formset(request, **kwargs)
+
+
+class AreaListFilter(admin.SimpleListFilter):
+    """Filter on the indexed `area` key, drilling down region -> district -> ward.
+
+    Lists the regions plus the ancestors and children of the selected
+    area, read from the Location table instead of the distinct free-text
+    locations of every row.
+    """
+    title = 'area'
+    parameter_name = 'area'
+
+    def lookups(self, request, model_admin):
+        selected = self.value() or ''
+        parts = selected.split('/') if selected else []
+        ancestors = ['/'.join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+        nodes = Location.objects.filter(
+            Q(level='region') | Q(path__in=ancestors) | Q(parent__path=selected)
+        ).only('name', 'path')
+        return [(node.path, '\u2014 ' * node.path.count('/') + node.name) for node in nodes]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(area__in=Location.objects.subtree([self.value()]).values('id'))
+        return queryset
+
 
 @admin.register(Scrape_MakaziListing)
-class MakaziListingAdmin(admin.ModelAdmin):
+class MakaziListingAdmin(LargeTableAdmin):
     list_display = ('title', 'location', 'price', 'property_type', 'bedrooms', 'is_featured', 'is_verified', 'scraped_at')
-    list_filter = ('location', 'property_type', 'is_featured', 'is_verified', 'scraped_at')
+    list_only = list_display
+    list_filter = (AreaListFilter, 'property_type', 'is_featured', 'is_verified', 'is_available', 'scraped_at')
     search_fields = ('title', 'location', 'description')
     list_editable = ('is_featured', 'is_verified')
     list_per_page = 50
 
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index covers search_fields; avoids icontains scans of description
+        if not search_term.strip():
+            return queryset, False
+        return search_queryset(queryset, search_term), False
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'level', 'parent', 'path')
+    list_filter = ('level',)
+    search_fields = ('name', 'path')
+    raw_id_fields = ('parent',)
+
 @admin.register(ContactMessage)
-class ContactMessageAdmin(admin.ModelAdmin):
+class ContactMessageAdmin(LargeTableAdmin):
     list_display = ('name', 'email', 'phone', 'listing', 'is_read', 'created_at')
+    list_select_related = ('listing',)
+    list_only = ('name', 'email', 'phone', 'listing__title', 'is_read', 'created_at')
+    autocomplete_fields = ('listing',)
     list_filter = ('is_read', 'created_at')
     search_fields = ('name', 'email', 'phone', 'message')
     list_editable = ('is_read',)
@@ -106,7 +230,14 @@ class ContactMessageAdmin(admin.ModelAdmin):
 # makazi/admin.py
 from django.contrib import admin
 from django import forms
-from .models import Apartment, ApartmentBooking, ApartmentReview
+from .models import Apartment, ApartmentBooking, ApartmentImage, ApartmentReview
+
+
+class ApartmentImageInline(admin.TabularInline):
+    model = ApartmentImage
+    fields = ('image', 'position', 'width', 'height')
+    readonly_fields = ('width', 'height')
+    extra = 1
 
 class ApartmentAdminForm(forms.ModelForm):
     class Meta:
@@ -120,6 +251,7 @@ class ApartmentAdminForm(forms.ModelForm):
 @admin.register(Apartment)
 class ApartmentAdmin(admin.ModelAdmin):
     form = ApartmentAdminForm
+    inlines = [ApartmentImageInline]
     list_display = ['title', 'location', 'price_per_month', 'is_available', 'is_featured', 'created_at']
     list_filter = ['is_available', 'is_featured', 'is_verified', 'apartment_type', 'location']
     search_fields = ['title', 'location', 'description', 'owner_name']
@@ -138,9 +270,6 @@ class ApartmentAdmin(admin.ModelAdmin):
         ('Amenities', {
             'fields': ('amenities',)
         }),
-        ('Images', {
-            'fields': ('main_image', 'image_1', 'image_2', 'image_3', 'image_4')
-        }),
         ('Contact Information', {
             'fields': ('owner_name', 'owner_phone', 'owner_email')
         }),
@@ -165,8 +294,14 @@ class ApartmentAdmin(admin.ModelAdmin):
         return self.readonly_fields
 
 @admin.register(ApartmentBooking)
-class ApartmentBookingAdmin(admin.ModelAdmin):
+class ApartmentBookingAdmin(LargeTableAdmin):
     list_display = ['id', 'apartment', 'customer_name', 'check_in_date', 'duration_months', 'status', 'payment_status', 'booking_date']
+    list_select_related = ['apartment']
+    list_only = [
+        'customer_name', 'check_in_date', 'duration_months', 'status', 'payment_status', 'booking_date',
+        'apartment__title', 'apartment__location',
+    ]
+    autocomplete_fields = ['apartment']
     list_filter = ['status', 'payment_status', 'booking_date']
     search_fields = ['customer_name', 'customer_email', 'customer_phone', 'apartment__title']
     readonly_fields = ['booking_date', 'confirmation_date', 'cancellation_date', 'total_amount']
@@ -226,12 +361,13 @@ class ApartmentReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews']
     
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=True)
+        # Not queryset.update(): the apartment rating columns follow approvals
+        updated = set_reviews_approved(queryset, True)
         self.message_user(request, f'{updated} review(s) approved successfully.')
     approve_reviews.short_description = "Approve selected reviews"
     
     def disapprove_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=False)
+        updated = set_reviews_approved(queryset, False)
         self.message_user(request, f'{updated} review(s) disapproved successfully.')
     disapprove_reviews.short_description = "Disapprove selected reviews"
 
@@ -248,11 +384,19 @@ class ApartmentReviewAdmin(admin.ModelAdmin):
 
 
     from django.contrib import admin
-from .models import Hostel, HostelBooking, HostelReview
+from .models import Hostel, HostelBooking, HostelImage, HostelReview
+
+
+class HostelImageInline(admin.TabularInline):
+    model = HostelImage
+    fields = ('image', 'position', 'width', 'height')
+    readonly_fields = ('width', 'height')
+    extra = 1
 
 
 @admin.register(Hostel)
 class HostelAdmin(admin.ModelAdmin):
+    inlines = [HostelImageInline]
     list_display = (
         'name', 'university', 'location',
         'hostel_type', 'gender_allowed',
@@ -266,7 +410,8 @@ class HostelAdmin(admin.ModelAdmin):
         'is_verified', 'location', 'university'
     )
     search_fields = ('name', 'university', 'location', 'warden_name')
-    readonly_fields = ('created_at', 'updated_at')
+    # Counted from confirmed bookings (reconcile_occupancy fixes drift)
+    readonly_fields = ('current_occupancy', 'available_rooms', 'created_at', 'updated_at')
     ordering = ('-created_at',)
     filter_horizontal = ()
     fieldsets = (
@@ -303,11 +448,8 @@ class HostelAdmin(admin.ModelAdmin):
                 'is_available', 'is_featured', 'is_verified'
             )
         }),
-        ('Images', {
-            'fields': (
-                'main_image', 'image_1',
-                'image_2', 'image_3', 'image_4'
-            )
+        ('Location', {
+            'fields': ('latitude', 'longitude')
         }),
         ('Dates', {
             'fields': ('created_at', 'updated_at')
@@ -316,13 +458,22 @@ class HostelAdmin(admin.ModelAdmin):
 
 
 @admin.register(HostelBooking)
-class HostelBookingAdmin(admin.ModelAdmin):
+class HostelBookingAdmin(LargeTableAdmin):
     list_display = (
         'id', 'student_name', 'registration_number',
         'hostel', 'booking_type', 'status',
         'total_amount', 'amount_paid', 'balance',
         'payment_status', 'booking_date'
     )
+    list_select_related = ('hostel',)
+    list_only = (
+        'student_name', 'registration_number',
+        'booking_type', 'status',
+        'total_amount', 'amount_paid', 'balance',
+        'payment_status', 'booking_date',
+        'hostel__name', 'hostel__university'
+    )
+    autocomplete_fields = ('hostel', 'student')
     list_filter = (
         'status', 'payment_status',
         'booking_type', 'academic_year', 'semester'
@@ -403,3 +554,16 @@ class HostelReviewAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
+    actions = ['approve_reviews', 'disapprove_reviews']
+
+    def approve_reviews(self, request, queryset):
+        # Not queryset.update(): the hostel rating columns follow approvals
+        updated = set_reviews_approved(queryset, True)
+        self.message_user(request, f'{updated} review(s) approved successfully.')
+    approve_reviews.short_description = "Approve selected reviews"
+
+    def disapprove_reviews(self, request, queryset):
+        updated = set_reviews_approved(queryset, False)
+        self.message_user(request, f'{updated} review(s) disapproved successfully.')
+    disapprove_reviews.short_description = "Disapprove selected reviews"
+
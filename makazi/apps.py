@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MakaziConfig(AppConfig):
     name = 'makazi'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,333 @@
+# makazi/autocomplete.py
+import bisect
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+
+from .models import Apartment, Hostel, Location, Scrape_MakaziListing
+from .search import tokenize
+
+
+logger = logging.getLogger('makazi.autocomplete')
+
+
+# Seconds an index is served before checking whether the data changed.
+# Only changes to the fields below bump the autocomplete version, which
+# makes every process rebuild its index in a worker thread.
+AUTOCOMPLETE_REFRESH = getattr(settings, 'AUTOCOMPLETE_REFRESH', 30)
+
+# Fields the suggestion phrases are made of, per model
+INDEXED_FIELDS = {
+    Scrape_MakaziListing: ['title', 'property_type', 'area', 'is_available'],
+    Apartment: ['title', 'apartment_type', 'area', 'is_available'],
+    Hostel: ['name', 'university', 'area', 'is_available'],
+}
+
+VERSION_KEY = 'makazi:autocomplete:version'
+
+# Locations first: they are what people type most often
+KIND_BOOST = {
+    'location': 1.0,
+    'university': 0.8,
+    'property_type': 0.6,
+    'title': 0.0,
+}
+
+MAX_PREFIX_TOKENS = 30
+MAX_ENTRIES_PER_TOKEN = 200
+MIN_SIMILARITY = 0.4
+
+
+def trigrams(token):
+    """Trigrams of a token padded like pg_trgm: 'kin' -> {'  k', ' ki', 'kin', 'in '}"""
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteIndex:
+    """In-memory prefix and trigram index over suggestion phrases.
+
+    Each entry is a phrase (a location, university, property type or
+    listing title) with a kind and a weight, the number of rows using it.
+    Query words match entry words exactly, by prefix (the word being
+    typed) or, failing those, by trigram similarity so "Kinondni" still
+    finds Kinondoni.
+    """
+
+    def __init__(self, entries):
+        # [(text, kind, weight)], heaviest first so postings come out sorted
+        self.entries = sorted(entries, key=lambda entry: (-entry[2], entry[0]))
+
+        postings = defaultdict(list)
+        token_weight = defaultdict(int)
+        for entry_id, (text, kind, weight) in enumerate(self.entries):
+            for token in set(tokenize(text)):
+                postings[token].append(entry_id)
+                token_weight[token] += weight
+
+        self.tokens = sorted(postings)
+        self.postings = [postings[token][:MAX_ENTRIES_PER_TOKEN] for token in self.tokens]
+        self.token_weight = [token_weight[token] for token in self.tokens]
+
+        self.trigram_tokens = defaultdict(list)
+        for token_id, token in enumerate(self.tokens):
+            for gram in trigrams(token):
+                self.trigram_tokens[gram].append(token_id)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _prefix_matches(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + '\uffff')
+        token_ids = range(start, end)
+        if len(token_ids) > MAX_PREFIX_TOKENS:
+            token_ids = heapq.nlargest(MAX_PREFIX_TOKENS, token_ids, key=self.token_weight.__getitem__)
+        return {
+            token_id: 1.0 if self.tokens[token_id] == prefix else 0.9
+            for token_id in token_ids
+        }
+
+    def _fuzzy_matches(self, word):
+        grams = trigrams(word)
+        shared = defaultdict(int)
+        for gram in grams:
+            for token_id in self.trigram_tokens.get(gram, ()):
+                shared[token_id] += 1
+
+        matches = {}
+        for token_id, count in shared.items():
+            token = self.tokens[token_id]
+            if abs(len(token) - len(word)) > 2:
+                continue
+            similarity = count / (len(grams) + len(trigrams(token)) - count)
+            if similarity >= MIN_SIMILARITY:
+                matches[token_id] = 0.8 * similarity
+        return matches
+
+    def _word_scores(self, word, is_prefix):
+        """{entry_id: score} for the entries containing one query word"""
+        if is_prefix:
+            matches = self._prefix_matches(word)
+        else:
+            token_id = bisect.bisect_left(self.tokens, word)
+            found = token_id < len(self.tokens) and self.tokens[token_id] == word
+            matches = {token_id: 1.0} if found else {}
+        if not matches and len(word) >= 3:
+            matches = self._fuzzy_matches(word)
+
+        scores = {}
+        for token_id, score in matches.items():
+            for entry_id in self.postings[token_id]:
+                if scores.get(entry_id, 0) < score:
+                    scores[entry_id] = score
+        return scores
+
+    def suggest(self, query, limit=8):
+        """[{'text', 'kind'}] best first; every query word has to match"""
+        words = tokenize(query)
+        if not words:
+            return []
+
+        ends_with_space = query[-1:].isspace()
+        totals = None
+        for position, word in enumerate(words):
+            is_prefix = position == len(words) - 1 and not ends_with_space
+            scores = self._word_scores(word, is_prefix)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {
+                    entry_id: total + scores[entry_id]
+                    for entry_id, total in totals.items() if entry_id in scores
+                }
+            if not totals:
+                return []
+
+        def rank(entry_id):
+            text, kind, weight = self.entries[entry_id]
+            return totals[entry_id] + KIND_BOOST[kind] + 0.1 * math.log1p(weight)
+
+        best = heapq.nsmallest(limit, totals, key=lambda entry_id: (-rank(entry_id), entry_id))
+        return [
+            {'text': self.entries[entry_id][0], 'kind': self.entries[entry_id][1]}
+            for entry_id in best
+        ]
+
+
+def _counted(queryset, field):
+    return queryset.order_by().exclude(**{field: ''}).values_list(field).annotate(count=Count('id'))
+
+
+def location_entries(querysets):
+    """"Ward, District, Region" style phrases for every used Location node"""
+    nodes = {node['id']: node for node in Location.objects.values('id', 'name', 'parent_id')}
+    totals = defaultdict(int)
+    for queryset in querysets:
+        for area_id, count in queryset.order_by().exclude(area=None).values_list('area').annotate(count=Count('id')):
+            node = nodes.get(area_id)
+            while node is not None:
+                totals[node['id']] += count
+                node = nodes.get(node['parent_id'])
+
+    entries = []
+    for node_id, count in totals.items():
+        names = []
+        node = nodes[node_id]
+        while node is not None:
+            names.append(node['name'])
+            node = nodes.get(node['parent_id'])
+        entries.append((', '.join(names), 'location', count))
+    return entries
+
+
+def collect_entries():
+    listings = Scrape_MakaziListing.objects.filter(is_available=True)
+    apartments = Apartment.objects.filter(is_available=True)
+    hostels = Hostel.objects.filter(is_available=True)
+
+    phrases = defaultdict(int)
+    sources = [
+        (listings, 'title', 'title'),
+        (apartments, 'title', 'title'),
+        (hostels, 'name', 'title'),
+        (hostels, 'university', 'university'),
+        (listings, 'property_type', 'property_type'),
+        (apartments, 'apartment_type', 'property_type'),
+    ]
+    labels = dict(Apartment.APARTMENT_TYPES)
+    for queryset, field, kind in sources:
+        for text, count in _counted(queryset, field):
+            if field == 'apartment_type':
+                text = labels.get(text, text)
+            phrases[(text.strip(), kind)] += count
+
+    entries = [(text, kind, count) for (text, kind), count in phrases.items() if text]
+    return entries + location_entries([listings, apartments, hostels])
+
+
+_index = None
+_index_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_executor = None
+_rebuilding = False
+
+
+def get_version():
+    """Millisecond timestamp of the last change to an indexed field"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def indexed_values(instance):
+    return [getattr(instance, instance._meta.get_field(field).attname) for field in INDEXED_FIELDS[type(instance)]]
+
+
+def has_indexed_changes(instance, update_fields=None):
+    """Whether saving `instance` changes a phrase the index is built from"""
+    fields = INDEXED_FIELDS[type(instance)]
+    if update_fields is not None and not set(update_fields) & {
+        name for field in fields for name in (field, instance._meta.get_field(field).attname)
+    }:
+        return False
+    if instance.pk is None or instance._state.adding:
+        return True
+    stored = type(instance).objects.filter(pk=instance.pk).values_list(
+        *[instance._meta.get_field(field).attname for field in fields]
+    ).first()
+    return stored is None or list(stored) != indexed_values(instance)
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='makazi-autocomplete')
+        return _executor
+
+
+def rebuild_index():
+    """Build the index from the database and serve it from now on"""
+    global _index, _index_version, _checked_at
+    version = get_version()
+    index = AutocompleteIndex(collect_entries())
+    with _lock:
+        _index = index
+        _index_version = version
+        _checked_at = time.monotonic()
+    return index
+
+
+def _rebuild_in_worker():
+    global _rebuilding
+    close_old_connections()
+    try:
+        rebuild_index()
+    except Exception:
+        logger.exception("Autocomplete index rebuild failed")
+    finally:
+        with _lock:
+            _rebuilding = False
+        close_old_connections()
+
+
+def schedule_rebuild():
+    """Rebuild the index in a worker thread; a rebuild already queued is reused"""
+    global _rebuilding
+    if not getattr(settings, 'AUTOCOMPLETE_ASYNC', True):
+        rebuild_index()
+        return
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    get_executor().submit(_rebuild_in_worker)
+
+
+def invalidate_autocomplete():
+    """Mark every process's index stale and rebuild this one after the commit"""
+    version = max(int(time.time() * 1000), (cache.get(VERSION_KEY) or 0) + 1)
+    cache.set(VERSION_KEY, version, None)
+    # Importers and other commands never built one
+    if _index is not None:
+        transaction.on_commit(schedule_rebuild)
+
+
+def get_autocomplete_index():
+    """The process-wide index.
+
+    Only the first request of a process builds it inline. Afterwards a
+    changed version is noticed at most every AUTOCOMPLETE_REFRESH seconds
+    and the current index is served while a worker rebuilds it.
+    """
+    global _checked_at
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                rebuild_index()
+        return _index
+
+    now = time.monotonic()
+    if now - _checked_at >= AUTOCOMPLETE_REFRESH:
+        _checked_at = now
+        if get_version() != _index_version:
+            schedule_rebuild()
+    return _index
+
+
+def suggest(query, limit=8):
+    return get_autocomplete_index().suggest(query, limit)
@@ -0,0 +1,481 @@
+# makazi/benchmarks.py
+import csv
+import datetime
+import io
+import logging
+import math
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from .autocomplete import invalidate_autocomplete
+from .facets import invalidate_listing_facets
+from .geo import geohash_for
+from .geocoding import get_gazetteer
+from .instrumentation import query_budget
+from .models import (
+    Apartment, ApartmentBooking, ApartmentReview, Hostel, HostelBooking, HostelReview,
+    Location, Scrape_MakaziListing, amenity_mask,
+)
+from .page_cache import invalidate_model
+from .search import get_search_backend
+
+
+# Apartments, hostels, bookings and reviews relative to the listing count
+APARTMENTS_PER_LISTING = 1 / 20
+HOSTELS_PER_LISTING = 1 / 50
+BOOKINGS_PER_PROPERTY = 3
+REVIEWS_PER_PROPERTY = 4
+
+BATCH_SIZE = 2000
+
+UNIVERSITIES = [
+    ('UDSM', 'Dar Es Salaam'), ('ARU', 'Dar Es Salaam'), ('MUHAS', 'Dar Es Salaam'),
+    ('IFM', 'Dar Es Salaam'), ('CBE', 'Dar Es Salaam'), ('NIT', 'Dar Es Salaam'),
+    ('UDOM', 'Dodoma'), ('SUA', 'Morogoro'), ('Mzumbe', 'Morogoro'),
+    ('SAUT', 'Mwanza'), ('MUST', 'Mbeya'), ('Nelson Mandela', 'Arusha'),
+]
+
+ROOM_WORDS = {1: 'chumba kimoja', 2: 'vyumba viwili', 3: 'vyumba vitatu', 4: 'vyumba vinne', 5: 'vyumba vitano'}
+
+TITLE_TEMPLATES = [
+    ('House', 'Nyumba ya {rooms} {deal} {place}'),
+    ('Apartment', 'Nyumba/Apartment ya {rooms} {deal} {place}'),
+    ('Room', 'Chumba master {deal} {place}'),
+    ('Plot', 'Kiwanja {plot_deal} {place}'),
+    ('Frame', 'Fremu ya biashara {deal} {place}'),
+]
+
+DESCRIPTION_LINES = [
+    'Maji na umeme vipo', 'Fensi na geti', 'Parking ya magari mawili', 'Karibu na barabara kuu',
+    'Jiko la kisasa', 'Master bedroom', 'Tiles na gypsum', 'Mazingira tulivu', 'Ulinzi masaa 24',
+    'Malipo miezi sita', 'Dalali yupo', 'Inafaa kwa familia',
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class SyntheticCatalog:
+    """Generates listings, apartments, hostels, bookings and reviews.
+
+    Places come from the bundled gazetteer so locations, coordinates and
+    the Location hierarchy look like scraped data. Rows are bulk inserted
+    with their derived columns filled in, then the search index is rebuilt.
+    """
+
+    def __init__(self, listings, seed=1, stdout=None):
+        self.listings = listings
+        self.random = random.Random(seed)
+        self.stdout = stdout
+        gazetteer = get_gazetteer()
+        # (location string, latitude, longitude) for every ward in the gazetteer
+        self.places = [
+            (', '.join(part.title() for part in key if part), point[0], point[1])
+            for key, point in gazetteer.places.items() if key[0]
+        ]
+        self.areas = {}
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def area_for(self, location):
+        if location not in self.areas:
+            self.areas[location] = Location.objects.for_string(location)
+        return self.areas[location]
+
+    def place(self):
+        location, latitude, longitude = self.random.choice(self.places)
+        # Spread rows around the ward centre, roughly 2km
+        latitude += self.random.uniform(-0.02, 0.02)
+        longitude += self.random.uniform(-0.02, 0.02)
+        return location, Decimal(f'{latitude:.6f}'), Decimal(f'{longitude:.6f}')
+
+    def description(self):
+        return '\n'.join(self.random.sample(DESCRIPTION_LINES, 4))
+
+    def listing_row(self, number):
+        """Scraped-style values for one listing, shared by the DB and CSV generators"""
+        property_type, template = self.random.choice(TITLE_TEMPLATES)
+        bedrooms = self.random.choice([1, 1, 2, 2, 3, 3, 4, 5])
+        location, latitude, longitude = self.place()
+        short_place = ', '.join([location.split(', ')[0], location.split(', ')[-1]])
+        monthly = self.random.random() < 0.8
+        if monthly:
+            amount = self.random.randrange(50, 3000) * 1000
+        else:
+            amount = self.random.randrange(20, 900) * 1000000
+        return {
+            'title': template.format(
+                rooms=ROOM_WORDS[bedrooms],
+                deal='inapangishwa' if monthly else 'inauzwa',
+                plot_deal='kinapangishwa' if monthly else 'kinauzwa',
+                place=short_place,
+            ),
+            'link': f'https://makazimapya.com/listings/benchmark-{number}',
+            'price': f'Sh.{amount:,}',
+            'location': location,
+            'description': self.description(),
+            'main_image_url': f'https://images.example.com/listings/{number}.jpg' if self.random.random() < 0.9 else None,
+            'property_type': property_type,
+            'bedrooms': bedrooms,
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+
+    def make_listing(self, number):
+        row = self.listing_row(number)
+        listing = Scrape_MakaziListing(
+            **row,
+            bathrooms=max(1, row['bedrooms'] - 1),
+            is_featured=self.random.random() < 0.05,
+            is_verified=self.random.random() < 0.3,
+        )
+        listing.set_price_fields()
+        listing.set_slug()
+        listing.geohash = geohash_for(listing.latitude, listing.longitude)
+        listing.area = self.area_for(listing.location)
+        listing.content_hash = listing.compute_content_hash()
+        return listing
+
+    def make_apartment(self, number):
+        location, latitude, longitude = self.place()
+        apartment_type = self.random.choice(Apartment.APARTMENT_TYPES)[0]
+        bedrooms = {'studio': 1, '1bed': 1, '2bed': 2, '3bed': 3}.get(apartment_type, 4)
+        amenities = self.random.sample([key for key, _ in Apartment.AMENITIES_CHOICES], 4)
+        return Apartment(
+            title=f"{location.split(', ')[0]} Residences {number}",
+            description=self.description(),
+            location=location,
+            address=f'Plot {number}, {location}',
+            apartment_type=apartment_type,
+            price_per_month=Decimal(self.random.randrange(300, 5000) * 1000),
+            total_rooms=bedrooms + 2,
+            bedrooms=bedrooms,
+            bathrooms=max(1, bedrooms - 1),
+            area_sqft=self.random.randrange(400, 3000),
+            amenities=amenities,
+            amenity_mask=amenity_mask(amenities, Apartment.AMENITIES_CHOICES),
+            owner_name=f'Owner {number}',
+            owner_phone=f'+2557{number % 100000000:08d}',
+            is_featured=self.random.random() < 0.1,
+            is_verified=self.random.random() < 0.5,
+            latitude=latitude,
+            longitude=longitude,
+            geohash=geohash_for(latitude, longitude),
+            area=self.area_for(location),
+        )
+
+    def make_hostel(self, number):
+        university, region = self.random.choice(UNIVERSITIES)
+        in_region = [place for place in self.places if place[0].endswith(region)] or self.places
+        location, latitude, longitude = self.random.choice(in_region)
+        capacity = self.random.randrange(20, 400)
+        occupancy = self.random.randrange(0, capacity)
+        amenities = self.random.sample([key for key, _ in Hostel.AMENITIES_CHOICES], 5)
+        return Hostel(
+            name=f'{university} Hostel {number}',
+            university=university,
+            description=self.description(),
+            location=location,
+            address=f'Block {number}, {location}',
+            hostel_type=self.random.choice(Hostel.HOSTEL_TYPES)[0],
+            gender_allowed=self.random.choice(Hostel.GENDER_CHOICES)[0],
+            warden_name=f'Warden {number}',
+            warden_phone=f'+2556{number % 100000000:08d}',
+            price_per_semester=Decimal(self.random.randrange(200, 1500) * 1000),
+            price_per_month=Decimal(self.random.randrange(50, 400) * 1000),
+            amenities=amenities,
+            amenity_mask=amenity_mask(amenities, Hostel.AMENITIES_CHOICES),
+            total_rooms=capacity // 4,
+            available_rooms=(capacity - occupancy) // 4,
+            total_capacity=capacity,
+            current_occupancy=occupancy,
+            semester='sem1',
+            is_featured=self.random.random() < 0.1,
+            is_verified=self.random.random() < 0.5,
+            latitude=Decimal(f'{latitude:.6f}'),
+            longitude=Decimal(f'{longitude:.6f}'),
+            geohash=geohash_for(latitude, longitude),
+            area=self.area_for(location),
+        )
+
+    def bulk_insert(self, model, count, make):
+        started = time.monotonic()
+        batch = []
+        for number in range(1, count + 1):
+            batch.append(make(number))
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        self.log(f'  {count} {model._meta.verbose_name_plural} in {time.monotonic() - started:.1f}s')
+
+    def related_rows(self, model, parents, per_parent, make):
+        started = time.monotonic()
+        batch = []
+        count = 0
+        for parent in parents:
+            for _ in range(self.random.randrange(per_parent * 2 + 1)):
+                batch.append(make(parent))
+                count += 1
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        self.log(f'  {count} {model._meta.verbose_name_plural} in {time.monotonic() - started:.1f}s')
+
+    def apartment_booking(self, apartment):
+        check_in = datetime.date(2025, 1, 1) + datetime.timedelta(days=self.random.randrange(365))
+        months = self.random.randrange(1, 13)
+        return ApartmentBooking(
+            apartment_id=apartment['id'],
+            customer_name='Mteja',
+            customer_email='mteja@example.com',
+            customer_phone='+255700000000',
+            check_in_date=check_in,
+            check_out_date=check_in + datetime.timedelta(days=30 * months),
+            duration_months=months,
+            monthly_rent=apartment['price_per_month'],
+            total_amount=apartment['price_per_month'] * months,
+            status=self.random.choice(ApartmentBooking.BOOKING_STATUS)[0],
+        )
+
+    def apartment_review(self, apartment):
+        return ApartmentReview(
+            apartment_id=apartment['id'],
+            reviewer_name='Mpangaji',
+            rating=self.random.randrange(1, 6),
+            title='Mahali pazuri',
+            comment=self.description(),
+            is_approved=self.random.random() < 0.8,
+        )
+
+    def hostel_booking(self, hostel):
+        check_in = datetime.date(2025, 10, 1)
+        return HostelBooking(
+            hostel_id=hostel['id'],
+            student_name='Mwanafunzi',
+            registration_number=f'2025-04-{self.random.randrange(100000):05d}',
+            student_email='mwanafunzi@example.com',
+            student_phone='+255700000000',
+            student_course='BSc Computer Science',
+            student_year=self.random.choice(['1', '2', '3']),
+            booking_type='semester',
+            academic_year='2025/2026',
+            semester='sem1',
+            check_in_date=check_in,
+            check_out_date=check_in + datetime.timedelta(days=120),
+            total_amount=hostel['price_per_semester'],
+            balance=hostel['price_per_semester'],
+            payment_deadline=check_in - datetime.timedelta(days=14),
+            status=self.random.choice(HostelBooking.BOOKING_STATUS)[0],
+        )
+
+    def hostel_review(self, hostel):
+        scores = [self.random.randrange(1, 6) for _ in range(5)]
+        return HostelReview(
+            hostel_id=hostel['id'],
+            student_name='Mwanafunzi',
+            student_course='BSc Computer Science',
+            student_year='2',
+            overall_rating=scores[0],
+            cleanliness=scores[1],
+            security=scores[2],
+            facilities=scores[3],
+            management=scores[4],
+            review_title='Hosteli nzuri',
+            review_text=self.description(),
+            stay_duration='semester',
+            is_approved=self.random.random() < 0.8,
+        )
+
+    @transaction.atomic
+    def generate(self):
+        apartments = max(1, round(self.listings * APARTMENTS_PER_LISTING))
+        hostels = max(1, round(self.listings * HOSTELS_PER_LISTING))
+        self.log(f'Generating {self.listings} listings, {apartments} apartments, {hostels} hostels')
+
+        self.bulk_insert(Scrape_MakaziListing, self.listings, self.make_listing)
+        self.bulk_insert(Apartment, apartments, self.make_apartment)
+        self.bulk_insert(Hostel, hostels, self.make_hostel)
+
+        apartment_rows = list(Apartment.objects.values('id', 'price_per_month'))
+        hostel_rows = list(Hostel.objects.values('id', 'price_per_semester'))
+        self.related_rows(ApartmentBooking, apartment_rows, BOOKINGS_PER_PROPERTY, self.apartment_booking)
+        self.related_rows(ApartmentReview, apartment_rows, REVIEWS_PER_PROPERTY, self.apartment_review)
+        self.related_rows(HostelBooking, hostel_rows, BOOKINGS_PER_PROPERTY, self.hostel_booking)
+        self.related_rows(HostelReview, hostel_rows, REVIEWS_PER_PROPERTY, self.hostel_review)
+
+        started = time.monotonic()
+        backend = get_search_backend()
+        for model in [Scrape_MakaziListing, Apartment, Hostel]:
+            backend.rebuild(model)
+            invalidate_model(model)
+        invalidate_listing_facets()
+        invalidate_autocomplete()
+        self.log(f'  search index in {time.monotonic() - started:.1f}s')
+
+    def write_csv(self, path, count, offset):
+        """A makazi.csv-style file with `count` new listings, for import benchmarks"""
+        fields = ['title', 'link', 'price', 'location', 'description', 'main_image_url']
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.DictWriter(handle, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for number in range(offset + 1, offset + count + 1):
+                writer.writerow(self.listing_row(number))
+
+
+def view_scenarios(seed=1):
+    """[(name, [urls])] over the generated catalog; ids are sampled per scenario"""
+    rng = random.Random(seed)
+
+    def sample(queryset, count=20):
+        ids = list(queryset.order_by('?').values_list('pk', flat=True)[:count])
+        rng.shuffle(ids)
+        return ids
+
+    listing_ids = sample(Scrape_MakaziListing.objects.filter(is_available=True))
+    listings = Scrape_MakaziListing.objects.in_bulk(listing_ids)
+    hostel_ids = sample(Hostel.objects.all())
+    apartment_ids = sample(Apartment.objects.all())
+    district = Location.objects.filter(level='district').order_by('path').first()
+    district_name = district.name if district else 'Kinondoni'
+
+    return [
+        ('property_listings', ['/listings/']),
+        ('property_listings_price_range', [
+            f'/listings/?min_price={low}&max_price={low * 3}' for low in [100000, 300000, 500000, 800000]
+        ]),
+        ('property_listings_sort_price', ['/listings/?sort=price', '/listings/?sort=-price']),
+        ('property_listings_location', [f'/listings/?location={district_name}']),
+        ('property_listings_search', ['/listings/?q=nyumba vyumba', '/listings/?q=kiwanja']),
+        ('property_detail', [listings[pk].get_absolute_url() for pk in listing_ids]),
+        ('apartments_list', ['/apartments/']),
+        ('apartment_detail', [f'/apartments/{pk}/' for pk in apartment_ids]),
+        ('apartments_list_amenities', [
+            '/apartments/?amenities=wifi&amenities=parking&amenities=security',
+            '/apartments/?amenities=gym',
+        ]),
+        ('hostels_list', ['/hostels/']),
+        ('hostels_list_amenities', [
+            '/hostels/?amenities=wifi&amenities=parking&amenities=security',
+            '/hostels/?amenities=hot_water',
+        ]),
+        ('hostel_detail', [f'/hostels/{pk}/' for pk in hostel_ids]),
+        ('filter_api', ['/api/filter/', f'/api/filter/?location={district_name}&min_price=200000']),
+        ('search_api', ['/api/search/?q=nyumba', '/api/search/?q=chumba master', '/api/search/?q=fremu']),
+        ('autocomplete_api', ['/api/autocomplete/?q=kin', '/api/autocomplete/?q=Kinondni', '/api/autocomplete/?q=mbe']),
+        ('apartment_search', ['/apartments/search/']),
+        ('search_hostels', ['/api/search/hostels/', '/api/search/hostels/?university=UDSM']),
+    ]
+
+
+def summarize(latencies, queries):
+    latencies = sorted(latencies)
+    return {
+        'runs': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p90_ms': round(percentile(latencies, 0.90), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+        'queries_median': statistics.median(queries),
+        'queries_max': max(queries),
+    }
+
+
+def run_view_scenario(client, urls, repeat, warm=False):
+    """Requests every url `repeat` times; the cache is cleared first unless warm"""
+    latencies = []
+    queries = []
+    view_name = resolve(urls[0].split('?')[0]).view_name
+    for _ in range(repeat):
+        for url in urls:
+            if not warm:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            latencies.append(elapsed * 1000)
+            queries.append(len(captured))
+
+    result = summarize(latencies, queries)
+    result['view'] = view_name
+    result['query_budget'] = query_budget(view_name)
+    result['over_budget'] = result['query_budget'] is not None and result['queries_max'] > result['query_budget']
+    return result
+
+
+def run_import_scenario(catalog, path, rows):
+    """Time import_makazi on a CSV of new rows, then re-run it unchanged"""
+    catalog.write_csv(path, rows, offset=10 ** 9)
+    results = {}
+    # Rolled back afterwards so the catalog stays at its scale for --keepdb
+    with transaction.atomic():
+        for name in ['import_makazi', 'import_makazi_unchanged']:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                call_command('import_makazi', path, stdout=io.StringIO())
+                elapsed = (time.perf_counter() - started) * 1000
+            results[name] = {
+                'runs': 1,
+                'rows': rows,
+                'total_ms': round(elapsed, 2),
+                'rows_per_second': round(rows / (elapsed / 1000), 1) if elapsed else None,
+                'queries': len(captured),
+            }
+        transaction.set_rollback(True)
+    return results
+
+
+def run_benchmarks(catalog, repeat=5, warm=False, import_rows=1000, import_path=None, stdout=None):
+    client = Client()
+    scenarios = {}
+    # Per-request metric lines would drown the report; budgets are in the results
+    metrics_logger = logging.getLogger('makazi.metrics')
+    level = metrics_logger.level
+    metrics_logger.setLevel(logging.ERROR)
+    # Detail pages compute similar items on first view; start every run
+    # from the same state so results compare across --keepdb runs
+    for model in [Scrape_MakaziListing, Apartment, Hostel]:
+        model.objects.update(similar_ids=None)
+    try:
+        for name, urls in view_scenarios():
+            result = scenarios[name] = run_view_scenario(client, urls, repeat, warm=warm)
+            if stdout is not None:
+                over = '  OVER BUDGET' if result['over_budget'] else ''
+                stdout.write(
+                    f"  {name:32} p50 {result['p50_ms']:8.2f}ms  p90 {result['p90_ms']:8.2f}ms  "
+                    f"p99 {result['p99_ms']:8.2f}ms  queries {result['queries_max']}{over}"
+                )
+        if import_rows and import_path:
+            for name, result in run_import_scenario(catalog, import_path, import_rows).items():
+                scenarios[name] = result
+                if stdout is not None:
+                    stdout.write(
+                        f"  {name:32} {result['total_ms']:9.2f}ms  {result['rows_per_second']} rows/s  "
+                        f"queries {result['queries']}"
+                    )
+    finally:
+        metrics_logger.setLevel(level)
+    return scenarios
@@ -0,0 +1,24 @@
+# makazi/decorators.py
+from functools import wraps
+
+from django.http import HttpResponseNotAllowed
+from django.middleware.gzip import GZipMiddleware
+
+
+_gzip = GZipMiddleware(lambda request: None)
+
+
+def async_api_view(view_func):
+    """require_GET and gzip_page for async views.
+
+    The Django 4.2 versions of those decorators only wrap sync views, so
+    this applies the same method check and GZipMiddleware response
+    handling around a coroutine view.
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        response = await view_func(request, *args, **kwargs)
+        return _gzip.process_response(request, response)
+    return wrapper
@@ -0,0 +1,100 @@
+# makazi/facets.py
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Location, Scrape_MakaziListing
+
+
+FACETS_CACHE_KEY = 'makazi:listing_facets'
+FACETS_TIMEOUT = 60 * 10
+
+# (label, min, max) in TSh, max exclusive; None means unbounded
+PRICE_BUCKETS = [
+    ('Chini ya 200,000', None, 200000),
+    ('200,000 - 500,000', 200000, 500000),
+    ('500,000 - 1,000,000', 500000, 1000000),
+    ('1M - 5M', 1000000, 5000000),
+    ('5M - 50M', 5000000, 50000000),
+    ('Zaidi ya 50M', 50000000, None),
+]
+
+
+def _price_bucket_q(low, high):
+    condition = Q(price_value__gt=0)
+    if low is not None:
+        condition &= Q(price_value__gte=low)
+    if high is not None:
+        condition &= Q(price_value__lt=high)
+    return condition
+
+
+def location_counts(queryset):
+    """[{'location': name, 'count': n}] for every area name, most common first.
+
+    Counts roll up the Location hierarchy, so "Kinondoni" counts every
+    listing in its wards; a name used at several levels counts each row once.
+    """
+    leaf_counts = queryset.order_by().exclude(area=None).values_list('area').annotate(count=Count('id'))
+    nodes = {node['id']: node for node in Location.objects.values('id', 'name', 'key', 'parent_id')}
+
+    totals = {}
+    names = {}
+    for area_id, count in leaf_counts:
+        keys = set()
+        node = nodes.get(area_id)
+        while node is not None:
+            keys.add(node['key'])
+            names.setdefault(node['key'], node['name'])
+            node = nodes.get(node['parent_id'])
+        for key in keys:
+            totals[key] = totals.get(key, 0) + count
+
+    return sorted(
+        ({'location': names[key], 'count': count} for key, count in totals.items()),
+        key=lambda facet: (-facet['count'], facet['location']),
+    )
+
+
+def compute_listing_facets():
+    """Run the facet aggregates against the database"""
+    listings = Scrape_MakaziListing.objects.filter(is_available=True).order_by()
+
+    locations = location_counts(listings)
+
+    property_types = list(
+        listings.exclude(property_type='').values('property_type').annotate(
+            count=Count('id')
+        ).order_by('-count', 'property_type')
+    )
+
+    bucket_counts = listings.aggregate(
+        total=Count('id'),
+        **{
+            f'bucket_{i}': Count('id', filter=_price_bucket_q(low, high))
+            for i, (_, low, high) in enumerate(PRICE_BUCKETS)
+        }
+    )
+    price_buckets = [
+        {'label': label, 'min': low, 'max': high, 'count': bucket_counts[f'bucket_{i}']}
+        for i, (label, low, high) in enumerate(PRICE_BUCKETS)
+    ]
+
+    return {
+        'total': bucket_counts['total'],
+        'locations': locations,
+        'property_types': property_types,
+        'price_buckets': price_buckets,
+    }
+
+
+def get_listing_facets():
+    """Facet counts for available listings, served from the cache"""
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        facets = compute_listing_facets()
+        cache.set(FACETS_CACHE_KEY, facets, FACETS_TIMEOUT)
+    return facets
+
+
+def invalidate_listing_facets():
+    cache.delete(FACETS_CACHE_KEY)
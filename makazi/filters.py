@@ -1,46 +1,89 @@
 # makazi/filters.py
 import django_filters
-from .models import Scrape_MakaziListing
+from django import forms
+from .models import Location, Scrape_MakaziListing, parse_price
+
+
+class PriceField(forms.IntegerField):
+    """Integer field that also accepts display prices such as "Sh.1,300,000" """
+
+    def to_python(self, value):
+        if isinstance(value, str) and value.strip() and not value.strip().isdigit():
+            amount, _ = parse_price(value)
+            value = amount or value
+        return super().to_python(value)
+
+
+class PriceFilter(django_filters.NumberFilter):
+    field_class = PriceField
+
 
 class PropertyFilter(django_filters.FilterSet):
+    """Listing filters shared by the listings page and the filter API"""
+
     location = django_filters.CharFilter(
-        field_name='location', 
-        lookup_expr='icontains',
+        method='filter_location',
         label='Location'
     )
-    
+
     property_type = django_filters.CharFilter(
         field_name='property_type',
+        lookup_expr='iexact',
         label='Property Type'
     )
-    
-    min_price = django_filters.CharFilter(
-        field_name='price',
+
+    # Compared against the parsed integer price, not the display string
+    min_price = PriceFilter(
+        field_name='price_value',
         lookup_expr='gte',
         label='Min Price'
     )
-    
-    max_price = django_filters.CharFilter(
-        field_name='price',
+
+    max_price = PriceFilter(
+        field_name='price_value',
         lookup_expr='lte',
         label='Max Price'
     )
-    
+
     bedrooms = django_filters.NumberFilter(
-        field_name='bedrooms',
+        method='filter_bedrooms',
         label='Bedrooms'
     )
-    
+
     is_featured = django_filters.BooleanFilter(
-        field_name='is_featured',
+        method='filter_flag',
         label='Featured Only'
     )
-    
+
     is_verified = django_filters.BooleanFilter(
-        field_name='is_verified',
+        method='filter_flag',
         label='Verified Only'
     )
-    
+
+    has_images = django_filters.BooleanFilter(
+        method='filter_has_images',
+        label='With Images Only'
+    )
+
+    def filter_location(self, queryset, name, value):
+        # Indexed match on the area hierarchy, including sub-areas
+        return Location.objects.filter_area(queryset, value)
+
+    def filter_bedrooms(self, queryset, name, value):
+        # "4" means 4 or more bedrooms
+        if value >= 4:
+            return queryset.filter(bedrooms__gte=4)
+        return queryset.filter(bedrooms=value)
+
+    def filter_flag(self, queryset, name, value):
+        # Only "true" narrows the results; "false" means no filter
+        return queryset.filter(**{name: True}) if value else queryset
+
+    def filter_has_images(self, queryset, name, value):
+        if value:
+            return queryset.exclude(main_image_url='').exclude(main_image_url__isnull=True)
+        return queryset
+
     class Meta:
         model = Scrape_MakaziListing
-        fields = ['location', 'property_type', 'bedrooms', 'is_featured', 'is_verified']
\ No newline at end of file
+        fields = ['location', 'property_type', 'min_price', 'max_price', 'bedrooms', 'is_featured', 'is_verified']
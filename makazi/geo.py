@@ -0,0 +1,180 @@
+# makazi/geo.py
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ACos, Cast, Cos, Least, Radians, Sin
+
+
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 100
+MAX_NEAREST = 50
+# Radii tried in turn when looking for the k nearest objects
+NEAREST_RADII_KM = [1, 2, 5, 10, 25, 50, 100, 250, 500]
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point; nearby points share long prefixes"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            rng[0] = middle
+        else:
+            rng[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_for(latitude, longitude):
+    """Stored geohash for optional coordinates ('' when missing)"""
+    if latitude is None or longitude is None:
+        return ''
+    return encode_geohash(latitude, longitude)
+
+
+def cell_size(precision):
+    """(lat, lng) size in degrees of a geohash cell"""
+    bits = precision * 5
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """Geohash prefixes whose cells together cover the circle around a point.
+
+    Uses the longest prefix whose cells are at least as large as the
+    radius, so the 3x3 block of cells around the point covers the
+    bounding box and each prefix is one range scan on the geohash index.
+    """
+    d_lat = radius_km / 111.32
+    d_lng = radius_km / (111.32 * max(math.cos(math.radians(latitude)), 0.01))
+    precision = 1
+    while precision < GEOHASH_PRECISION:
+        lat_size, lng_size = cell_size(precision + 1)
+        if lat_size < d_lat or lng_size < d_lng:
+            break
+        precision += 1
+
+    prefixes = set()
+    for lat in (latitude - d_lat, latitude, latitude + d_lat):
+        for lng in (longitude - d_lng, longitude, longitude + d_lng):
+            lat = max(-90.0, min(90.0, lat))
+            lng = (lng + 180.0) % 360.0 - 180.0
+            prefixes.add(encode_geohash(lat, lng, precision))
+    return sorted(prefixes)
+
+
+def distance_expression(latitude, longitude):
+    """Great-circle distance in km from a point, as a database expression"""
+    lat = Radians(Cast(F('latitude'), FloatField()))
+    lng = Radians(Cast(F('longitude'), FloatField()))
+    lat0 = math.radians(latitude)
+    lng0 = math.radians(longitude)
+    cosine = (
+        Value(math.sin(lat0)) * Sin(lat)
+        + Value(math.cos(lat0)) * Cos(lat) * Cos(lng - Value(lng0))
+    )
+    return Value(EARTH_RADIUS_KM) * ACos(Least(cosine, Value(1.0)), output_field=FloatField())
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Objects within `radius_km`, annotated with distance_km and nearest first"""
+    # Prefix matches as ranges, which use the index where LIKE may not
+    prefixes = covering_prefixes(latitude, longitude, radius_km)
+    return queryset.filter(
+        reduce(or_, (Q(geohash__gte=prefix, geohash__lt=prefix + '~') for prefix in prefixes))
+    ).annotate(
+        distance_km=distance_expression(latitude, longitude)
+    ).filter(distance_km__lte=radius_km).order_by('distance_km', 'id')
+
+
+def nearest(queryset, latitude, longitude, k):
+    """The k nearest objects (ties included), annotated with distance_km.
+
+    Searches growing radii so that only the neighbourhood of the point is
+    scanned; returns an unsliced queryset so it can still be paginated.
+    """
+    for radius in NEAREST_RADII_KM:
+        nearby = within_radius(queryset, latitude, longitude, radius)
+        distances = list(nearby.values_list('distance_km', flat=True)[:k])
+        if len(distances) >= k:
+            return nearby.filter(distance_km__lte=distances[-1])
+    return nearby
+
+
+async def anearest(queryset, latitude, longitude, k):
+    """Async version of nearest"""
+    for radius in NEAREST_RADII_KM:
+        nearby = within_radius(queryset, latitude, longitude, radius)
+        distances = [distance async for distance in nearby.values_list('distance_km', flat=True)[:k]]
+        if len(distances) >= k:
+            return nearby.filter(distance_km__lte=distances[-1])
+    return nearby
+
+
+def parse_point(params):
+    """(latitude, longitude) from ?lat=&lng= parameters, or None"""
+    try:
+        latitude = float(params.get('lat', ''))
+        longitude = float(params.get('lng', ''))
+    except ValueError:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def near_queryset(queryset, params):
+    """Apply a ?lat=&lng= search with ?radius= (km) or ?nearest= (k).
+
+    Returns (queryset, point); point is None when no valid point was given
+    and the queryset is returned unchanged.
+    """
+    point, k, radius = parse_near_params(params)
+    if point is None:
+        return queryset, None
+    if k:
+        return nearest(queryset, *point, k), point
+    return within_radius(queryset, *point, radius), point
+
+
+async def anear_queryset(queryset, params):
+    """Async version of near_queryset"""
+    point, k, radius = parse_near_params(params)
+    if point is None:
+        return queryset, None
+    if k:
+        return await anearest(queryset, *point, k), point
+    return within_radius(queryset, *point, radius), point
+
+
+def parse_near_params(params):
+    """(point, k, radius_km) from request parameters; k is None in radius mode"""
+    point = parse_point(params)
+    nearest_k = params.get('nearest', '')
+    if nearest_k.isdigit() and int(nearest_k) > 0:
+        return point, min(int(nearest_k), MAX_NEAREST), None
+
+    try:
+        radius = float(params.get('radius') or DEFAULT_RADIUS_KM)
+    except ValueError:
+        radius = DEFAULT_RADIUS_KM
+    return point, None, max(0.1, min(radius, MAX_RADIUS_KM))
@@ -0,0 +1,130 @@
+# makazi/geocoding.py
+import csv
+import os
+import re
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Count
+
+from .geo import geohash_for
+
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.csv')
+
+LEVELS = ['ward', 'district', 'region']
+
+
+def normalize_name(name):
+    """'Lindi  CBD' -> 'lindi cbd'"""
+    return re.sub(r'\s+', ' ', str(name or '')).strip().lower()
+
+
+def location_parts(location):
+    """Cleaned parts of "Ward, District, Region", at most three"""
+    parts = [re.sub(r'\s+', ' ', part).strip() for part in str(location or '').split(',')]
+    return [part for part in parts if part][-3:]
+
+
+def parse_location(location):
+    """Split "Ward, District, Region" into normalized (ward, district, region).
+
+    Missing levels are '' so "Kinondoni, Dar Es Salaam" gives
+    ('', 'kinondoni', 'dar es salaam') and "Arusha" gives ('', '', 'arusha').
+    """
+    parts = [normalize_name(part) for part in location_parts(location)]
+    return tuple([''] * (3 - len(parts)) + parts)
+
+
+class Gazetteer:
+    """Coordinates of Tanzanian regions, districts and wards from a CSV file"""
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.places = {}
+        # Names that are unique at their level, for strings missing parents
+        self.by_name = {}
+        ambiguous = set()
+        with open(path, newline='', encoding='utf-8') as handle:
+            for row in csv.DictReader(handle):
+                key = (
+                    normalize_name(row['ward']),
+                    normalize_name(row['district']),
+                    normalize_name(row['region']),
+                )
+                point = (float(row['latitude']), float(row['longitude']))
+                self.places[key] = point
+                level = LEVELS[[bool(part) for part in key].index(True)]
+                name_key = (level, next(part for part in key if part))
+                if name_key in self.by_name:
+                    ambiguous.add(name_key)
+                self.by_name[name_key] = point
+        for name_key in ambiguous:
+            del self.by_name[name_key]
+
+    def resolve(self, location):
+        """(latitude, longitude, level) for a location string, or None.
+
+        Tries the full ward/district/region path first and falls back to
+        coarser levels, so a ward missing from the gazetteer still gets
+        its district's coordinates.
+        """
+        ward, district, region = parse_location(location)
+        if not region:
+            return None
+
+        candidates = [
+            ('ward', (ward, district, region)),
+            ('district', ('', district, region)),
+            ('region', ('', '', region)),
+        ]
+        for level, key in candidates:
+            if all(key[LEVELS.index(level):]) and key in self.places:
+                return self.places[key] + (level,)
+
+        # A single name such as "Arusha" or "Mikocheni" with no parents
+        if not (ward or district):
+            for level in ['region', 'district', 'ward']:
+                point = self.by_name.get((level, region))
+                if point:
+                    return point + (level,)
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer():
+    return Gazetteer()
+
+
+@lru_cache(maxsize=4096)
+def resolve_location(location):
+    """Cached Gazetteer.resolve; scraped data repeats the same strings a lot"""
+    return get_gazetteer().resolve(location)
+
+
+def geocode_queryset(queryset, dry_run=False):
+    """Fill latitude/longitude/geohash from each row's location string.
+
+    Rows are grouped by distinct location, so the work is one lookup and
+    one UPDATE per distinct string rather than per row. Returns a dict of
+    counts: rows per resolved level plus 'unresolved'.
+    """
+    counts = {level: 0 for level in LEVELS}
+    counts['unresolved'] = 0
+
+    groups = list(queryset.order_by().values_list('location').annotate(rows=Count('id')))
+
+    with transaction.atomic():
+        for location, rows in groups:
+            resolved = resolve_location(location)
+            if resolved is None:
+                counts['unresolved'] += rows
+                continue
+            latitude, longitude, level = resolved
+            counts[level] += rows
+            if not dry_run:
+                queryset.filter(location=location).update(
+                    latitude=round(latitude, 6),
+                    longitude=round(longitude, 6),
+                    geohash=geohash_for(latitude, longitude),
+                )
+    return counts
@@ -0,0 +1,192 @@
+# makazi/images.py
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .page_cache import invalidate_object
+
+
+logger = logging.getLogger('makazi.images')
+
+# name: (width, height, crop). Cards are cropped to fill the box; gallery
+# and full keep the aspect ratio and are never upscaled.
+VARIANTS = {
+    'card': (480, 360, True),
+    'gallery': (960, 720, False),
+    'full': (1600, 1200, False),
+}
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# Uploads are processed by this many threads per process, after the
+# transaction saving them commits. Set IMAGE_VARIANTS_ASYNC = False to
+# process them during save() instead (tests, management shells).
+IMAGE_WORKERS = getattr(settings, 'IMAGE_WORKERS', 2)
+
+
+def variant_name(name, variant, fmt):
+    """'apartments/x.jpg' -> 'variants/apartments/x.jpg.card.webp'"""
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    return posixpath.join('variants', f'{name}.{variant}.{extension}')
+
+
+def resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def generate_variants(storage, name):
+    """Write every variant of the stored image `name`.
+
+    Returns the original's (width, height) and the `variants` value for
+    the gallery row: {'source': name, 'card': {'width', 'height', 'webp',
+    'jpeg'}, ...} with the webp/jpeg URLs already resolved by the storage.
+    """
+    with storage.open(name, 'rb') as handle:
+        original = Image.open(handle)
+        original = ImageOps.exif_transpose(original)
+        original = original.convert('RGB')
+
+    entry = {'source': name}
+    for variant, (width, height, crop) in VARIANTS.items():
+        image = resize(original, width, height, crop)
+        files = {'width': image.width, 'height': image.height}
+        for fmt, (pil_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, **options)
+            path = variant_name(name, variant, fmt)
+            if storage.exists(path):
+                storage.delete(path)
+            files[fmt] = storage.url(storage.save(path, ContentFile(buffer.getvalue())))
+        entry[variant] = files
+    return original.size, entry
+
+
+def delete_variants(storage, name):
+    for variant in VARIANTS:
+        for fmt in FORMATS:
+            path = variant_name(name, variant, fmt)
+            if storage.exists(path):
+                storage.delete(path)
+
+
+def process_images(model, pk, force=False):
+    """Bring one gallery image's dimensions, URL and variants up to date.
+
+    Reads the row fresh and writes with a queryset update(), so it never
+    overwrites other columns or re-triggers the save signals. Returns 1
+    when variants were (re)generated.
+    """
+    image = model.objects.filter(pk=pk).first()
+    if image is None or not (force or image.is_stale()):
+        return 0
+
+    file = image.image
+    previous = image.variants.get('source')
+    if previous and previous != file.name:
+        delete_variants(file.storage, previous)
+
+    updates = {'url': file.url if file else '', 'width': None, 'height': None, 'variants': {}}
+    if file:
+        try:
+            (updates['width'], updates['height']), updates['variants'] = generate_variants(file.storage, file.name)
+        except (OSError, Image.DecompressionBombError) as error:
+            # Missing or unreadable file: pages keep serving the original
+            logger.warning("No variants for %s %s (%s): %s", model.__name__, pk, file.name, error)
+
+    model.objects.filter(pk=pk).update(**updates)
+    invalidate_object(image.get_parent_stub())
+    return 1 if updates['variants'] else 0
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='makazi-images')
+        return _executor
+
+
+def _process_in_worker(model, pk):
+    close_old_connections()
+    try:
+        process_images(model, pk)
+    except Exception:
+        logger.exception("Image variants failed for %s %s", model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_images(instance):
+    """Generate a gallery image's variants once the current transaction commits.
+
+    Runs in the worker pool so the admin save returns straight away; work
+    queued when a process exits is picked up by generate_image_variants.
+    """
+    model, pk = type(instance), instance.pk
+    if not getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(lambda: process_images(model, pk))
+        return
+    transaction.on_commit(lambda: get_executor().submit(_process_in_worker, model, pk))
+
+
+class ResponsiveImage:
+    """Variant URLs for a gallery image row with `image`, `url` and `variants`.
+
+    Renders as the original URL. Variant URLs fall back to the original
+    until the worker has generated them for the current file.
+    """
+
+    def __str__(self):
+        return self.url
+
+    @property
+    def has_variants(self):
+        return self.variants.get('source') == self.image.name
+
+    def variant_url(self, variant, fmt='jpeg'):
+        if not self.has_variants:
+            return self.url
+        return (self.variants.get(variant) or {}).get(fmt) or self.url
+
+    @property
+    def card(self):
+        return self.variant_url('card')
+
+    @property
+    def gallery(self):
+        return self.variant_url('gallery')
+
+    @property
+    def full(self):
+        return self.variant_url('full')
+
+    def srcset(self, fmt='jpeg', variants=('gallery', 'full')):
+        """'url 960w, url 1600w' over variants of the same aspect ratio"""
+        if not self.has_variants:
+            return ''
+        candidates = []
+        for variant in variants:
+            files = self.variants.get(variant)
+            if files and fmt in files:
+                candidates.append(f"{files[fmt]} {files['width']}w")
+        return ', '.join(candidates)
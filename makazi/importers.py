@@ -0,0 +1,253 @@
+# makazi/importers.py
+import csv
+import time
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .autocomplete import invalidate_autocomplete
+from .facets import invalidate_listing_facets
+from .geocoding import geocode_queryset
+from .models import Location, Scrape_MakaziListing, listing_content_hash
+from .page_cache import invalidate_model
+from .search import get_search_backend
+from .similarity import refresh_similar
+from .thumbnails import fetch_pending_thumbnails
+
+
+# Columns every scraped row carries
+SCRAPED_FIELDS = ['title', 'price', 'location', 'description', 'main_image_url']
+
+DERIVED_FIELDS = [
+    'digits_price', 'price_value', 'price_period', 'slug', 'area',
+    'content_hash', 'is_available', 'scraped_at',
+]
+
+
+def _to_int(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def _to_bool(value):
+    return str(value or '').strip().lower() == 'true'
+
+
+def clean_row(row):
+    """Map a CSV row to model field values, or None if the row is unusable"""
+    link = (row.get('link') or '').strip()
+    title = (row.get('title') or '').strip()
+    if not link or not title:
+        return None
+
+    values = {
+        'link': link,
+        'title': title[:255],
+        'price': (row.get('price') or '').strip()[:100],
+        'location': (row.get('location') or '').strip()[:255],
+        'description': row.get('description') or '',
+        'main_image_url': (row.get('main_image_url') or '').strip() or None,
+    }
+
+    # Optional columns are only written when present in the CSV so that admin
+    # edits (featured/verified flags, manual bedroom counts) survive re-imports
+    if 'posted_on_fb' in row:
+        values['posted_on_fb'] = parse_datetime(row['posted_on_fb'] or '') if row['posted_on_fb'] else None
+    if 'property_type' in row:
+        values['property_type'] = (row['property_type'] or '')[:50]
+    for field in ['bedrooms', 'bathrooms', 'area_sqft']:
+        if field in row:
+            values[field] = _to_int(row[field])
+    for field in ['is_featured', 'is_verified']:
+        if field in row:
+            values[field] = _to_bool(row[field])
+
+    return values
+
+
+class ImportStats:
+    """Counters reported at the end of an import"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.expired = 0
+        self.started = time.monotonic()
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + self.unchanged + self.skipped
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0
+
+    def summary(self):
+        return (
+            f"{self.processed} rows in {self.elapsed:.2f}s "
+            f"({self.rows_per_second:.0f} rows/sec): "
+            f"{self.inserted} inserted, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.skipped} skipped, {self.expired} expired"
+        )
+
+
+class MakaziCSVImporter:
+    """Stream a scraped CSV into Scrape_MakaziListing in batches.
+
+    Each batch looks up its existing links in one query and is written
+    with bulk_create/bulk_update inside a single transaction. Rows whose
+    content hash and optional columns match the stored listing are not
+    written at all, so a refresh costs time in proportion to the changes.
+    With expire_missing, listings absent from the feed are marked
+    unavailable once the whole file has been read.
+    """
+
+    def __init__(self, batch_size=500, dry_run=False, expire_missing=False, thumbnail_workers=0):
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.expire_missing = expire_missing
+        # With workers, new and changed images are downloaded after the import
+        self.thumbnail_workers = thumbnail_workers
+        self.thumbnails = None
+        self.stats = ImportStats()
+        self.seen_ids = set()
+        self.changed_ids = []
+        # Location nodes by path, shared by every chunk of the run
+        self.location_cache = {}
+
+    def run(self, file):
+        reader = csv.DictReader(file)
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= self.batch_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        if self.expire_missing:
+            self.expire_unseen()
+        # New and moved listings get coordinates from their location string
+        for start in range(0, len(self.changed_ids), self.batch_size):
+            geocode_queryset(Scrape_MakaziListing.objects.filter(
+                pk__in=self.changed_ids[start:start + self.batch_size], latitude__isnull=True
+            ))
+        if not self.dry_run and (self.stats.inserted or self.stats.updated or self.stats.expired):
+            invalidate_listing_facets()
+            invalidate_model(Scrape_MakaziListing)
+            invalidate_autocomplete()
+        if self.changed_ids:
+            refresh_similar(Scrape_MakaziListing, self.changed_ids, batch_size=self.batch_size)
+        if self.thumbnail_workers and not self.dry_run:
+            self.thumbnails = fetch_pending_thumbnails(workers=self.thumbnail_workers)
+        return self.stats
+
+    def import_chunk(self, rows):
+        # Later rows win when the same link appears twice in a chunk
+        cleaned = {}
+        for row in rows:
+            values = clean_row(row)
+            if values is None:
+                self.stats.skipped += 1
+                continue
+            if values['link'] in cleaned:
+                self.stats.skipped += 1
+            cleaned[values['link']] = values
+
+        if not cleaned:
+            return
+
+        existing = Scrape_MakaziListing.objects.in_bulk(list(cleaned), field_name='link')
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        update_fields = set(SCRAPED_FIELDS) | set(DERIVED_FIELDS)
+
+        for link, values in cleaned.items():
+            listing = existing.get(link)
+            if listing is None:
+                listing = Scrape_MakaziListing(**values)
+                to_create.append(listing)
+            else:
+                self.seen_ids.add(listing.pk)
+                if not self.has_changed(listing, values):
+                    self.stats.unchanged += 1
+                    continue
+                if listing.location != values['location']:
+                    # Moved: the coordinates are geocoded again after the import
+                    listing.latitude = listing.longitude = None
+                    listing.geohash = ''
+                    update_fields.update(['latitude', 'longitude', 'geohash'])
+                for field, value in values.items():
+                    setattr(listing, field, value)
+                update_fields.update(field for field in values if field != 'link')
+                to_update.append(listing)
+
+        if not self.dry_run:
+            # One query for the known places of every row being written
+            Location.objects.preload(
+                (listing.location for listing in to_create + to_update), self.location_cache
+            )
+        for listing in to_create + to_update:
+            listing.scraped_at = now
+            listing.is_available = True
+            listing.set_price_fields()
+            listing.set_slug()
+            if not self.dry_run:
+                listing.resolve_area(cache=self.location_cache)
+            listing.content_hash = listing.compute_content_hash()
+
+        if not self.dry_run and (to_create or to_update):
+            with transaction.atomic():
+                if to_create:
+                    Scrape_MakaziListing.objects.bulk_create(to_create, batch_size=self.batch_size)
+                if to_update:
+                    Scrape_MakaziListing.objects.bulk_update(
+                        to_update, sorted(update_fields), batch_size=self.batch_size
+                    )
+                # Bulk writes skip post_save, so index the batch directly
+                get_search_backend().index(to_create + to_update)
+            self.changed_ids.extend(listing.pk for listing in to_create + to_update if listing.pk)
+
+        self.stats.inserted += len(to_create)
+        self.stats.updated += len(to_update)
+        self.seen_ids.update(listing.pk for listing in to_create if listing.pk)
+
+    @staticmethod
+    def has_changed(listing, values):
+        if not listing.is_available:
+            return True
+        content_hash = listing_content_hash(*(values.get(field) for field in SCRAPED_FIELDS))
+        if content_hash != listing.content_hash:
+            return True
+        return any(
+            getattr(listing, field) != value
+            for field, value in values.items()
+            if field not in SCRAPED_FIELDS and field != 'link'
+        )
+
+    def expire_unseen(self):
+        """Mark available listings that were not in this feed as unavailable"""
+        available_ids = Scrape_MakaziListing.objects.filter(
+            is_available=True
+        ).values_list('id', flat=True)
+        missing = [pk for pk in available_ids.iterator() if pk not in self.seen_ids]
+        self.stats.expired = len(missing)
+        if self.dry_run:
+            return
+
+        with transaction.atomic():
+            for start in range(0, len(missing), self.batch_size):
+                Scrape_MakaziListing.objects.filter(
+                    id__in=missing[start:start + self.batch_size]
+                ).update(is_available=False)
@@ -0,0 +1,186 @@
+# makazi/instrumentation.py
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger('makazi.metrics')
+
+# Metrics of the request being handled. A context variable rather than a
+# thread local, so queries an async view runs through sync_to_async are
+# still counted against its request.
+_current = ContextVar('makazi_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries than settings.QUERY_BUDGETS allows"""
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper: counts and times queries of the current request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate:
+    """Template wrapper adding its render time to the current request"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time reported to RequestMetricsMiddleware.
+
+    Time spent in context processors and in queries run while rendering
+    (lazy querysets, the sidebar facets) is part of the template time.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def query_budget(view_name):
+    """Allowed query count for a view name such as 'makazi:listings', or None"""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view_name, budgets.get('*'))
+
+
+def server_timing(metrics, total_time):
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.template_time * 1000:.1f}',
+        f'total;dur={total_time * 1000:.1f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    """Per-request query count, DB time, template time and response size.
+
+    The numbers go out as a Server-Timing header (visible in the browser's
+    network panel) when settings.SERVER_TIMING is on, which by default it
+    is only with DEBUG, and as one 'makazi.metrics' log line per request:
+    DEBUG normally, WARNING past settings.SLOW_REQUEST_MS. Views listed in
+    settings.QUERY_BUDGETS log a warning when they run more queries than
+    budgeted; with QUERY_BUDGET_RAISE = True (e.g. in tests) they raise
+    QueryBudgetExceeded instead.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(sender=None, connection=connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    def process_metrics(self, request, response, metrics):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        # Streamed bodies (and the queries feeding them) run after this point,
+        # so only their headers are measured
+        size = None if response.streaming else len(response.content)
+        total_time = metrics.total_time
+
+        # Timings tell visitors how the site performs; keep them to development
+        if getattr(settings, 'SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = server_timing(metrics, total_time)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+            'bytes': size,
+        }
+        slow = record['total_ms'] > getattr(settings, 'SLOW_REQUEST_MS', 500)
+        logger.log(
+            logging.WARNING if slow else logging.DEBUG,
+            ' '.join(f'{key}={value}' for key, value in record.items()),
+            extra={'metrics': record},
+        )
+
+        budget = query_budget(view_name) if view_name else None
+        if budget is not None and metrics.queries > budget:
+            message = f"{view_name} ran {metrics.queries} queries, budget is {budget} ({request.path})"
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'metrics': record})
+        return response
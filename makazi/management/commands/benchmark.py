@@ -0,0 +1,168 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from makazi.benchmarks import SyntheticCatalog, run_benchmarks
+from makazi.models import Scrape_MakaziListing
+
+
+# The benchmark clears the cache and bumps page versions for every
+# model; it gets its own per-process cache, never the shared one
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'makazi-benchmark',
+    }
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the listing, apartment and hostel views and import_makazi on a "
+        "synthetic catalog in a throwaway database and cache; writes results as JSON. "
+        "Example: manage.py benchmark --scale 100000 --keepdb --output bench.json "
+        "--compare bench-main.json"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=10000,
+            help='Number of synthetic listings, e.g. 10000, 100000, 1000000 (default: 10000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Times each scenario URL is requested (default: 5)'
+        )
+        parser.add_argument(
+            '--import-rows',
+            type=int,
+            default=1000,
+            help='Rows in the synthetic CSV for the import_makazi scenario, 0 to skip (default: 1000)'
+        )
+        parser.add_argument(
+            '--warm',
+            action='store_true',
+            help='Keep the cache between requests instead of measuring cold views'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed for the synthetic data (default: 1)'
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='JSON file to write the results to (default: benchmark.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Earlier benchmark JSON file to print p50/query changes against'
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the benchmark database, and reuse it when it already has the requested scale'
+        )
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        # Never touch the real database or cache: benchmark in a separate
+        # database, named by scale so --keepdb can reuse generated data
+        # across commits
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'nyumbafasta_benchmark_{scale}.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+            try:
+                scenarios = self.run_scenarios(scale, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'created': timezone.now().isoformat(),
+                'scale': scale,
+                'repeat': options['repeat'],
+                'warm': options['warm'],
+                'seed': options['seed'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'scenarios': scenarios,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+
+        if options['compare']:
+            self.compare(options['compare'], scenarios)
+
+        self.stdout.write(self.style.SUCCESS(f"Benchmark results written to {options['output']}"))
+
+    def run_scenarios(self, scale, options):
+        """Generate (or reuse) the catalog in the benchmark database and time the scenarios"""
+        catalog = SyntheticCatalog(scale, seed=options['seed'], stdout=self.stdout)
+        existing = Scrape_MakaziListing.objects.count()
+        if existing != scale:
+            if existing:
+                call_command('flush', interactive=False, verbosity=0)
+            started = time.monotonic()
+            catalog.generate()
+            self.stdout.write(f"Catalog generated in {time.monotonic() - started:.1f}s")
+        else:
+            self.stdout.write(f"Reusing the {scale} listing catalog in {connection.settings_dict['NAME']}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            return run_benchmarks(
+                catalog,
+                repeat=options['repeat'],
+                warm=options['warm'],
+                import_rows=options['import_rows'],
+                import_path=os.path.join(directory, 'benchmark.csv'),
+                stdout=self.stdout,
+            )
+
+    def compare(self, path, scenarios):
+        with open(path, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        self.stdout.write(f"Compared with {path} (revision {baseline['meta'].get('revision')}):")
+        for name, result in scenarios.items():
+            before = baseline['scenarios'].get(name)
+            if not before:
+                continue
+            key = 'p50_ms' if 'p50_ms' in result else 'total_ms'
+            queries = 'queries_max' if 'queries_max' in result else 'queries'
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0
+            line = (
+                f"  {name:32} {key} {before[key]:9.2f} -> {result[key]:9.2f} ({change:+.0f}%)  "
+                f"queries {before[queries]} -> {result[queries]}"
+            )
+            self.stdout.write(self.style.WARNING(line) if change > 10 else line)
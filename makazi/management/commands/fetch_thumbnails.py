@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from makazi.thumbnails import THUMBNAIL_WORKERS, fetch_pending_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Download and resize the scraped listing images that have no local thumbnail yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=THUMBNAIL_WORKERS,
+            help=f'Images downloaded at once (default: {THUMBNAIL_WORKERS})'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry images whose earlier download failed'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Fetch at most this many images'
+        )
+
+    def handle(self, *args, **options):
+        fetcher = fetch_pending_thumbnails(
+            workers=options['workers'],
+            retry_failed=options['retry_failed'],
+            limit=options['limit'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(fetcher.summary()))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from makazi.images import process_images
+from makazi.models import ApartmentImage, HostelImage
+
+
+class Command(BaseCommand):
+    help = "Generate the card/gallery/full WebP and JPEG variants, URLs and sizes of apartment and hostel gallery images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate every image, not only new or replaced ones (e.g. after changing VARIANTS)'
+        )
+
+    def handle(self, *args, **options):
+        for model in [ApartmentImage, HostelImage]:
+            started = time.monotonic()
+            generated = 0
+            for pk in model.objects.order_by('pk').values_list('pk', flat=True).iterator():
+                generated += process_images(model, pk, force=options['force'])
+            self.stdout.write(
+                f"{generated} {model._meta.verbose_name_plural} "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Image variants generated successfully!"))
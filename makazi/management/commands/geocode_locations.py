@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from makazi.autocomplete import invalidate_autocomplete
+from makazi.geocoding import geocode_queryset
+from makazi.models import Apartment, Hostel, Scrape_MakaziListing
+from makazi.page_cache import invalidate_model
+
+
+class Command(BaseCommand):
+    help = "Fill latitude/longitude from location strings using the bundled gazetteer"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Also geocode rows that already have coordinates'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be resolved without writing to the database'
+        )
+
+    def handle(self, *args, **options):
+        for model in [Scrape_MakaziListing, Apartment, Hostel]:
+            started = time.monotonic()
+            queryset = model.objects.all()
+            if not options['overwrite']:
+                queryset = queryset.filter(latitude__isnull=True)
+
+            counts = geocode_queryset(queryset, dry_run=options['dry_run'])
+            if not options['dry_run']:
+                invalidate_model(model)
+                invalidate_autocomplete()
+
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: "
+                f"{counts['ward']} by ward, {counts['district']} by district, "
+                f"{counts['region']} by region, {counts['unresolved']} unresolved "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Geocoding completed successfully!"))
+#python manage.py geocode_locations --overwrite
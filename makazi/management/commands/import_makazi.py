@@ -1,7 +1,5 @@
-import csv
 from django.core.management.base import BaseCommand
-from makazi.models import Scrape_MakaziListing
-from django.utils.dateparse import parse_datetime
+from makazi.importers import MakaziCSVImporter
 
 
 class Command(BaseCommand):
@@ -13,37 +11,48 @@ class Command(BaseCommand):
             type=str,
             help='Path to makazi.csv'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of CSV rows written per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Parse and match rows without writing to the database'
+        )
+        parser.add_argument(
+            '--expire-missing',
+            action='store_true',
+            help='Mark listings that are not in this CSV as unavailable'
+        )
+        parser.add_argument(
+            '--thumbnails',
+            type=int,
+            default=0,
+            metavar='WORKERS',
+            help='Download thumbnails of new and changed images with this many threads afterwards'
+        )
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
+        importer = MakaziCSVImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            expire_missing=options['expire_missing'],
+            thumbnail_workers=options['thumbnails'],
+        )
 
         try:
             with open(csv_file, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-
-                for row in reader:
-                    Scrape_MakaziListing.objects.update_or_create(
-                        link=row['link'],   # unique field
-                        defaults={
-                            'title': row['title'],
-                            'price': row['price'],
-                            'location': row['location'],
-                            'description': row['description'],
-                            'main_image_url': row['main_image_url'],
-                            'scraped_at': parse_datetime(row['scraped_at']),
-
-                            # extra model fields — set default values
-                            'property_type': '',
-                            'bedrooms': None,
-                            'bathrooms': None,
-                            'area_sqft': None,
-                            'is_featured': False,
-                            'is_verified': False,
-                        }
-                    )
-
-            self.stdout.write(self.style.SUCCESS("Import Completed Successfully!"))
-
+                stats = importer.run(file)
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR("File not found. Check the path of makazi.csv"))
-#python manage.py import_makazi makazi.csv
\ No newline at end of file
+            return
+
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Import Completed Successfully! {stats.summary()}"))
+        if importer.thumbnails:
+            self.stdout.write(importer.thumbnails.summary())
+#python manage.py import_makazi makazi.csv --batch-size 1000
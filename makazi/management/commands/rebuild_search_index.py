@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from makazi.models import Apartment, Hostel, Scrape_MakaziListing
+from makazi.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for listings, apartments and hostels"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        for model in [Scrape_MakaziListing, Apartment, Hostel]:
+            backend.rebuild(model)
+            self.stdout.write(f"Indexed {model.objects.count()} {model._meta.verbose_name_plural}")
+
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt successfully!"))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from makazi.models import Apartment, Hostel, Scrape_MakaziListing
+from makazi.similarity import refresh_similar
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed similar items for listings, apartments and hostels"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only objects without stored neighbours (after migrating, or edited since the last run)'
+        )
+
+    def handle(self, *args, **options):
+        for model in [Scrape_MakaziListing, Apartment, Hostel]:
+            started = time.monotonic()
+            ids = None
+            if options['missing']:
+                ids = model.objects.filter(similar_ids__isnull=True).values_list('pk', flat=True)
+            neighbours = refresh_similar(model, ids)
+            self.stdout.write(
+                f"{len(neighbours)} {model._meta.verbose_name_plural} "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Similar items rebuilt successfully!"))
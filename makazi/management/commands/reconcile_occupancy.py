@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from makazi.models import Hostel
+
+
+class Command(BaseCommand):
+    help = "Recount hostel occupancy and available rooms from confirmed bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report hostels whose stored occupancy is wrong'
+        )
+
+    def handle(self, *args, **options):
+        drifted = Hostel.objects.reconcile_occupancy(dry_run=options['dry_run'])
+        for hostel_id, stored, counted in drifted:
+            self.stdout.write(f"Hostel {hostel_id}: occupancy {stored} -> {counted}")
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted)} hostels would be corrected")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Occupancy reconciled, {len(drifted)} hostels corrected"))
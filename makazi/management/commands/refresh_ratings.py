@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from makazi.models import ApartmentReview, HostelReview
+from makazi.ratings import refresh_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute apartment and hostel rating counts and averages from approved reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=['apartments', 'hostels'],
+            help='Only refresh this model (default: both)'
+        )
+
+    def handle(self, *args, **options):
+        review_models = {'apartments': ApartmentReview, 'hostels': HostelReview}
+        for name, review_model in review_models.items():
+            if options['model'] and options['model'] != name:
+                continue
+            updated = refresh_ratings(review_model)
+            self.stdout.write(f"{updated} {name} refreshed")
+
+        self.stdout.write(self.style.SUCCESS("Ratings refreshed successfully!"))
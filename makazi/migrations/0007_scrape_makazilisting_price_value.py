@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:02
+
+import re
+
+from django.db import migrations, models
+
+
+def parse_price(price_str):
+    """makazi.models.parse_price as of this migration"""
+    if not price_str:
+        return 0, ''
+
+    price_str = str(price_str).lower()
+
+    numbers = re.findall(r'[\d,]+', price_str)
+    amount = 0
+    for number in numbers:
+        digits = number.replace(',', '')
+        if digits:
+            amount = int(digits)
+            break
+
+    if 'month' in price_str or 'mwezi' in price_str:
+        period = 'month'
+    elif 'year' in price_str or 'mwaka' in price_str:
+        period = 'year'
+    else:
+        period = ''
+
+    return amount, period
+
+
+def backfill_price_value(apps, schema_editor):
+    Listing = apps.get_model('makazi', 'Scrape_MakaziListing')
+    batch = []
+    for listing in Listing.objects.only('id', 'price').iterator(chunk_size=2000):
+        listing.price_value, listing.price_period = parse_price(listing.price)
+        batch.append(listing)
+        if len(batch) >= 2000:
+            Listing.objects.bulk_update(batch, ['price_value', 'price_period'])
+            batch = []
+    if batch:
+        Listing.objects.bulk_update(batch, ['price_value', 'price_period'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0006_hostel_hostelreview_hostelbooking_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='price_period',
+            field=models.CharField(blank=True, choices=[('month', 'Per Month'), ('year', 'Per Year')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='price_value',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_price_value, migrations.RunPython.noop),
+    ]
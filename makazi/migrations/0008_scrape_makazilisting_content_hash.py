@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:03
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def listing_content_hash(title, price, location, description, main_image_url):
+    """makazi.models.listing_content_hash as of this migration"""
+    parts = [title, price, location, description, main_image_url]
+    payload = '\x1f'.join(str(part or '') for part in parts)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    Listing = apps.get_model('makazi', 'Scrape_MakaziListing')
+    fields = ['title', 'price', 'location', 'description', 'main_image_url']
+    batch = []
+    for listing in Listing.objects.only('id', *fields).iterator(chunk_size=2000):
+        listing.content_hash = listing_content_hash(*(getattr(listing, f) for f in fields))
+        batch.append(listing)
+        if len(batch) >= 2000:
+            Listing.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        Listing.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0007_scrape_makazilisting_price_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='is_available',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
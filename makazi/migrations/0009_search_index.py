@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+# makazi.search.SEARCH_FIELDS columns as of this migration, in index order
+SEARCH_COLUMNS = {
+    'makazi.scrape_makazilisting': ['title', 'location', 'property_type', 'description'],
+    'makazi.apartment': ['title', 'location', 'apartment_type', 'description'],
+    'makazi.hostel': ['name', 'university', 'location', 'description'],
+}
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for key, fields in SEARCH_COLUMNS.items():
+            model = apps.get_model(key)
+            table = f'{model._meta.db_table}_fts'
+            columns = ', '.join(fields)
+            # makazi.search.SQLiteFTSBackend.create_tables as of this migration
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"{columns}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (rowid, {columns}) "
+                f"SELECT id, {columns} FROM {model._meta.db_table}"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for key in SEARCH_COLUMNS:
+            cursor.execute(f"DROP TABLE IF EXISTS {apps.get_model(key)._meta.db_table}_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0008_scrape_makazilisting_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
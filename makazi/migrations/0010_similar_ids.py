@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='similar_ids',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='similar_ids',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='similar_ids',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
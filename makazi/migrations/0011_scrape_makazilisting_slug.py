@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:14
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_slug(apps, schema_editor):
+    Listing = apps.get_model('makazi', 'Scrape_MakaziListing')
+    batch = []
+    for listing in Listing.objects.only('id', 'title').iterator(chunk_size=2000):
+        listing.slug = slugify(listing.title)[:255]
+        batch.append(listing)
+        if len(batch) >= 2000:
+            Listing.objects.bulk_update(batch, ['slug'])
+            batch = []
+    if batch:
+        Listing.objects.bulk_update(batch, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0010_similar_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_slug, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+# makazi.geo as of this migration
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_for(latitude, longitude):
+    """makazi.geo.geohash_for as of this migration"""
+    if latitude is None or longitude is None:
+        return ''
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < GEOHASH_PRECISION:
+        rng, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            rng[0] = middle
+        else:
+            rng[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def backfill_geohash(apps, schema_editor):
+    for model_name in ['Scrape_MakaziListing', 'Apartment', 'Hostel']:
+        model = apps.get_model('makazi', model_name)
+        rows = model.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).only('id', 'latitude', 'longitude')
+        batch = []
+        for obj in rows.iterator(chunk_size=2000):
+            obj.geohash = geohash_for(obj.latitude, obj.longitude)
+            batch.append(obj)
+        model.objects.bulk_update(batch, ['geohash'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0011_scrape_makazilisting_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
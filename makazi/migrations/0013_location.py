@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:21
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def normalize_name(name):
+    """makazi.geocoding.normalize_name as of this migration"""
+    return re.sub(r'\s+', ' ', str(name or '')).strip().lower()
+
+
+def location_parts(location):
+    """makazi.geocoding.location_parts as of this migration"""
+    parts = [re.sub(r'\s+', ' ', part).strip() for part in str(location or '').split(',')]
+    return [part for part in parts if part][-3:]
+
+
+def backfill_locations(apps, schema_editor):
+    Location = apps.get_model('makazi', 'Location')
+    levels = ['region', 'district', 'ward']
+    nodes = {}
+
+    def node_for(location):
+        names = list(reversed(location_parts(location)))
+        parent = None
+        for depth, name in enumerate(names):
+            path = '/'.join(normalize_name(n) for n in names[:depth + 1])
+            if path not in nodes:
+                nodes[path], _ = Location.objects.get_or_create(path=path, defaults={
+                    'name': name, 'key': normalize_name(name),
+                    'level': levels[depth], 'parent': parent,
+                })
+            parent = nodes[path]
+        return parent
+
+    for model_name in ['Scrape_MakaziListing', 'Apartment', 'Hostel']:
+        model = apps.get_model('makazi', model_name)
+        locations = model.objects.order_by().values_list('location', flat=True).distinct()
+        for location in list(locations):
+            node = node_for(location)
+            if node is not None:
+                model.objects.filter(location=location).update(area=node)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0012_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(db_index=True, max_length=100)),
+                ('level', models.CharField(choices=[('region', 'Region'), ('district', 'District'), ('ward', 'Ward')], max_length=10)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='makazi.location')),
+            ],
+            options={
+                'ordering': ['path'],
+            },
+        ),
+        migrations.AddField(
+            model_name='apartment',
+            name='area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='apartments', to='makazi.location'),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='hostels', to='makazi.location'),
+        ),
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='listings', to='makazi.location'),
+        ),
+        migrations.RunPython(backfill_locations, migrations.RunPython.noop),
+    ]
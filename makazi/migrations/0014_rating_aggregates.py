@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:36
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+RATINGS = [
+    ('ApartmentReview', 'Apartment', 'apartment_id', {'rating': 'avg_rating'}),
+    ('HostelReview', 'Hostel', 'hostel_id', {
+        'overall_rating': 'avg_overall',
+        'cleanliness': 'avg_cleanliness',
+        'security': 'avg_security',
+        'facilities': 'avg_facilities',
+        'management': 'avg_management',
+    }),
+]
+
+
+def backfill_ratings(apps, schema_editor):
+    for review_name, parent_name, parent_id, fields in RATINGS:
+        review_model = apps.get_model('makazi', review_name)
+        parent_model = apps.get_model('makazi', parent_name)
+        rows = review_model.objects.filter(is_approved=True).order_by().values(parent_id).annotate(
+            count=Count('pk'), **{f'avg_{field}': Avg(field) for field in fields}
+        )
+        for row in rows:
+            parent_model.objects.filter(pk=row[parent_id]).update(
+                rating_count=row['count'],
+                **{average: row[f'avg_{field}'] or 0.0 for field, average in fields.items()},
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0013_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='avg_rating',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='apartment',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='avg_cleanliness',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='avg_facilities',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='avg_management',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='avg_overall',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='avg_security',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
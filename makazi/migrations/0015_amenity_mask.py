@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+# AMENITIES_CHOICES keys as of this migration (bit order)
+AMENITY_KEYS = {
+    'Apartment': [
+        'wifi', 'parking', 'pool', 'gym', 'security', 'elevator',
+        'ac', 'heating', 'laundry', 'balcony', 'garden', 'playground',
+    ],
+    'Hostel': [
+        'wifi', 'library', 'cafeteria', 'laundry', 'security', 'cleaning',
+        'hot_water', 'generator', 'parking', 'sports', 'medical', 'kitchen',
+    ],
+}
+
+
+def amenity_mask(amenities, keys):
+    """makazi.models.amenity_mask as of this migration"""
+    bits = {key: 1 << index for index, key in enumerate(keys)}
+    mask = 0
+    for amenity in amenities or []:
+        mask |= bits.get(amenity, 0)
+    return mask
+
+
+def backfill_amenity_mask(apps, schema_editor):
+    for model_name, keys in AMENITY_KEYS.items():
+        model = apps.get_model('makazi', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'amenities').iterator(chunk_size=2000):
+            obj.amenity_mask = amenity_mask(obj.amenities, keys)
+            batch.append(obj)
+        model.objects.bulk_update(batch, ['amenity_mask'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0014_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='amenity_mask',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='amenity_mask',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_amenity_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0016_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='thumbnail_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='scrape_makazilisting',
+            name='thumbnail_source',
+            field=models.URLField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,180 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:49
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+import django.db.models.deletion
+from PIL import Image
+
+
+# The old fixed slots, in gallery order; main_image becomes position 0
+IMAGE_SLOTS = ['main_image', 'image_1', 'image_2', 'image_3', 'image_4']
+GALLERIES = [('Apartment', 'ApartmentImage', 'apartment'), ('Hostel', 'HostelImage', 'hostel')]
+# makazi.images VARIANTS and FORMATS as of this migration
+VARIANTS = ['card', 'gallery', 'full']
+FORMATS = ['webp', 'jpeg']
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def ported_variants(entry, name):
+    """A slot's image_variants entry in the gallery format, with the stored paths as URLs.
+
+    Empty when the entry was made for another file or is incomplete; the
+    row is then stale and generate_image_variants remakes it.
+    """
+    if not entry or entry.get('source') != name:
+        return {}
+    variants = {'source': name}
+    for variant in VARIANTS:
+        files = entry.get(variant) or {}
+        if not all(files.get(fmt) for fmt in FORMATS):
+            return {}
+        variants[variant] = dict(files, **{fmt: default_storage.url(files[fmt]) for fmt in FORMATS})
+    return variants
+
+
+def original_size(name):
+    """(width, height) after EXIF rotation, read from the file header only"""
+    try:
+        with default_storage.open(name, 'rb') as handle:
+            image = Image.open(handle)
+            width, height = image.size
+            if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+    except (OSError, Image.DecompressionBombError):
+        return None, None
+    return width, height
+
+
+def copy_images_to_gallery(apps, schema_editor):
+    """One gallery row per filled slot, keeping variants already made for that file"""
+    for parent_name, image_name, parent_field in GALLERIES:
+        parent_model = apps.get_model('makazi', parent_name)
+        image_model = apps.get_model('makazi', image_name)
+        batch = []
+        for parent in parent_model.objects.only('id', 'image_variants', *IMAGE_SLOTS).iterator(chunk_size=2000):
+            for position, slot in enumerate(IMAGE_SLOTS):
+                name = getattr(parent, slot).name
+                if not name:
+                    continue
+                variants = ported_variants((parent.image_variants or {}).get(slot), name)
+                width, height = original_size(name) if variants else (None, None)
+                batch.append(image_model(**{
+                    f'{parent_field}_id': parent.pk,
+                    'image': name,
+                    'position': position,
+                    'url': default_storage.url(name),
+                    'width': width,
+                    'height': height,
+                    'variants': variants if width else {},
+                }))
+        image_model.objects.bulk_create(batch, batch_size=2000)
+
+
+def copy_gallery_to_images(apps, schema_editor):
+    """Reverse: the first five gallery images back into the fixed slots"""
+    for parent_name, image_name, parent_field in GALLERIES:
+        parent_model = apps.get_model('makazi', parent_name)
+        image_model = apps.get_model('makazi', image_name)
+        slots = {}
+        for image in image_model.objects.order_by(parent_field, 'position', 'id').iterator(chunk_size=2000):
+            names = slots.setdefault(getattr(image, f'{parent_field}_id'), [])
+            if len(names) < len(IMAGE_SLOTS):
+                names.append(image.image.name)
+        for parent_id, names in slots.items():
+            parent_model.objects.filter(pk=parent_id).update(**dict(zip(IMAGE_SLOTS, names)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0017_listing_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApartmentImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0, help_text='Lowest first; the first image is the main image')),
+                ('url', models.CharField(blank=True, editable=False, max_length=500)),
+                ('width', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('variants', models.JSONField(blank=True, default=dict, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('image', models.ImageField(upload_to='apartments/')),
+                ('apartment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gallery', to='makazi.apartment')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HostelImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0, help_text='Lowest first; the first image is the main image')),
+                ('url', models.CharField(blank=True, editable=False, max_length=500)),
+                ('width', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('variants', models.JSONField(blank=True, default=dict, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('image', models.ImageField(upload_to='hostels/')),
+                ('hostel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gallery', to='makazi.hostel')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(copy_images_to_gallery, copy_gallery_to_images),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='image_1',
+        ),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='image_2',
+        ),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='image_3',
+        ),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='image_4',
+        ),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='image_variants',
+        ),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='main_image',
+        ),
+        migrations.RemoveField(
+            model_name='hostel',
+            name='image_1',
+        ),
+        migrations.RemoveField(
+            model_name='hostel',
+            name='image_2',
+        ),
+        migrations.RemoveField(
+            model_name='hostel',
+            name='image_3',
+        ),
+        migrations.RemoveField(
+            model_name='hostel',
+            name='image_4',
+        ),
+        migrations.RemoveField(
+            model_name='hostel',
+            name='image_variants',
+        ),
+        migrations.RemoveField(
+            model_name='hostel',
+            name='main_image',
+        ),
+    ]
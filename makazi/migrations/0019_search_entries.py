@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('makazi', '0018_gallery_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApartmentSearchEntry',
+            fields=[
+                ('apartment', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='makazi.apartment')),
+            ],
+            options={
+                'db_table': 'makazi_apartment_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HostelSearchEntry',
+            fields=[
+                ('hostel', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='makazi.hostel')),
+            ],
+            options={
+                'db_table': 'makazi_hostel_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ListingSearchEntry',
+            fields=[
+                ('listing', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='makazi.scrape_makazilisting')),
+            ],
+            options={
+                'db_table': 'makazi_scrape_makazilisting_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,11 +1,288 @@
 # makazi/models.py
 from django.db import models
+from django.db.models.lookups import Exact
 from django.utils.text import slugify
 from django.urls import reverse
+import hashlib
 import re            # <--- ONGOZA HAPA
 
+from .geo import geohash_for
+from .geocoding import location_parts, normalize_name
+from .images import ResponsiveImage
+from .page_cache import invalidate_model, invalidate_object
+
+
+def parse_price(price_str):
+    """Parse a scraped price string into (amount, period).
+
+    The amount is the first number in the string and the period is
+    'month', 'year' or '' when the string does not mention one.
+    """
+    if not price_str:
+        return 0, ''
+
+    price_str = str(price_str).lower()
+
+    numbers = re.findall(r'[\d,]+', price_str)
+    amount = 0
+    for number in numbers:
+        digits = number.replace(',', '')
+        if digits:
+            amount = int(digits)
+            break
+
+    if 'month' in price_str or 'mwezi' in price_str:
+        period = 'month'
+    elif 'year' in price_str or 'mwaka' in price_str:
+        period = 'year'
+    else:
+        period = ''
+
+    return amount, period
+
+
+def listing_content_hash(title, price, location, description, main_image_url):
+    """SHA-256 over the scraped content of a listing"""
+    parts = [title, price, location, description, main_image_url]
+    payload = '\x1f'.join(str(part or '') for part in parts)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def amenity_mask(amenities, choices):
+    """Integer with bit i set for each amenity that is the i-th key of `choices`.
+
+    Bits follow the order of AMENITIES_CHOICES, so new amenities must be
+    appended there, never inserted or reordered. Unknown keys are ignored.
+    """
+    bits = {key: 1 << index for index, (key, label) in enumerate(choices)}
+    mask = 0
+    for amenity in amenities or []:
+        mask |= bits.get(amenity, 0)
+    return mask
+
+
+def fields_except(instance, excluded):
+    """update_fields for a save writing every column but `excluded`"""
+    return [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in excluded
+    ]
+
+
+def with_amenities(queryset, amenities):
+    """Rows having every one of `amenities`, as one `amenity_mask & m = m` predicate.
+
+    The predicate can't use an index, so it is evaluated per row; on these
+    tables that is one integer test instead of a JSON scan per amenity.
+    """
+    choices = queryset.model.AMENITIES_CHOICES
+    if not amenities:
+        return queryset
+    if not set(amenities) <= {key for key, label in choices}:
+        return queryset.none()
+    mask = amenity_mask(amenities, choices)
+    return queryset.filter(Exact(models.F('amenity_mask').bitand(mask), mask))
+
+
+class GalleryImage(ResponsiveImage, models.Model):
+    """One photo of an apartment or hostel gallery.
+
+    `url`, `width`, `height` and `variants` are filled in by the image
+    worker (makazi/images.py), so rendering a gallery needs no storage
+    calls: prefetch the parent's `gallery` and read them.
+    """
+    position = models.PositiveSmallIntegerField(default=0, help_text="Lowest first; the first image is the main image")
+    url = models.CharField(max_length=500, blank=True, editable=False)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # {'source': file name, 'card'|'gallery'|'full': {'width', 'height', 'webp', 'jpeg'}}
+    # with the webp/jpeg values as URLs
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Name of the ForeignKey to the apartment or hostel
+    parent_field = None
+
+    class Meta:
+        abstract = True
+        ordering = ['position', 'id']
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The storage may rename the upload while saving, so the URL is
+        # only known now; written with update() to skip the save signals
+        url = self.image.url if self.image else ''
+        if url != self.url:
+            self.url = url
+            type(self).objects.filter(pk=self.pk).update(url=url)
+
+    def is_stale(self):
+        """True when the URL or variants were made for another file, or not made yet"""
+        return self.variants.get('source') != self.image.name or self.width is None
+
+    def get_parent_stub(self):
+        """The apartment/hostel as an unsaved stub carrying only its pk, e.g. for cache invalidation"""
+        field = self._meta.get_field(self.parent_field)
+        return field.related_model(pk=getattr(self, field.attname))
+
+
+LOCATION_LEVELS = ['region', 'district', 'ward']
+
+
+def location_path(names):
+    """Normalized "region/district/ward" path for names ordered from the region down"""
+    return '/'.join(normalize_name(name) for name in names)
+
+
+class LocationManager(models.Manager):
+    def for_string(self, location, cache=None):
+        """Location node for "Ward, District, Region", creating missing levels.
+
+        `cache` maps paths to nodes and can be shared across calls, e.g. for
+        the rows of one import. Returns None for an empty string.
+        """
+        names = list(reversed(location_parts(location)))
+        if not names:
+            return None
+        cache = {} if cache is None else cache
+
+        leaf_path = location_path(names)
+        if leaf_path not in cache:
+            leaf = self.filter(path=leaf_path).first()
+            if leaf is not None:
+                cache[leaf_path] = leaf
+
+        parent = None
+        for depth, name in enumerate(names):
+            path = location_path(names[:depth + 1])
+            node = cache.get(path)
+            if node is None:
+                node, _ = self.get_or_create(path=path, defaults={
+                    'name': name,
+                    'key': normalize_name(name),
+                    'level': LOCATION_LEVELS[depth],
+                    'parent': parent,
+                })
+                cache[path] = node
+            parent = node
+        return parent
+
+    def preload(self, locations, cache):
+        """Put the existing nodes for several location strings into `cache`
+        with one query, so for_string only queries for new places.
+        """
+        paths = set()
+        for location in locations:
+            names = list(reversed(location_parts(location)))
+            paths.update(location_path(names[:depth + 1]) for depth in range(len(names)))
+        paths.difference_update(cache)
+        if paths:
+            cache.update(self.in_bulk(paths, field_name='path'))
+        return cache
+
+    def subtree_filter(self, location):
+        """Q on an `area` foreign key matching `location` and everything below it.
+
+        `location` is a single name ("Kinondoni", any level) or a full
+        "Ward, District, Region" string. Returns None when no node matches.
+        """
+        paths = list(self._matching_paths(location))
+        if not paths:
+            return None
+        return models.Q(area__in=self.subtree(paths).values('id'))
+
+    async def asubtree_filter(self, location):
+        """Async version of subtree_filter"""
+        paths = [path async for path in self._matching_paths(location)]
+        if not paths:
+            return None
+        return models.Q(area__in=self.subtree(paths).values('id'))
+
+    def _matching_paths(self, location):
+        names = list(reversed(location_parts(location)))
+        if len(names) > 1:
+            return self.filter(path=location_path(names)).values_list('path', flat=True)
+        return self.filter(key=normalize_name(names[0] if names else '')).values_list('path', flat=True)
+
+    def subtree(self, paths):
+        """Nodes at `paths` and all of their descendants"""
+        # Descendants share the node's path as a prefix; match it as a range
+        condition = models.Q(pk__in=[])
+        for path in paths:
+            condition |= models.Q(path=path) | models.Q(path__gt=f'{path}/', path__lt=f'{path}0')
+        return self.filter(condition)
+
+    def filter_area(self, queryset, location):
+        """Filter `queryset` to `location` and its sub-areas.
+
+        Falls back to a substring match on the raw location text for names
+        that are not in the hierarchy.
+        """
+        condition = self.subtree_filter(location)
+        if condition is None:
+            return queryset.filter(location__icontains=location)
+        return queryset.filter(condition)
+
+    async def afilter_area(self, queryset, location):
+        """Async version of filter_area"""
+        condition = await self.asubtree_filter(location)
+        if condition is None:
+            return queryset.filter(location__icontains=location)
+        return queryset.filter(condition)
+
+
+class Location(models.Model):
+    """Region -> district -> ward hierarchy parsed from location strings"""
+    LEVELS = [
+        ('region', 'Region'),
+        ('district', 'District'),
+        ('ward', 'Ward'),
+    ]
+
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, db_index=True)
+    level = models.CharField(max_length=10, choices=LEVELS)
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='children')
+    path = models.CharField(max_length=255, unique=True)
+
+    objects = LocationManager()
+
+    class Meta:
+        ordering = ['path']
+
+    def __str__(self):
+        return self.name
+
+
+class LocatedModel:
+    """Keeps an `area` foreign key in step with a `location` string.
+
+    The area is looked up only when the location changed since the row
+    was loaded, so saves that edit other fields cost no Location queries.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'location' in instance.__dict__:
+            instance._loaded_location = instance.location
+        return instance
+
+    def resolve_area(self, cache=None):
+        if 'location' not in self.__dict__:
+            # Deferred and never assigned, so unchanged
+            return
+        if self._state.adding or self.location != getattr(self, '_loaded_location', None):
+            self.area = Location.objects.for_string(self.location, cache=cache)
+            self._loaded_location = self.location
+
+
+class Scrape_MakaziListing(LocatedModel, models.Model):
+    PRICE_PERIODS = [
+        ('month', 'Per Month'),
+        ('year', 'Per Year'),
+    ]
 
-class Scrape_MakaziListing(models.Model):
     title = models.CharField(max_length=255, db_index=True)
     link = models.URLField(unique=True)
     price = models.CharField(max_length=100)
@@ -27,26 +304,61 @@ class Scrape_MakaziListing(models.Model):
     is_verified = models.BooleanField(default=False, db_index=True)
     digits_price = models.CharField(max_length=50, blank=True, db_index=True)
 
+    # Parsed price, kept in sync with `price` for SQL filtering and sorting
+    price_value = models.BigIntegerField(default=0, db_index=True)
+    price_period = models.CharField(max_length=10, choices=PRICE_PERIODS, blank=True)
+
+    # Import bookkeeping: fingerprint of the scraped content, and whether the
+    # listing was still present in the latest feed
+    content_hash = models.CharField(max_length=64, blank=True)
+    is_available = models.BooleanField(default=True, db_index=True)
+
+    # Precomputed neighbours for "similar listings" (see makazi/similarity.py);
+    # None means not computed yet
+    similar_ids = models.JSONField(null=True, blank=True, editable=False)
+
+    # slugify(title), stored so URLs are built without per-render slugify
+    slug = models.SlugField(max_length=255, blank=True, db_index=True, editable=False)
+
+    # Geohash of latitude/longitude for proximity search (see makazi/geo.py)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+
+    # Parsed from `location`, for indexed location filtering
+    area = models.ForeignKey(Location, null=True, blank=True, on_delete=models.SET_NULL, related_name='listings', editable=False)
+
+    # Local resized copy of main_image_url (see makazi/thumbnails.py): the
+    # SHA-256 of the stored thumbnail, and the URL it was fetched from. A
+    # source equal to main_image_url with an empty hash means the fetch failed.
+    thumbnail_hash = models.CharField(max_length=64, blank=True, editable=False)
+    thumbnail_source = models.URLField(blank=True, editable=False)
+
     
     @property
     def numeric_price(self):
-        """Extract numeric price for filtering and sorting"""
-        if not self.price:
-            return 0
-        
-        try:
-            # Remove all non-digit characters
-            price_str = re.sub(r'[^\d]', '', str(self.price))
-            if price_str:
-                return int(price_str)
-            return 0
-        except (ValueError, TypeError):
-            return 0
+        """Numeric price for filtering and sorting"""
+        return self.price_value
 
-    def save(self, *args, **kwargs):
-        # Extract digits from price
+    def set_price_fields(self):
+        """Refresh the derived price columns from `price`"""
         if self.price:
             self.digits_price = re.sub(r'[^0-9]', '', str(self.price))
+        self.price_value, self.price_period = parse_price(self.price)
+
+    def set_slug(self):
+        self.slug = slugify(self.title)[:255]
+
+    def compute_content_hash(self):
+        """Fingerprint of the scraped fields, used to skip unchanged rows on import"""
+        return listing_content_hash(
+            self.title, self.price, self.location, self.description, self.main_image_url
+        )
+
+    def save(self, *args, **kwargs):
+        self.set_price_fields()
+        self.set_slug()
+        self.geohash = geohash_for(self.latitude, self.longitude)
+        self.resolve_area()
+        self.content_hash = self.compute_content_hash()
         super().save(*args, **kwargs)
     
     class Meta:
@@ -65,10 +377,21 @@ class Scrape_MakaziListing(models.Model):
         return self.title
 
     def get_slug_id(self):
-        return f"{slugify(self.title)}-{self.id}"
+        return f"{self.slug}-{self.id}" if self.slug else str(self.id)
 
     def get_absolute_url(self):
         return reverse('makazi:property_detail', kwargs={'slug_id': self.get_slug_id()})
+
+    @property
+    def thumbnail_url(self):
+        """Card image: the cached thumbnail, or the proxy that fetches it; None without an image"""
+        if not self.main_image_url:
+            return None
+        if self.thumbnail_source != self.main_image_url:
+            return reverse('makazi:listing_thumbnail', args=[self.pk])
+        if self.thumbnail_hash:
+            return reverse('makazi:thumbnail_file', args=[self.thumbnail_hash])
+        return None
     
     def get_price_number(self):
         """Extract numeric price for sorting"""
@@ -105,7 +428,7 @@ class ContactMessage(models.Model):
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
-class Apartment(models.Model):
+class Apartment(LocatedModel, models.Model):
     APARTMENT_TYPES = [
         ('studio', 'Studio'),
         ('1bed', '1 Bedroom'),
@@ -152,13 +475,10 @@ class Apartment(models.Model):
     
     # Amenities (ManyToMany for multiple selections)
     amenities = models.JSONField(default=list, blank=True)
+    # The amenities as bits of AMENITIES_CHOICES, for filtering (see with_amenities)
+    amenity_mask = models.PositiveIntegerField(default=0, editable=False)
     
-    # Images
-    main_image = models.ImageField(upload_to='apartments/main/', null=True, blank=True)
-    image_1 = models.ImageField(upload_to='apartments/', null=True, blank=True)
-    image_2 = models.ImageField(upload_to='apartments/', null=True, blank=True)
-    image_3 = models.ImageField(upload_to='apartments/', null=True, blank=True)
-    image_4 = models.ImageField(upload_to='apartments/', null=True, blank=True)
+    # Images: see ApartmentImage (`gallery`)
     
     # Contact Information
     owner_name = models.CharField(max_length=100)
@@ -178,6 +498,15 @@ class Apartment(models.Model):
     # Location coordinates
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    area = models.ForeignKey(Location, null=True, blank=True, on_delete=models.SET_NULL, related_name='apartments', editable=False)
+    
+    # Precomputed similar apartments (see makazi/similarity.py)
+    similar_ids = models.JSONField(null=True, blank=True, editable=False)
+
+    # Approved review summary, kept up to date by makazi/ratings.py
+    rating_count = models.IntegerField(default=0, editable=False)
+    avg_rating = models.FloatField(default=0, db_index=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -189,23 +518,32 @@ class Apartment(models.Model):
             models.Index(fields=['created_at']),
         ]
     
+    # Maintained by atomic UPDATEs from makazi/ratings.py; saving a stale
+    # instance must not write them back
+    COUNTER_FIELDS = ['rating_count', 'avg_rating']
+
     def __str__(self):
         return f"{self.title} - {self.location}"
     
+    def save(self, *args, **kwargs):
+        self.geohash = geohash_for(self.latitude, self.longitude)
+        self.resolve_area()
+        self.amenity_mask = amenity_mask(self.amenities, self.AMENITIES_CHOICES)
+
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # A full edit, which mark_similar_stale can't tell apart from this
+            # update_fields save
+            self.similar_ids = None
+            kwargs['update_fields'] = fields_except(self, self.COUNTER_FIELDS)
+        super().save(*args, **kwargs)
+    
     def get_all_images(self):
-        """Get all images for the apartment"""
-        images = []
-        if self.main_image:
-            images.append(self.main_image.url)
-        if self.image_1:
-            images.append(self.image_1.url)
-        if self.image_2:
-            images.append(self.image_2.url)
-        if self.image_3:
-            images.append(self.image_3.url)
-        if self.image_4:
-            images.append(self.image_4.url)
-        return images
+        """Gallery images in order; prefetch_related('gallery') to load them for a whole page"""
+        return list(self.gallery.all())
+    
+    def get_main_image(self):
+        images = self.get_all_images()
+        return images[0] if images else None
     
     def get_total_price(self):
         """Calculate total price including all fees"""
@@ -217,6 +555,13 @@ class Apartment(models.Model):
             return self.description[:150] + '...'
         return self.description
 
+class ApartmentImage(GalleryImage):
+    apartment = models.ForeignKey(Apartment, on_delete=models.CASCADE, related_name='gallery')
+    image = models.ImageField(upload_to='apartments/')
+
+    parent_field = 'apartment'
+
+
 class ApartmentBooking(models.Model):
     BOOKING_STATUS = [
         ('pending', 'Pending'),
@@ -315,7 +660,63 @@ from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 import datetime
 
-class Hostel(models.Model):
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+# Rooms are shared: every four occupants take one room off `available_rooms`
+STUDENTS_PER_ROOM = 4
+
+
+def available_rooms_expression(occupancy):
+    return Greatest(Value(0), F('total_rooms') - occupancy / STUDENTS_PER_ROOM)
+
+
+class HostelManager(models.Manager):
+    def adjust_occupancy(self, hostel_id, delta):
+        """Add `delta` occupants in one UPDATE, computed from the current row.
+
+        Concurrent bookings each apply their own increment instead of
+        writing back a count read earlier, so none are lost.
+        """
+        if not delta:
+            return
+        occupancy = Greatest(F('current_occupancy') + delta, Value(0))
+        self.filter(pk=hostel_id).update(
+            current_occupancy=occupancy,
+            available_rooms=available_rooms_expression(occupancy),
+        )
+        invalidate_object(self.model(pk=hostel_id))
+
+    def occupancy_subquery(self):
+        confirmed = HostelBooking.objects.filter(
+            hostel=OuterRef('pk'), status__in=HostelBooking.OCCUPYING_STATUSES
+        ).order_by().values('hostel').annotate(count=Count('pk')).values('count')
+        return Coalesce(Subquery(confirmed), 0)
+
+    def reconcile_occupancy(self, dry_run=False):
+        """Recount occupancy from confirmed bookings for every hostel.
+
+        Returns [(hostel_id, stored, counted)] for the hostels whose stored
+        count was wrong. The fix is two set-based UPDATEs, not a row loop.
+        """
+        drifted = list(
+            self.annotate(counted=self.occupancy_subquery())
+            .exclude(current_occupancy=F('counted'))
+            .order_by('pk')
+            .values_list('pk', 'current_occupancy', 'counted')
+        )
+        if not dry_run:
+            with transaction.atomic():
+                self.update(current_occupancy=self.occupancy_subquery())
+                self.update(available_rooms=available_rooms_expression(F('current_occupancy')))
+            if drifted:
+                invalidate_model(self.model)
+        return drifted
+
+
+class Hostel(LocatedModel, models.Model):
     HOSTEL_TYPES = [
         ('university', 'University Hostel'),
         ('private', 'Private Hostel'),
@@ -367,6 +768,7 @@ class Hostel(models.Model):
     ]
     
     amenities = models.JSONField(default=list, blank=True)
+    amenity_mask = models.PositiveIntegerField(default=0, editable=False)
     total_rooms = models.IntegerField(default=1)
     available_rooms = models.IntegerField(default=1)
     total_capacity = models.IntegerField(default=1)
@@ -389,12 +791,24 @@ class Hostel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    # Images
-    main_image = models.ImageField(upload_to='hostels/main/', null=True, blank=True)
-    image_1 = models.ImageField(upload_to='hostels/', null=True, blank=True)
-    image_2 = models.ImageField(upload_to='hostels/', null=True, blank=True)
-    image_3 = models.ImageField(upload_to='hostels/', null=True, blank=True)
-    image_4 = models.ImageField(upload_to='hostels/', null=True, blank=True)
+    # Images: see HostelImage (`gallery`)
+    
+    # Location coordinates
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    area = models.ForeignKey(Location, null=True, blank=True, on_delete=models.SET_NULL, related_name='hostels', editable=False)
+    
+    # Precomputed similar hostels (see makazi/similarity.py)
+    similar_ids = models.JSONField(null=True, blank=True, editable=False)
+
+    # Approved review summary, kept up to date by makazi/ratings.py
+    rating_count = models.IntegerField(default=0, editable=False)
+    avg_overall = models.FloatField(default=0, db_index=True, editable=False)
+    avg_cleanliness = models.FloatField(default=0, editable=False)
+    avg_security = models.FloatField(default=0, editable=False)
+    avg_facilities = models.FloatField(default=0, editable=False)
+    avg_management = models.FloatField(default=0, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -406,18 +820,46 @@ class Hostel(models.Model):
             models.Index(fields=['is_featured']),
         ]
     
+    objects = HostelManager()
+
+    # Maintained by atomic UPDATEs (occupancy from bookings, ratings from
+    # makazi/ratings.py); saving a stale instance must not write them back
+    COUNTER_FIELDS = [
+        'current_occupancy', 'available_rooms', 'rating_count',
+        'avg_overall', 'avg_cleanliness', 'avg_security', 'avg_facilities', 'avg_management',
+    ]
+
     def __str__(self):
         return f"{self.name} - {self.university}"
     
+    def save(self, *args, **kwargs):
+        self.geohash = geohash_for(self.latitude, self.longitude)
+        self.resolve_area()
+        self.amenity_mask = amenity_mask(self.amenities, self.AMENITIES_CHOICES)
+
+        if self._state.adding or kwargs.get('update_fields') is not None:
+            if self._state.adding:
+                self.available_rooms = max(0, self.total_rooms - self.current_occupancy // STUDENTS_PER_ROOM)
+            super().save(*args, **kwargs)
+            return
+
+        # A full edit, which mark_similar_stale can't tell apart from this
+        # update_fields save
+        self.similar_ids = None
+        kwargs['update_fields'] = fields_except(self, self.COUNTER_FIELDS)
+        super().save(*args, **kwargs)
+        # total_rooms may have changed
+        Hostel.objects.filter(pk=self.pk).update(
+            available_rooms=available_rooms_expression(F('current_occupancy'))
+        )
+    
     def get_all_images(self):
-        """Get all images for the hostel"""
-        images = []
-        if self.main_image:
-            images.append(self.main_image.url)
-        for field in [self.image_1, self.image_2, self.image_3, self.image_4]:
-            if field:
-                images.append(field.url)
-        return images
+        """Gallery images in order; prefetch_related('gallery') to load them for a whole page"""
+        return list(self.gallery.all())
+    
+    def get_main_image(self):
+        images = self.get_all_images()
+        return images[0] if images else None
     
     def get_occupancy_rate(self):
         """Calculate occupancy percentage"""
@@ -431,6 +873,13 @@ class Hostel(models.Model):
             return self.description[:150] + '...'
         return self.description
 
+class HostelImage(GalleryImage):
+    hostel = models.ForeignKey(Hostel, on_delete=models.CASCADE, related_name='gallery')
+    image = models.ImageField(upload_to='hostels/')
+
+    parent_field = 'hostel'
+
+
 class HostelBooking(models.Model):
     BOOKING_STATUS = [
         ('pending', 'Pending Approval'),
@@ -440,6 +889,9 @@ class HostelBooking(models.Model):
         ('completed', 'Completed'),
     ]
     
+    # Bookings that take a bed in the hostel's occupancy count
+    OCCUPYING_STATUSES = ['confirmed']
+
     PAYMENT_OPTIONS = [
         ('full_semester', 'Full Semester Payment'),
         ('monthly', 'Monthly Installments'),
@@ -529,13 +981,27 @@ class HostelBooking(models.Model):
         if not self.payment_deadline:
             self.payment_deadline = self.check_in_date - datetime.timedelta(days=14)
         
-        # Update hostel occupancy
-        if self.status == 'confirmed' and not self._state.adding:
-            self.hostel.current_occupancy += 1
-            self.hostel.available_rooms = max(0, self.hostel.total_rooms - (self.hostel.current_occupancy // 4))
-            self.hostel.save()
-        
-        super().save(*args, **kwargs)
+        # Hostel occupancy follows the change in this booking's status (or
+        # hostel). The stored row is locked so two saves of the same booking
+        # can't both count the same transition.
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding and self.pk:
+                previous = HostelBooking.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values('hostel_id', 'status').first()
+            super().save(*args, **kwargs)
+            self.apply_occupancy_change(previous, {'hostel_id': self.hostel_id, 'status': self.status})
+
+    @classmethod
+    def apply_occupancy_change(cls, previous, current):
+        """Move one occupant between hostels as a booking goes from `previous` to `current`"""
+        deltas = {}
+        for sign, state in [(-1, previous), (1, current)]:
+            if state and state['status'] in cls.OCCUPYING_STATUSES:
+                deltas[state['hostel_id']] = deltas.get(state['hostel_id'], 0) + sign
+        for hostel_id, delta in deltas.items():
+            Hostel.objects.adjust_occupancy(hostel_id, delta)
     
     def __str__(self):
         return f"Booking #{self.id} - {self.student_name}"
@@ -607,3 +1073,48 @@ class HostelReview(models.Model):
         """Calculate average of all ratings"""
         ratings = [self.overall_rating, self.cleanliness, self.security, self.facilities, self.management]
         return sum(ratings) / len(ratings)
+
+
+class SearchEntry(models.Model):
+    """Row of a model's FTS5 table (makazi/search.py), joined on its rowid.
+
+    Migration 0009 creates the tables and the search backend writes them,
+    so Django never manages them; these models only let querysets join
+    them for MATCH and bm25() ranking.
+    """
+
+    class Meta:
+        abstract = True
+
+
+class ListingSearchEntry(SearchEntry):
+    listing = models.OneToOneField(
+        Scrape_MakaziListing, primary_key=True, db_column='rowid',
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'makazi_scrape_makazilisting_fts'
+
+
+class ApartmentSearchEntry(SearchEntry):
+    apartment = models.OneToOneField(
+        Apartment, primary_key=True, db_column='rowid',
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'makazi_apartment_fts'
+
+
+class HostelSearchEntry(SearchEntry):
+    hostel = models.OneToOneField(
+        Hostel, primary_key=True, db_column='rowid',
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'makazi_hostel_fts'
@@ -0,0 +1,144 @@
+# makazi/page_cache.py
+import hashlib
+import re
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+PAGE_CACHE_TIMEOUT = 60 * 15
+
+# Query parameters that never change the rendered page
+IGNORED_PARAMS = {'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'fbclid'}
+
+CSRF_PLACEHOLDER = '__NYUMBAFASTA_CSRF_TOKEN__'
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([A-Za-z0-9]+)"')
+
+
+def _version_key(model, pk=None):
+    label = model._meta.label_lower
+    return f'makazi:page_version:{label}' if pk is None else f'makazi:page_version:{label}:{pk}'
+
+
+def get_version(model, pk=None):
+    """Millisecond timestamp of the last change to `model` (or one object)"""
+    key = _version_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+    return version
+
+
+def bump_version(model, pk=None):
+    key = _version_key(model, pk)
+    version = max(int(time.time() * 1000), (cache.get(key) or 0) + 1)
+    cache.set(key, version, None)
+
+
+def invalidate_object(instance):
+    """Drop cached pages showing `instance` and its model's list pages"""
+    bump_version(type(instance), instance.pk)
+    bump_version(type(instance))
+
+
+def invalidate_model(model):
+    """Drop every cached page for `model`, e.g. after a bulk import"""
+    bump_version(model)
+    bump_version(model, 'bulk')
+
+
+def normalized_query(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        if key not in IGNORED_PARAMS
+        for value in values
+        if value != ''
+    )
+    return urlencode(params)
+
+
+def is_cacheable_request(request):
+    """Anonymous GET/HEAD without a session or pending messages"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    if CookieStorage.cookie_name in request.COOKIES:
+        return False
+    user = getattr(request, 'user', None)
+    return not (user is not None and user.is_authenticated)
+
+
+def _from_timestamp(milliseconds):
+    return datetime.fromtimestamp(milliseconds / 1000, tz=dt_timezone.utc)
+
+
+def cache_anonymous_page(model, object_pk=None, last_modified=None, timeout=PAGE_CACHE_TIMEOUT):
+    """Serve rendered pages from the cache for anonymous visitors.
+
+    The cache key includes the normalized query string and the version of
+    `model` (for list pages) or of the object returned by `object_pk`
+    (for detail pages), so saving an object invalidates only the pages
+    that show it. Responses carry ETag/Last-Modified headers and answer
+    conditional requests with 304 Not Modified.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            if object_pk is None:
+                versions = [get_version(model)]
+            else:
+                pk = object_pk(request, *args, **kwargs)
+                versions = [get_version(model, pk), get_version(model, 'bulk')]
+
+            raw_key = f'{view_func.__module__}.{view_func.__name__}|{request.path}|{normalized_query(request)}|{versions}'
+            key = 'makazi:page:' + hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+            etag = '"%s"' % key[-32:]
+
+            entry = cache.get(key)
+            if entry is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming or response.cookies:
+                    return response
+
+                content = response.content.decode(response.charset)
+                # Every form gets its own masked token; none may reach another visitor
+                content = CSRF_INPUT_RE.sub(f'name="csrfmiddlewaretoken" value="{CSRF_PLACEHOLDER}"', content)
+
+                modified = last_modified(request, *args, **kwargs) if last_modified else None
+                entry = {
+                    'content': content,
+                    'content_type': response['Content-Type'],
+                    'last_modified': int((modified or _from_timestamp(max(versions))).timestamp()),
+                }
+                cache.set(key, entry, timeout)
+
+            content = entry['content']
+            if CSRF_PLACEHOLDER in content:
+                content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+            response = HttpResponse(content, content_type=entry['content_type'])
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(entry['last_modified'])
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=entry['last_modified'], response=response
+            )
+            patch_cache_control(response, max_age=0, must_revalidate=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,238 @@
+# makazi/pagination.py
+import base64
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+DEFAULT_PER_PAGE = 12
+MAX_PER_PAGE = 48
+COUNT_CACHE_TIMEOUT = 60 * 5
+
+# Sort option -> keyset ordering; the last column must be unique
+KEYSET_ORDERINGS = {
+    '-scraped_at': ('-scraped_at', '-id'),
+    'scraped_at': ('scraped_at', 'id'),
+    'price': ('price_value', 'id'),
+    '-price': ('-price_value', '-id'),
+}
+
+
+def clamp_per_page(value, default=DEFAULT_PER_PAGE):
+    """Parse a per_page parameter and keep it within 1..MAX_PER_PAGE"""
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def _count_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f'{sql}|{params}'.encode('utf-8')).hexdigest()
+    return f'makazi:count:{digest}'
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """COUNT(*) for a queryset, cached per distinct SQL statement"""
+    key = _count_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+async def acached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """Async version of cached_count"""
+    key = _count_key(queryset)
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(key, count, timeout)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose total comes from cached_count"""
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+def _encode_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': [_encode_value(value) for value in values], 'd': direction})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (values, direction) or None for a missing/invalid cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, KeyError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None
+    return values, direction
+
+
+class KeysetPaginator:
+    """Cursor pagination over a fixed ordering, e.g. ('-scraped_at', '-id').
+
+    Each page is a single indexed range query instead of an OFFSET scan,
+    so page 900 costs the same as page 1.
+    """
+
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PER_PAGE):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    @cached_property
+    def count(self):
+        return cached_count(self.queryset)
+
+    def _parse_values(self, raw_values):
+        if len(raw_values) != len(self.fields):
+            return None
+        values = []
+        model = self.queryset.model
+        for name, raw in zip(self.fields, raw_values):
+            field = model._meta.get_field('id' if name == 'pk' else name)
+            if field.get_internal_type() == 'DateTimeField':
+                value = parse_datetime(raw) if isinstance(raw, str) else None
+                if value is None:
+                    return None
+            else:
+                try:
+                    value = field.to_python(raw)
+                except Exception:
+                    return None
+            values.append(value)
+        return values
+
+    def _after(self, values, reverse=False):
+        """Q matching rows strictly after `values` in the ordering"""
+        condition = Q()
+        for i, (order, value) in enumerate(zip(self.ordering, values)):
+            descending = order.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{self.fields[i]}__{lookup}': value})
+            for prior_field, prior_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prior_field: prior_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [order[1:] if order.startswith('-') else f'-{order}' for order in self.ordering]
+
+    async def acount(self):
+        return await acached_count(self.queryset)
+
+    def _page_query(self, cursor):
+        """(queryset for the page plus one row, cursor values, direction)"""
+        decoded = decode_cursor(cursor)
+        values = self._parse_values(decoded[0]) if decoded else None
+        direction = decoded[1] if values else 'next'
+
+        queryset = self.queryset
+        if values and direction == 'prev':
+            queryset = queryset.filter(self._after(values, reverse=True)).order_by(*self._reversed_ordering())
+        else:
+            if values:
+                queryset = queryset.filter(self._after(values))
+            queryset = queryset.order_by(*self.ordering)
+        return queryset[:self.per_page + 1], values, direction
+
+    def page(self, cursor=None):
+        queryset, values, direction = self._page_query(cursor)
+        return self._make_page(list(queryset), values, direction)
+
+    async def apage(self, cursor=None):
+        """Async version of page(), using the async ORM interface"""
+        queryset, values, direction = self._page_query(cursor)
+        return self._make_page([row async for row in queryset], values, direction)
+
+    def _make_page(self, rows, values, direction):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev' and values:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+        return KeysetPage(rows, self, has_next=has_more, has_previous=bool(values))
+
+    def continue_from(self, page):
+        """(previous, next) cursors leading on from a numbered Paginator page.
+
+        The page must come from the same queryset ordered by self.ordering,
+        so that the first few pages can keep ?page= links while the arrows
+        switch to keyset pages.
+        """
+        if not page.object_list:
+            return None, None
+        previous_cursor = next_cursor = None
+        if page.has_previous():
+            previous_cursor = encode_cursor(self.key_for(page[0]), 'prev')
+        if page.has_next():
+            next_cursor = encode_cursor(self.key_for(page[len(page) - 1]), 'next')
+        return previous_cursor, next_cursor
+
+    def key_for(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.fields]
+        return [getattr(obj, field) for field in self.fields]
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(self.paginator.key_for(self.object_list[-1]), 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(self.paginator.key_for(self.object_list[0]), 'prev')
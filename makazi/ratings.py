@@ -0,0 +1,149 @@
+# makazi/ratings.py
+from django.db import transaction
+from django.db.models import Avg, Case, Count, ExpressionWrapper, F, FloatField, Sum, Value, When
+
+from .models import Apartment, ApartmentReview, Hostel, HostelReview
+from .page_cache import invalidate_model, invalidate_object
+
+
+class RatingSpec:
+    """Where a review model's ratings are summarised.
+
+    `fields` maps each rating column of the review to the average column
+    on the reviewed object; only approved reviews are counted.
+    """
+
+    def __init__(self, review_model, parent_model, parent_field, fields):
+        self.review_model = review_model
+        self.parent_model = parent_model
+        self.parent_field = parent_field
+        self.parent_id = f'{parent_field}_id'
+        self.fields = fields
+
+
+RATING_SPECS = {
+    ApartmentReview: RatingSpec(ApartmentReview, Apartment, 'apartment', {
+        'rating': 'avg_rating',
+    }),
+    HostelReview: RatingSpec(HostelReview, Hostel, 'hostel', {
+        'overall_rating': 'avg_overall',
+        'cleanliness': 'avg_cleanliness',
+        'security': 'avg_security',
+        'facilities': 'avg_facilities',
+        'management': 'avg_management',
+    }),
+}
+
+
+def apply_rating_delta(spec, parent_id, count, sums):
+    """Add `count` reviews with rating totals `sums` (negative to remove) in one UPDATE.
+
+    Each average becomes (average * rating_count + sum) / (rating_count + count),
+    computed by the database from the current row, so concurrent reviews
+    don't overwrite each other.
+    """
+    if parent_id is None or (not count and not any(sums.values())):
+        return
+    updates = {'rating_count': F('rating_count') + count}
+    for field, average in spec.fields.items():
+        updates[average] = Case(
+            When(rating_count__lte=-count, then=Value(0.0)),
+            default=ExpressionWrapper(
+                (F(average) * F('rating_count') + sums[field]) / (F('rating_count') + count),
+                output_field=FloatField(),
+            ),
+            output_field=FloatField(),
+        )
+    spec.parent_model.objects.filter(pk=parent_id).update(**updates)
+    # update() sends no post_save, so drop the cached pages here
+    invalidate_object(spec.parent_model(pk=parent_id))
+
+
+def contribution(spec, values):
+    """{parent_id: (count, sums)} that one review's stored values add"""
+    if not values or not values['is_approved']:
+        return {}
+    return {values[spec.parent_id]: (1, {field: values[field] for field in spec.fields})}
+
+
+def review_values(spec, review):
+    return {
+        spec.parent_id: getattr(review, spec.parent_id),
+        'is_approved': review.is_approved,
+        **{field: getattr(review, field) for field in spec.fields},
+    }
+
+
+def stored_review_values(spec, pk):
+    """The review's row as currently saved, before a save overwrites it"""
+    if pk is None:
+        return None
+    return spec.review_model.objects.filter(pk=pk).values(
+        spec.parent_id, 'is_approved', *spec.fields
+    ).first()
+
+
+def apply_review_change(spec, old_values, new_values):
+    """Move a review's contribution from its old state to its new one"""
+    deltas = {}
+    for sign, values in [(-1, old_values), (1, new_values)]:
+        for parent_id, (count, sums) in contribution(spec, values).items():
+            total_count, total_sums = deltas.get(parent_id, (0, dict.fromkeys(spec.fields, 0)))
+            deltas[parent_id] = (
+                total_count + sign * count,
+                {field: total_sums[field] + sign * (sums[field] or 0) for field in spec.fields},
+            )
+    for parent_id, (count, sums) in deltas.items():
+        apply_rating_delta(spec, parent_id, count, sums)
+
+
+def set_reviews_approved(queryset, approved):
+    """Bulk approve/unapprove reviews, adjusting the rating columns by the change.
+
+    Used by the admin actions in place of queryset.update(), which skips
+    the save signals. Returns the number of reviews whose status changed.
+    """
+    spec = RATING_SPECS[queryset.model]
+    changing = queryset.exclude(is_approved=approved)
+    sign = 1 if approved else -1
+
+    with transaction.atomic():
+        ids = list(changing.values_list('pk', flat=True))
+        groups = list(
+            spec.review_model.objects.filter(pk__in=ids)
+            .order_by().values(spec.parent_id)
+            .annotate(count=Count('pk'), **{f'sum_{field}': Sum(field) for field in spec.fields})
+        )
+        spec.review_model.objects.filter(pk__in=ids).update(is_approved=approved)
+        for group in groups:
+            apply_rating_delta(spec, group[spec.parent_id], sign * group['count'], {
+                field: sign * (group[f'sum_{field}'] or 0) for field in spec.fields
+            })
+    return len(ids)
+
+
+def refresh_ratings(review_model, parent_ids=None):
+    """Recompute rating columns from the approved reviews, e.g. after raw SQL edits"""
+    spec = RATING_SPECS[review_model]
+    parents = spec.parent_model.objects.all()
+    if parent_ids is not None:
+        parents = parents.filter(pk__in=parent_ids)
+
+    totals = {
+        row[spec.parent_id]: row
+        for row in spec.review_model.objects.filter(is_approved=True)
+        .order_by().values(spec.parent_id)
+        .annotate(count=Count('pk'), **{f'avg_{field}': Avg(field) for field in spec.fields})
+    }
+    empty = {'count': 0, **{f'avg_{field}': 0.0 for field in spec.fields}}
+    updated = 0
+    with transaction.atomic():
+        for parent_id in parents.values_list('pk', flat=True):
+            row = totals.get(parent_id, empty)
+            spec.parent_model.objects.filter(pk=parent_id).update(
+                rating_count=row['count'],
+                **{average: row[f'avg_{field}'] or 0.0 for field, average in spec.fields.items()},
+            )
+            updated += 1
+    invalidate_model(spec.parent_model)
+    return updated
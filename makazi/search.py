@@ -0,0 +1,223 @@
+# makazi/search.py
+import re
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+# Text columns indexed per model, most important first. The weights are
+# used for relevance ranking (title matches count more than description).
+SEARCH_FIELDS = {
+    'makazi.scrape_makazilisting': [
+        ('title', 10.0),
+        ('location', 5.0),
+        ('property_type', 3.0),
+        ('description', 1.0),
+    ],
+    'makazi.apartment': [
+        ('title', 10.0),
+        ('location', 5.0),
+        ('apartment_type', 3.0),
+        ('description', 1.0),
+    ],
+    'makazi.hostel': [
+        ('name', 10.0),
+        ('university', 5.0),
+        ('location', 5.0),
+        ('description', 1.0),
+    ],
+}
+
+# Common Swahili/English equivalents in listing text
+SYNONYMS = {
+    'chumba': ['room'],
+    'vyumba': ['rooms'],
+    'room': ['chumba'],
+    'rooms': ['vyumba'],
+    'nyumba': ['house'],
+    'house': ['nyumba'],
+    'apartment': ['apartments', 'fleti'],
+    'fleti': ['apartment'],
+    'kiwanja': ['plot'],
+    'viwanja': ['plots'],
+    'plot': ['kiwanja'],
+    'inauzwa': ['sale'],
+    'inapangishwa': ['rent'],
+    'rent': ['inapangishwa', 'kupanga'],
+    'sale': ['inauzwa'],
+}
+
+# Swahili noun classes 7/8 pair singular and plural prefixes
+# (chumba/vyumba, kitanda/vitanda)
+NOUN_CLASS_PREFIXES = [('ch', 'vy'), ('vy', 'ch'), ('ki', 'vi'), ('vi', 'ki')]
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(str(text or '').lower()) if token]
+
+
+def expand_term(term):
+    """Return the term plus its Swahili/English variants"""
+    variants = [term]
+    if len(term) >= 5:
+        for prefix, other in NOUN_CLASS_PREFIXES:
+            if term.startswith(prefix):
+                variants.append(other + term[len(prefix):])
+                break
+    for variant in list(variants):
+        variants.extend(SYNONYMS.get(variant, []))
+
+    unique = []
+    for variant in variants:
+        if variant not in unique:
+            unique.append(variant)
+    return unique
+
+
+def model_key(model):
+    return model._meta.label_lower
+
+
+class BaseSearchBackend(ABC):
+    """Interface for search backends.
+
+    `search` narrows a queryset to the objects matching `query` and orders
+    it by relevance. `index` and `remove` keep the backend in sync with
+    the database and are called from signals and the bulk importer.
+    """
+
+    @abstractmethod
+    def search(self, queryset, query):
+        """`queryset` narrowed to `query` and ordered by relevance"""
+
+    def index(self, instances):
+        pass
+
+    def remove(self, model, ids):
+        pass
+
+    def rebuild(self, model):
+        pass
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """Fallback for databases without a full-text index: icontains ORs"""
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+
+        fields = [field for field, _ in SEARCH_FIELDS[model_key(queryset.model)]]
+        for term in terms:
+            condition = Q()
+            for variant in expand_term(term):
+                for field in fields:
+                    condition |= Q(**{f'{field}__icontains': variant})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 index with one virtual table per searchable model"""
+
+    @staticmethod
+    def table_name(model):
+        return f'{model._meta.db_table}_fts'
+
+    @staticmethod
+    def match_expression(query):
+        """Build an FTS5 MATCH string: every term must match one of its variants"""
+        groups = []
+        for term in tokenize(query):
+            variants = ' OR '.join(f'"{variant}"*' for variant in expand_term(term))
+            groups.append(f'({variants})')
+        return ' AND '.join(groups)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+
+        model = queryset.model
+        table = self.table_name(model)
+        weights = ', '.join(str(weight) for _, weight in SEARCH_FIELDS[model_key(model)])
+        # search_entry (see SearchEntry) joins the FTS table under its own name
+        return queryset.filter(
+            RawSQL(f'{table} MATCH %s', [match], output_field=BooleanField()),
+            search_entry__isnull=False,
+        ).annotate(
+            search_rank=RawSQL(f'bm25({table}, {weights})', [], output_field=FloatField()),
+        ).order_by('search_rank')
+
+    def index(self, instances):
+        instances = [instance for instance in instances if instance.pk]
+        if not instances:
+            return
+
+        model = type(instances[0])
+        table = self.table_name(model)
+        fields = [field for field, _ in SEARCH_FIELDS[model_key(model)]]
+        rows = [
+            [instance.pk] + [str(getattr(instance, field) or '') for field in fields]
+            for instance in instances
+        ]
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        self.remove(model, [instance.pk for instance in instances])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, {', '.join(fields)}) VALUES ({placeholders})",
+                rows,
+            )
+
+    def remove(self, model, ids):
+        table = self.table_name(model)
+        ids = list(ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE rowid IN ({', '.join(['%s'] * len(batch))})",
+                    batch,
+                )
+
+    def rebuild(self, model):
+        table = self.table_name(model)
+        # One transaction: in autocommit every FTS insert would be its own commit
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table}")
+            batch = []
+            for instance in model.objects.all().order_by().iterator(chunk_size=2000):
+                batch.append(instance)
+                if len(batch) >= 2000:
+                    self.index(batch)
+                    batch = []
+            self.index(batch)
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Backend from settings.SEARCH_BACKEND, or FTS5 on SQLite"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = BasicSearchBackend()
+    return _backend
+
+
+def search_queryset(queryset, query):
+    return get_search_backend().search(queryset, query)
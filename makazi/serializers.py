@@ -0,0 +1,210 @@
+# makazi/serializers.py
+import json
+from functools import lru_cache
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+
+from .models import Apartment, ApartmentImage, Hostel
+
+
+class Field:
+    """An output field computed from one or more database columns"""
+
+    def __init__(self, *columns, get=None):
+        self.columns = columns
+        self.get = get or (lambda row: row[columns[0]])
+
+
+@lru_cache(maxsize=None)
+def _url_prefix(name, kwarg):
+    # Reverse once with a placeholder and reuse the prefix for every row
+    url = reverse(name, kwargs={kwarg: '0'})
+    return url[:url.rindex('0')]
+
+
+def listing_url(row):
+    slug_id = f"{row['slug']}-{row['id']}" if row['slug'] else str(row['id'])
+    return f"{_url_prefix('makazi:property_detail', 'slug_id')}{slug_id}/"
+
+
+def listing_thumbnail_url(row):
+    """Same as Scrape_MakaziListing.thumbnail_url, from a values() row"""
+    if not row['main_image_url']:
+        return ''
+    if row['thumbnail_source'] != row['main_image_url']:
+        return f"{_url_prefix('makazi:listing_thumbnail', 'pk')}{row['id']}/thumbnail/"
+    if row['thumbnail_hash']:
+        return f"{_url_prefix('makazi:thumbnail_file', 'digest')}{row['thumbnail_hash']}.jpg"
+    return ''
+
+
+# Output for querysets annotated by makazi.geo proximity searches
+DISTANCE_FIELD = Field('distance_km', get=lambda row: round(row['distance_km'], 3))
+
+
+class ModelSerializer:
+    """Serialize querysets through values() with only the needed columns.
+
+    `fields` maps output names to Field definitions; callers may narrow
+    the output with a comma separated ?fields= list. With `distance`, the
+    queryset's distance_km annotation is included as well.
+    """
+    fields = {}
+    default_fields = []
+    # Columns computed in the query, {column: expression}; only added when selected
+    annotations = {}
+
+    def __init__(self, fields=None, distance=False):
+        if distance:
+            self.fields = dict(self.fields, distance_km=DISTANCE_FIELD)
+        requested = [name.strip() for name in (fields or '').split(',') if name.strip()]
+        selected = [name for name in requested if name in self.fields]
+        self.selected = selected or list(self.default_fields)
+        if distance and 'distance_km' not in self.selected:
+            self.selected.append('distance_km')
+
+    def columns(self, extra=()):
+        columns = []
+        for name in self.selected:
+            for column in self.fields[name].columns:
+                if column not in columns:
+                    columns.append(column)
+        for column in extra:
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    def values(self, queryset, extra=()):
+        columns = self.columns(extra)
+        annotations = {column: self.annotations[column] for column in columns if column in self.annotations}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset.values(*columns)
+
+    def to_dict(self, row):
+        return {name: self.fields[name].get(row) for name in self.selected}
+
+    def to_list(self, row):
+        return [self.fields[name].get(row) for name in self.selected]
+
+
+class ListingSerializer(ModelSerializer):
+    fields = {
+        'id': Field('id'),
+        'title': Field('title'),
+        'price': Field('price'),
+        'price_value': Field('price_value'),
+        'location': Field('location'),
+        'image_url': Field('main_image_url', get=lambda row: row['main_image_url'] or ''),
+        'url': Field('id', 'slug', get=listing_url),
+        'thumbnail_url': Field('id', 'main_image_url', 'thumbnail_hash', 'thumbnail_source', get=listing_thumbnail_url),
+        'bedrooms': Field('bedrooms'),
+        'property_type': Field('property_type'),
+        'is_featured': Field('is_featured'),
+        'is_verified': Field('is_verified'),
+    }
+    default_fields = ['id', 'title', 'price', 'location', 'image_url', 'url', 'bedrooms', 'property_type']
+
+
+class ListingSearchSerializer(ListingSerializer):
+    default_fields = ['id', 'title', 'price', 'location', 'url']
+
+
+APARTMENT_TYPE_LABELS = dict(Apartment.APARTMENT_TYPES)
+HOSTEL_TYPE_LABELS = dict(Hostel.HOSTEL_TYPES)
+
+
+def main_image_url(image_model, parent_field):
+    """URL of the first gallery image of each row"""
+    return Subquery(
+        image_model.objects.filter(**{parent_field: OuterRef('pk')})
+        .order_by('position', 'id').values('url')[:1]
+    )
+
+
+class ApartmentSerializer(ModelSerializer):
+    annotations = {'main_image_url': main_image_url(ApartmentImage, 'apartment')}
+    fields = {
+        'id': Field('id'),
+        'title': Field('title'),
+        'location': Field('location'),
+        'price': Field('price_per_month', get=lambda row: float(row['price_per_month'])),
+        'type': Field('apartment_type', get=lambda row: APARTMENT_TYPE_LABELS.get(row['apartment_type'], row['apartment_type'])),
+        'bedrooms': Field('bedrooms'),
+        'image': Field('main_image_url', get=lambda row: row['main_image_url'] or ''),
+        'url': Field('id', get=lambda row: f"{_url_prefix('makazi:apartment_detail', 'pk')}{row['id']}/"),
+        'rating': Field('avg_rating', get=lambda row: round(row['avg_rating'], 2)),
+        'rating_count': Field('rating_count'),
+    }
+    default_fields = ['id', 'title', 'location', 'price', 'type', 'bedrooms', 'image', 'url']
+
+
+class HostelSerializer(ModelSerializer):
+    fields = {
+        'id': Field('id'),
+        'name': Field('name'),
+        'university': Field('university'),
+        'location': Field('location'),
+        'price_per_semester': Field('price_per_semester', get=lambda row: float(row['price_per_semester'])),
+        'available_rooms': Field('available_rooms'),
+        'hostel_type': Field('hostel_type', get=lambda row: HOSTEL_TYPE_LABELS.get(row['hostel_type'], row['hostel_type'])),
+        'url': Field('id', get=lambda row: f"{_url_prefix('makazi:hostel_detail', 'pk')}{row['id']}/"),
+        'rating': Field('avg_overall', get=lambda row: round(row['avg_overall'], 2)),
+        'rating_count': Field('rating_count'),
+    }
+    default_fields = ['id', 'name', 'university', 'location', 'price_per_semester', 'available_rooms', 'hostel_type']
+
+
+def _dumps(data):
+    # Compact separators keep payloads small and gzip well
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False)
+
+
+async def aserialized_response(request, key, rows, serializer, extra=None):
+    """JSON response for `rows` (values() dicts or a values() queryset) under `key`.
+
+    ?format=compact sends {"fields": [...], key: [[...], ...]} instead of
+    one object per row, and ?stream=1 streams the rows as they are read.
+    """
+    encode, head, stream = _response_options(request, serializer, extra)
+
+    if not stream:
+        data = dict(head)
+        data[key] = [encode(row) async for row in _aiterate(rows)]
+        return HttpResponse(_dumps(data), content_type='application/json')
+
+    async def chunks():
+        yield _stream_start(head, key)
+        i = 0
+        async for row in _aiterate(rows):
+            yield (',' if i else '') + _dumps(encode(row))
+            i += 1
+        yield ']}'
+
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+def _response_options(request, serializer, extra):
+    compact = request.GET.get('format') == 'compact'
+    head = dict(extra or {})
+    if compact:
+        head['fields'] = serializer.selected
+    encode = serializer.to_list if compact else serializer.to_dict
+    return encode, head, request.GET.get('stream') == '1'
+
+
+def _stream_start(head, key):
+    prefix = _dumps(head)[:-1]
+    return (prefix + ',' if head else '{') + _dumps(key) + ':['
+
+
+async def _aiterate(rows):
+    if hasattr(rows, 'aiterator'):
+        async for row in rows.aiterator():
+            yield row
+    else:
+        for row in rows:
+            yield row
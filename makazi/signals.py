@@ -0,0 +1,129 @@
+# makazi/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import has_indexed_changes, invalidate_autocomplete
+from .facets import invalidate_listing_facets
+from .images import schedule_images
+from .models import (
+    Apartment, ApartmentImage, ApartmentReview, Hostel, HostelBooking, HostelImage, HostelReview,
+    Scrape_MakaziListing,
+)
+from .page_cache import invalidate_object
+from .ratings import RATING_SPECS, apply_review_change, review_values, stored_review_values
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Scrape_MakaziListing)
+@receiver(post_save, sender=Apartment)
+@receiver(post_save, sender=Hostel)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Keep the full-text index in sync with saved objects"""
+    if raw:
+        return
+    get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Scrape_MakaziListing)
+@receiver(post_delete, sender=Apartment)
+@receiver(post_delete, sender=Hostel)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Scrape_MakaziListing)
+@receiver(post_delete, sender=Scrape_MakaziListing)
+def clear_listing_facets(sender, **kwargs):
+    invalidate_listing_facets()
+
+
+@receiver(pre_save, sender=Scrape_MakaziListing)
+@receiver(pre_save, sender=Apartment)
+@receiver(pre_save, sender=Hostel)
+def mark_similar_stale(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Edited objects get their neighbours recomputed on the next detail view"""
+    if raw or update_fields is not None:
+        return
+    instance.similar_ids = None
+
+
+@receiver(post_save, sender=Scrape_MakaziListing)
+@receiver(post_save, sender=Apartment)
+@receiver(post_save, sender=Hostel)
+@receiver(post_delete, sender=Scrape_MakaziListing)
+@receiver(post_delete, sender=Apartment)
+@receiver(post_delete, sender=Hostel)
+def clear_cached_pages(sender, instance, **kwargs):
+    invalidate_object(instance)
+
+
+@receiver(pre_save, sender=Scrape_MakaziListing)
+@receiver(pre_save, sender=Apartment)
+@receiver(pre_save, sender=Hostel)
+def remember_autocomplete_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    instance._autocomplete_changed = has_indexed_changes(instance, update_fields)
+
+
+@receiver(post_save, sender=Scrape_MakaziListing)
+@receiver(post_save, sender=Apartment)
+@receiver(post_save, sender=Hostel)
+def update_autocomplete(sender, instance, raw=False, **kwargs):
+    """Rebuild suggestions only for new phrases, not bookings or ratings"""
+    if getattr(instance, '_autocomplete_changed', False):
+        invalidate_autocomplete()
+
+
+@receiver(post_delete, sender=Scrape_MakaziListing)
+@receiver(post_delete, sender=Apartment)
+@receiver(post_delete, sender=Hostel)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    invalidate_autocomplete()
+
+
+@receiver(post_save, sender=ApartmentImage)
+@receiver(post_save, sender=HostelImage)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    """New or replaced uploads get their card/gallery/full variants in the background"""
+    if raw:
+        return
+    invalidate_object(instance.get_parent_stub())
+    if instance.is_stale():
+        schedule_images(instance)
+
+
+@receiver(post_delete, sender=ApartmentImage)
+@receiver(post_delete, sender=HostelImage)
+def clear_gallery_pages(sender, instance, **kwargs):
+    invalidate_object(instance.get_parent_stub())
+
+
+@receiver(pre_save, sender=ApartmentReview)
+@receiver(pre_save, sender=HostelReview)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._stored_rating = stored_review_values(RATING_SPECS[sender], instance.pk)
+
+
+@receiver(post_save, sender=ApartmentReview)
+@receiver(post_save, sender=HostelReview)
+def update_rating_on_save(sender, instance, raw=False, **kwargs):
+    """Adjust the reviewed object's rating columns by what this save changed"""
+    if raw:
+        return
+    spec = RATING_SPECS[sender]
+    apply_review_change(spec, getattr(instance, '_stored_rating', None), review_values(spec, instance))
+
+
+@receiver(post_delete, sender=ApartmentReview)
+@receiver(post_delete, sender=HostelReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+    spec = RATING_SPECS[sender]
+    apply_review_change(spec, review_values(spec, instance), None)
+
+
+@receiver(post_delete, sender=HostelBooking)
+def release_occupancy_on_delete(sender, instance, **kwargs):
+    HostelBooking.apply_occupancy_change({'hostel_id': instance.hostel_id, 'status': instance.status}, None)
@@ -0,0 +1,262 @@
+# makazi/similarity.py
+import logging
+import random
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Abs
+
+from .models import Apartment, Hostel, Location, Scrape_MakaziListing, location_path
+
+
+logger = logging.getLogger('makazi.similarity')
+
+
+# Neighbours stored per object; detail pages show a rotating subset
+SIMILAR_LIMIT = 12
+# Candidates taken from each area bucket, nearest in price first
+POOL_SIZE = 40
+
+
+def area_keys(location):
+    """Location hierarchy keys, most specific first.
+
+    "Mbweni, Kinondoni, Dar Es Salaam" gives ward, district and region keys,
+    each including its parents so that districts with the same name in
+    different regions do not collide.
+    """
+    parts = [part.strip().lower() for part in str(location or '').split(',') if part.strip()]
+    return [tuple(parts[i:]) for i in range(len(parts))]
+
+
+class Profile:
+    """How to read similarity features from one model"""
+
+    def __init__(self, model, fields, areas, kind, price, bedrooms=None):
+        self.model = model
+        self.fields = fields
+        self.areas = areas
+        self.kind = kind
+        self.price = price
+        self.bedrooms = bedrooms
+
+    def features(self, row):
+        kind = row[self.kind] or ''
+        areas = list(self.areas(row))
+        if kind:
+            areas.append(('kind', kind))
+        return {
+            'id': row['id'],
+            'areas': areas,
+            'kind': kind,
+            'bedrooms': row[self.bedrooms] if self.bedrooms else None,
+            'price': float(row[self.price] or 0),
+        }
+
+    def candidates(self, targets=None):
+        """Available rows that can be neighbours of `targets`"""
+        queryset = self.model.objects.filter(is_available=True).order_by()
+        if targets is not None and self.model is Scrape_MakaziListing:
+            # Listings only neighbour listings from the same region
+            regions = {areas[-1][0] for areas in (area_keys(t['location']) for t in targets) if areas}
+            if regions:
+                paths = [location_path([region]) for region in regions]
+                queryset = queryset.filter(area__in=Location.objects.subtree(paths).values('id'))
+        return queryset.values(*self.fields)
+
+
+PROFILES = {
+    Scrape_MakaziListing: Profile(
+        Scrape_MakaziListing,
+        fields=['id', 'location', 'property_type', 'bedrooms', 'price_value'],
+        areas=lambda row: area_keys(row['location']),
+        kind='property_type',
+        price='price_value',
+        bedrooms='bedrooms',
+    ),
+    Apartment: Profile(
+        Apartment,
+        fields=['id', 'location', 'apartment_type', 'bedrooms', 'price_per_month'],
+        areas=lambda row: area_keys(row['location']),
+        kind='apartment_type',
+        price='price_per_month',
+        bedrooms='bedrooms',
+    ),
+    Hostel: Profile(
+        Hostel,
+        fields=['id', 'university', 'location', 'hostel_type', 'price_per_semester'],
+        areas=lambda row: [('university', (row['university'] or '').strip().lower())] + area_keys(row['location']),
+        kind='hostel_type',
+        price='price_per_semester',
+    ),
+}
+
+
+def score(a, b):
+    total = 0.0
+    b_areas = set(b['areas'])
+    for key in a['areas']:
+        if key in b_areas:
+            if key[0] == 'university':
+                total += 4
+            elif key[0] != 'kind':
+                total += len(key)
+    if a['kind'] and a['kind'] == b['kind']:
+        total += 2
+    if a['bedrooms'] is not None and b['bedrooms'] is not None:
+        difference = abs(a['bedrooms'] - b['bedrooms'])
+        if difference == 0:
+            total += 1.5
+        elif difference == 1:
+            total += 0.5
+    if a['price'] > 0 and b['price'] > 0:
+        ratio = max(a['price'], b['price']) / min(a['price'], b['price'])
+        if ratio <= 1.25:
+            total += 2
+        elif ratio <= 2:
+            total += 1
+    return total
+
+
+def compute_neighbours(items, targets):
+    """Map each target id to its top SIMILAR_LIMIT neighbour ids from `items`"""
+    buckets = {}
+    for item in items:
+        for key in item['areas']:
+            buckets.setdefault(key, []).append(item)
+    for bucket in buckets.values():
+        bucket.sort(key=lambda item: item['price'])
+    bucket_prices = {key: [item['price'] for item in bucket] for key, bucket in buckets.items()}
+
+    neighbours = {}
+    for target in targets:
+        pool = {}
+        for key in target['areas']:
+            bucket = buckets.get(key, [])
+            position = bisect_left(bucket_prices.get(key, []), target['price'])
+            start = max(0, position - POOL_SIZE // 2)
+            for item in bucket[start:start + POOL_SIZE]:
+                if item['id'] != target['id']:
+                    pool[item['id']] = item
+            if len(pool) >= POOL_SIZE:
+                break
+
+        ranked = sorted(
+            pool.values(),
+            key=lambda item: (-score(target, item), abs(item['price'] - target['price']), item['id']),
+        )
+        neighbours[target['id']] = [item['id'] for item in ranked[:SIMILAR_LIMIT]]
+    return neighbours
+
+
+def refresh_similar(model, ids=None, batch_size=500, target_rows=None):
+    """Recompute and store similar_ids for `ids`, or for every row.
+
+    `target_rows` are the targets' values of the profile fields when the
+    caller has them loaded already, in place of `ids`.
+    """
+    profile = PROFILES[model]
+    if target_rows is None and ids is not None:
+        ids = list(ids)
+        target_rows = []
+        for start in range(0, len(ids), batch_size):
+            target_rows.extend(
+                model.objects.filter(pk__in=ids[start:start + batch_size]).order_by().values(*profile.fields)
+            )
+
+    items = [profile.features(row) for row in profile.candidates(target_rows)]
+    if target_rows is None:
+        targets = items
+    else:
+        targets = [profile.features(row) for row in target_rows]
+
+    neighbours = compute_neighbours(items, targets)
+
+    if len(neighbours) == 1:
+        # A detail page's first view: one UPDATE, without bulk_update's transaction
+        (pk, similar), = neighbours.items()
+        model.objects.filter(pk=pk).update(similar_ids=similar)
+    else:
+        objects = [model(pk=pk, similar_ids=similar) for pk, similar in neighbours.items()]
+        model.objects.bulk_update(objects, ['similar_ids'], batch_size=batch_size)
+    return neighbours
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='makazi-similar')
+        return _executor
+
+
+def _refresh_in_worker(model, pk):
+    close_old_connections()
+    try:
+        refresh_similar(model, [pk])
+    except Exception:
+        logger.exception("Similar items failed for %s %s", model.__name__, pk)
+    finally:
+        with _executor_lock:
+            _pending.discard((model, pk))
+        close_old_connections()
+
+
+def schedule_refresh(model, pk):
+    """Recompute one object's neighbours once the current transaction commits.
+
+    Runs in a worker thread so the detail view that found the object stale
+    doesn't wait for it; a refresh already queued for the object is reused.
+    """
+    if not getattr(settings, 'SIMILAR_ASYNC', True):
+        transaction.on_commit(lambda: refresh_similar(model, [pk]))
+        return
+    with _executor_lock:
+        if (model, pk) in _pending:
+            return
+        _pending.add((model, pk))
+    transaction.on_commit(lambda: get_executor().submit(_refresh_in_worker, model, pk))
+
+
+def fallback_similar(obj, limit):
+    """Available objects from the same region, nearest in price, in one bounded query"""
+    profile = PROFILES[type(obj)]
+    queryset = profile.model.objects.filter(is_available=True).exclude(pk=obj.pk)
+    areas = area_keys(obj.location)
+    if areas:
+        regions = Location.objects.subtree([location_path([areas[-1][0]])])
+        queryset = queryset.filter(area__in=regions.values('id'))
+    price = getattr(obj, profile.price)
+    if price:
+        queryset = queryset.order_by(Abs(F(profile.price) - price).asc(nulls_last=True), 'pk')
+    return list(queryset[:limit])
+
+
+def get_similar_items(obj, limit=4, rotate=True):
+    """Similar available objects from the precomputed index.
+
+    Objects without a stored neighbour list get fallback_similar() and
+    their neighbours recomputed in the background (schedule_refresh).
+    With `rotate`, each call shows a random subset of the stored neighbours.
+    """
+    model = type(obj)
+    ids = obj.similar_ids
+    if ids is None:
+        schedule_refresh(model, obj.pk)
+        return fallback_similar(obj, limit)
+
+    ids = list(ids)
+    if rotate:
+        random.shuffle(ids)
+
+    objects = model.objects.filter(pk__in=ids, is_available=True).in_bulk()
+    return [objects[pk] for pk in ids if pk in objects][:limit]
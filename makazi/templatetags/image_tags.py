@@ -0,0 +1,47 @@
+# makazi/templatetags/image_tags.py
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from makazi.images import CONTENT_TYPES, VARIANTS
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, variant='card', sizes=None, **attrs):
+    """<picture> with a WebP source and a JPEG <img> for a gallery image.
+
+    {% picture apartment.get_main_image 'card' alt=apartment.title class="w-100" %}
+    'card' serves the fixed-size crop; 'gallery' and 'full' add a srcset
+    over both sizes so the browser picks by width (pass `sizes`).
+    """
+    if not image:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if not image.has_variants:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    width, height, crop = VARIANTS[variant]
+    variants = (variant,) if crop else ('gallery', 'full')
+    if not crop:
+        attrs.setdefault('sizes', sizes or f'(max-width: {width}px) 100vw, {width}px')
+        attrs['srcset'] = image.srcset('jpeg', variants)
+    files = image.variants[variant]
+    attrs.setdefault('width', files['width'])
+    attrs.setdefault('height', files['height'])
+    return format_html(
+        '<picture><source type="{}" srcset="{}"{}><img src="{}"{}></picture>',
+        CONTENT_TYPES['webp'],
+        image.srcset('webp', variants) if not crop else image.variant_url(variant, 'webp'),
+        flatatt({'sizes': attrs['sizes']}) if 'sizes' in attrs else '',
+        image.variant_url(variant, 'jpeg'),
+        flatatt(attrs),
+    )
+
+
+@register.simple_tag
+def srcset(image, fmt='jpeg'):
+    """srcset value over the gallery and full variants, e.g. for <source> in custom markup"""
+    return image.srcset(fmt) if image else ''
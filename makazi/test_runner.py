@@ -0,0 +1,26 @@
+# makazi/test_runner.py
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+# Tests clear and bump the page cache freely; they get a per-process
+# cache instead of the shared one in settings.CACHES
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'makazi-tests',
+    }
+}
+
+
+class MakaziTestRunner(DiscoverRunner):
+    """DiscoverRunner that keeps the tests out of the shared page cache"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_override = override_settings(CACHES=TEST_CACHES)
+        self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1225 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from . import autocomplete
+from .autocomplete import AutocompleteIndex
+from .benchmarks import SyntheticCatalog, percentile, run_benchmarks, view_scenarios
+from .facets import get_listing_facets
+from .filters import PropertyFilter
+from .geo import encode_geohash, nearest, within_radius
+from .geocoding import geocode_queryset, resolve_location
+from .images import process_images, variant_name
+from .importers import MakaziCSVImporter
+from .models import (
+    Apartment, ApartmentImage, ApartmentReview, Hostel, HostelBooking, HostelReview, Location,
+    Scrape_MakaziListing, parse_price, with_amenities,
+)
+from .page_cache import CSRF_PLACEHOLDER, cache_anonymous_page, get_version, invalidate_model
+from .pagination import KeysetPaginator, KEYSET_ORDERINGS
+from .ratings import set_reviews_approved
+from .serializers import ListingSerializer
+from .similarity import get_similar_items, refresh_similar
+from .search import SQLiteFTSBackend, expand_term, search_queryset
+from .thumbnails import THUMBNAIL_SIZE, fetch_pending_thumbnails, fetch_thumbnail, schedule_thumbnail, storage_name
+
+# Pages render without the collectstatic manifest
+PLAIN_STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+
+def make_apartment(**fields):
+    values = {
+        'title': 'Apartment Mikocheni', 'description': 'Two bedrooms', 'location': 'Mikocheni, Kinondoni, Dar es Salaam',
+        'address': 'Plot 12', 'apartment_type': '2bed', 'price_per_month': Decimal('600000'),
+        'area_sqft': 900, 'owner_name': 'Asha', 'owner_phone': '0712000000',
+    }
+    values.update(fields)
+    return Apartment.objects.create(**values)
+
+
+def make_hostel(**fields):
+    values = {
+        'name': 'Hostel Mlimani', 'university': 'UDSM', 'description': 'Near campus',
+        'location': 'Ubungo, Dar es Salaam', 'address': 'Block A', 'hostel_type': 'private',
+        'warden_name': 'Juma', 'warden_phone': '0713000000', 'price_per_semester': Decimal('450000'),
+        'price_per_month': Decimal('120000'), 'semester': 'sem1', 'total_rooms': 10, 'total_capacity': 40,
+    }
+    values.update(fields)
+    return Hostel.objects.create(**values)
+
+
+def make_listing(number, **fields):
+    values = {
+        'title': f'Nyumba ya kupanga {number}', 'link': f'https://example.com/listing/{number}',
+        'price': f'{(number % 7 + 1) * 100000} per month', 'location': 'Sinza, Ubungo, Dar es Salaam',
+    }
+    values.update(fields)
+    return Scrape_MakaziListing.objects.create(**values)
+
+
+def make_review(apartment, rating, is_approved=True):
+    return ApartmentReview.objects.create(
+        apartment=apartment, reviewer_name='Neema', rating=rating,
+        title='Nice', comment='Clean and quiet', is_approved=is_approved,
+    )
+
+
+def jpeg_upload(name='photo.jpg', size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class MediaRootMixin:
+    """Runs the test case against a temporary MEDIA_ROOT"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root, IMAGE_VARIANTS_ASYNC=False)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class PriceColumnTests(TestCase):
+    def test_parse_price(self):
+        self.assertEqual(parse_price('TSh 1,300,000 kwa mwezi'), (1300000, 'month'))
+        self.assertEqual(parse_price('450000/= per year'), (450000, 'year'))
+        self.assertEqual(parse_price('Bei: 75,000'), (75000, ''))
+        self.assertEqual(parse_price('Call for price'), (0, ''))
+        self.assertEqual(parse_price(None), (0, ''))
+
+    def test_price_value_follows_the_price(self):
+        listing = make_listing(1, price='Sh.1,300,000 per month')
+        self.assertEqual((listing.price_value, listing.price_period), (1300000, 'month'))
+        listing.price = '900,000'
+        listing.save()
+        listing.refresh_from_db()
+        self.assertEqual((listing.price_value, listing.price_period, listing.digits_price), (900000, '', '900000'))
+
+    @override_settings(STATICFILES_STORAGE=PLAIN_STATIC_STORAGE)
+    def test_listings_sort_by_numeric_price(self):
+        for number, price in enumerate(['90,000', '1,200,000', '300,000']):
+            make_listing(number, price=price)
+        response = self.client.get(reverse('makazi:listings'), {'sort': 'price'})
+        self.assertEqual([row.price_value for row in response.context['listings']], [90000, 300000, 1200000])
+
+
+def csv_file(rows, extra_fields=()):
+    file = io.StringIO()
+    writer = csv.DictWriter(file, ['title', 'link', 'price', 'location', 'description', 'main_image_url', *extra_fields])
+    writer.writeheader()
+    writer.writerows(rows)
+    file.seek(0)
+    return file
+
+
+def csv_row(number, **fields):
+    row = {
+        'title': f'Nyumba ya kupanga {number}', 'link': f'https://example.com/listing/{number}',
+        'price': '400,000 kwa mwezi', 'location': 'Sinza, Ubungo, Dar es Salaam',
+        'description': 'Vyumba viwili', 'main_image_url': '',
+    }
+    row.update(fields)
+    return row
+
+
+class CSVImportTests(TestCase):
+    def run_import(self, rows, **options):
+        return MakaziCSVImporter(**options).run(csv_file(rows))
+
+    def test_rows_are_written_in_batches(self):
+        rows = [csv_row(number) for number in range(7)]
+        rows.append(csv_row(3, title='Nyumba ya kupanga 3 (imesasishwa)'))
+        rows.append(csv_row(99, title=''))
+
+        stats = self.run_import(rows, batch_size=3)
+        self.assertEqual((stats.inserted, stats.updated, stats.skipped), (7, 1, 1))
+        listing = Scrape_MakaziListing.objects.get(link='https://example.com/listing/3')
+        self.assertEqual(listing.title, 'Nyumba ya kupanga 3 (imesasishwa)')
+        self.assertEqual((listing.price_value, listing.slug, listing.area.name), (400000, 'nyumba-ya-kupanga-3-imesasishwa', 'Sinza'))
+        # Bulk writes skip post_save, so the importer indexes the rows itself
+        self.assertEqual(search_queryset(Scrape_MakaziListing.objects.all(), 'imesasishwa').get(), listing)
+
+    def test_dry_run_writes_nothing(self):
+        stats = self.run_import([csv_row(1), csv_row(2)], dry_run=True)
+        self.assertEqual(stats.inserted, 2)
+        self.assertFalse(Scrape_MakaziListing.objects.exists())
+
+
+class DeltaImportTests(TestCase):
+    def run_import(self, rows, **options):
+        return MakaziCSVImporter(**options).run(csv_file(rows))
+
+    def test_unchanged_rows_are_not_written(self):
+        rows = [csv_row(number) for number in range(5)]
+        self.run_import(rows)
+        before = dict(Scrape_MakaziListing.objects.values_list('link', 'scraped_at'))
+
+        # One query to match the links of the batch, nothing written
+        with self.assertNumQueries(1):
+            stats = self.run_import(rows)
+        self.assertEqual((stats.unchanged, stats.updated, stats.inserted), (5, 0, 0))
+        self.assertEqual(dict(Scrape_MakaziListing.objects.values_list('link', 'scraped_at')), before)
+
+    def test_changed_content_is_updated(self):
+        rows = [csv_row(number) for number in range(3)]
+        self.run_import(rows)
+        rows[1]['price'] = '450,000 kwa mwezi'
+        stats = self.run_import(rows)
+        self.assertEqual((stats.unchanged, stats.updated), (2, 1))
+        self.assertEqual(Scrape_MakaziListing.objects.get(link=rows[1]['link']).price_value, 450000)
+
+    def test_moved_listings_are_geocoded_again(self):
+        rows = [csv_row(1), csv_row(2)]
+        self.run_import(rows)
+        sinza = Scrape_MakaziListing.objects.get(link=rows[0]['link'])
+        self.assertIsNotNone(sinza.latitude)
+
+        rows[0]['location'] = 'Arusha'
+        rows[1]['location'] = 'Mahali pasipojulikana'
+        self.assertEqual(self.run_import(rows).updated, 2)
+        moved = Scrape_MakaziListing.objects.get(link=rows[0]['link'])
+        self.assertAlmostEqual(float(moved.latitude), -3.3869, places=3)
+        self.assertNotEqual(moved.geohash, sinza.geohash)
+        # An unknown place clears the old coordinates rather than keeping them
+        self.assertIsNone(Scrape_MakaziListing.objects.get(link=rows[1]['link']).latitude)
+
+    def test_admin_flags_survive_a_reimport(self):
+        rows = [csv_row(1)]
+        self.run_import(rows)
+        Scrape_MakaziListing.objects.update(is_featured=True)
+        rows[0]['description'] = 'Vyumba vitatu'
+        self.assertEqual(self.run_import(rows).updated, 1)
+        self.assertTrue(Scrape_MakaziListing.objects.get().is_featured)
+
+        # A CSV that carries the column does set it
+        rows[0]['is_featured'] = 'false'
+        MakaziCSVImporter().run(csv_file(rows, extra_fields=['is_featured']))
+        self.assertFalse(Scrape_MakaziListing.objects.get().is_featured)
+
+    def test_missing_listings_expire_and_come_back(self):
+        rows = [csv_row(number) for number in range(3)]
+        self.run_import(rows)
+        self.assertEqual(self.run_import(rows[:2], expire_missing=True).expired, 1)
+        self.assertFalse(Scrape_MakaziListing.objects.get(link=rows[2]['link']).is_available)
+
+        stats = self.run_import(rows, expire_missing=True)
+        self.assertEqual((stats.updated, stats.expired), (1, 0))
+        self.assertEqual(Scrape_MakaziListing.objects.filter(is_available=True).count(), 3)
+
+
+class FullTextSearchTests(TestCase):
+    def search(self, model, query):
+        return list(search_queryset(model.objects.all(), query))
+
+    def test_title_matches_rank_above_description_matches(self):
+        in_description = make_listing(1, title='Nyumba Sinza', description='Karibu na Mlimani City')
+        in_title = make_listing(2, title='Nyumba karibu na Mlimani', description='Vyumba vitatu')
+        make_listing(3, title='Kiwanja Bunju', description='Hati safi')
+        self.assertEqual(self.search(Scrape_MakaziListing, 'mlimani'), [in_title, in_description])
+
+    def test_every_term_must_match_a_variant(self):
+        listing = make_listing(1, title='Chumba master Sinza', description='')
+        make_listing(2, title='Chumba Mbezi', description='')
+        # vyumba -> chumba (noun class), room -> chumba (synonym), prefixes match
+        self.assertEqual(self.search(Scrape_MakaziListing, 'vyumba mast sinza'), [listing])
+        self.assertEqual(len(self.search(Scrape_MakaziListing, 'room')), 2)
+        self.assertIn('chumba', expand_term('vyumba'))
+
+    def test_index_follows_saves_and_deletes(self):
+        apartment = make_apartment(title='Fleti Masaki')
+        self.assertEqual(self.search(Apartment, 'masaki'), [apartment])
+        apartment.title = 'Fleti Oysterbay'
+        apartment.save()
+        self.assertEqual(self.search(Apartment, 'masaki'), [])
+        hostel = make_hostel(university='Ardhi University')
+        self.assertEqual(self.search(Hostel, 'ardhi'), [hostel])
+        hostel.delete()
+        self.assertEqual(self.search(Hostel, 'ardhi'), [])
+
+    def test_punctuation_only_query_matches_nothing(self):
+        make_listing(1)
+        self.assertEqual(SQLiteFTSBackend.match_expression('"*'), '')
+        self.assertEqual(self.search(Scrape_MakaziListing, '"*'), [])
+
+    def test_loose_synonyms_are_not_expanded(self):
+        make_listing(1, title='Chumba self contained Sinza', description='')
+        self.assertEqual(expand_term('master'), ['master'])
+        self.assertEqual(self.search(Scrape_MakaziListing, 'master'), [])
+        self.assertEqual(self.search(Scrape_MakaziListing, 'bedroom'), [])
+
+    def test_search_composes_with_other_filters(self):
+        available = make_listing(1, title='Nyumba Sinza')
+        make_listing(2, title='Nyumba Mbezi', is_available=False)
+        queryset = search_queryset(Scrape_MakaziListing.objects.filter(is_available=True), 'nyumba')
+        self.assertEqual(queryset.count(), 1)
+        self.assertEqual(list(queryset.values_list('pk', flat=True)), [available.pk])
+        self.assertIsNotNone(queryset.get().search_rank)
+
+
+class ListingFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_roll_up_the_location_hierarchy(self):
+        make_listing(1, location='Sinza, Ubungo, Dar es Salaam', price='150,000', property_type='Room', bedrooms=1)
+        make_listing(2, location='Mbezi, Ubungo, Dar es Salaam', price='600,000', property_type='House', bedrooms=3)
+        make_listing(3, location='Njiro, Arusha', price='600,000', property_type='House', bedrooms=3)
+        make_listing(4, location='Sinza, Ubungo, Dar es Salaam', is_available=False)
+
+        facets = get_listing_facets()
+        locations = {row['location']: row['count'] for row in facets['locations']}
+        self.assertEqual((locations['Dar es Salaam'], locations['Ubungo'], locations['Sinza']), (2, 2, 1))
+        self.assertEqual(locations['Arusha'], 1)
+        self.assertEqual(facets['property_types'][0], {'property_type': 'House', 'count': 2})
+        buckets = {row['label']: row['count'] for row in facets['price_buckets']}
+        self.assertEqual((buckets['Chini ya 200,000'], buckets['500,000 - 1,000,000']), (1, 2))
+
+    @override_settings(STATICFILES_STORAGE=PLAIN_STATIC_STORAGE)
+    def test_listings_page_links_the_price_buckets(self):
+        make_listing(1, price='150,000')
+        make_listing(2, price='600,000')
+        html = self.client.get(reverse('makazi:listings')).content.decode()
+        self.assertIn('href="?max_price=199999"', html)
+        self.assertIn('href="?min_price=500000&amp;max_price=999999"', html)
+        self.assertIn('500,000 - 1,000,000 (1)', html)
+        self.assertNotIn('Zaidi ya 50M', html)
+
+    def test_cached_until_a_listing_changes(self):
+        make_listing(1)
+        self.assertEqual(get_listing_facets()['total'], 1)
+        with self.assertNumQueries(0):
+            get_listing_facets()
+        make_listing(2)
+        self.assertEqual(get_listing_facets()['total'], 2)
+
+
+@override_settings(STATICFILES_STORAGE=PLAIN_STATIC_STORAGE)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(23):
+            make_listing(number)
+
+    def setUp(self):
+        cache.clear()
+
+    def listings_page(self, **params):
+        response = self.client.get(reverse('makazi:listings'), {'per_page': 5, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_keyset_pages_walk_the_whole_ordering(self):
+        for sort, ordering in KEYSET_ORDERINGS.items():
+            queryset = Scrape_MakaziListing.objects.order_by(*ordering)
+            expected = list(queryset.values_list('pk', flat=True))
+            paginator = KeysetPaginator(queryset, ordering, per_page=5)
+
+            seen, pages, page = [], [], paginator.page()
+            while True:
+                pages.append([row.pk for row in page])
+                seen += pages[-1]
+                if not page.has_next():
+                    break
+                page = paginator.page(page.next_cursor)
+            self.assertEqual(seen, expected, sort)
+
+            # And back again through the previous cursors
+            for previous in reversed(pages[:-1]):
+                page = paginator.page(page.previous_cursor)
+                self.assertEqual([row.pk for row in page], previous, sort)
+            self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor_starts_over(self):
+        ordering = KEYSET_ORDERINGS['price']
+        paginator = KeysetPaginator(Scrape_MakaziListing.objects.all(), ordering, per_page=5)
+        self.assertEqual([row.pk for row in paginator.page('not-a-cursor')],
+                         [row.pk for row in paginator.page()])
+
+    def test_listing_page_links_continue_with_cursors(self):
+        expected = list(Scrape_MakaziListing.objects.order_by('-price_value', '-id').values_list('pk', flat=True))
+        first = self.listings_page(sort='-price')
+        self.assertFalse(first['cursor_pagination'])
+        self.assertIsNone(first['previous_cursor'])
+        self.assertEqual(first['page_links'], [1, 2, 3])
+
+        second = self.listings_page(sort='-price', page=2)
+        self.assertEqual([row.pk for row in second['listings']], expected[5:10])
+        after = self.listings_page(sort='-price', cursor=second['next_cursor'])
+        self.assertTrue(after['cursor_pagination'])
+        self.assertEqual([row.pk for row in after['listings']], expected[10:15])
+        before = self.listings_page(sort='-price', cursor=second['previous_cursor'])
+        self.assertEqual([row.pk for row in before['listings']], expected[:5])
+
+        html = self.client.get(reverse('makazi:listings'), {'per_page': 5, 'sort': '-price', 'page': 2}).content.decode()
+        self.assertIn(f'?cursor={second["next_cursor"]}', html)
+
+    def test_numbered_links_stop_for_keyset_sorts(self):
+        context = self.listings_page(per_page=1, page=4)
+        self.assertEqual(context['page_links'], [2, 3, 4, 5])
+        self.assertIsNotNone(context['next_cursor'])
+
+        # Relevance has no keyset ordering, so it keeps numbered links
+        context = self.listings_page(per_page=1, page=8, q='nyumba')
+        self.assertIsNone(context['next_cursor'])
+        self.assertEqual(context['page_links'], [6, 7, 8, 9, 10])
+
+
+@override_settings(SIMILAR_ASYNC=False)
+class SimilarItemsTests(TestCase):
+    def test_neighbours_rank_by_area_type_and_price(self):
+        target = make_listing(1, location='Sinza, Ubungo, Dar es Salaam', property_type='House', bedrooms=2, price='500,000')
+        same_ward = make_listing(2, location='Sinza, Ubungo, Dar es Salaam', property_type='House', bedrooms=2, price='550,000')
+        same_district = make_listing(3, location='Mbezi, Ubungo, Dar es Salaam', property_type='House', bedrooms=2, price='500,000')
+        same_region = make_listing(4, location='Kariakoo, Ilala, Dar es Salaam', property_type='Shop', price='5,000,000')
+        make_listing(5, location='Njiro, Arusha', property_type='House', bedrooms=2, price='500,000')
+
+        # Listings are matched within their region (Arusha is left out)
+        neighbours = refresh_similar(Scrape_MakaziListing, ids=[target.pk])
+        self.assertEqual(neighbours[target.pk], [same_ward.pk, same_district.pk, same_region.pk])
+        target.refresh_from_db()
+        self.assertEqual(target.similar_ids, neighbours[target.pk])
+
+    def test_edits_recompute_on_the_next_view(self):
+        apartment = make_apartment()
+        other = make_apartment(title='Apartment Sinza')
+        refresh_similar(Apartment)
+        apartment.refresh_from_db()
+        self.assertEqual(apartment.similar_ids, [other.pk])
+
+        other.is_available = False
+        other.save()
+        self.assertEqual(get_similar_items(apartment), [])
+        apartment.title = 'Apartment Mikocheni B'
+        apartment.save()
+        self.assertIsNone(Apartment.objects.get(pk=apartment.pk).similar_ids)
+
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            # The bounded fallback; the neighbours are stored after the response
+            self.assertEqual(get_similar_items(apartment), [])
+        self.assertEqual(Apartment.objects.get(pk=apartment.pk).similar_ids, [])
+
+    def test_fallback_stays_in_the_region_nearest_in_price(self):
+        target = make_listing(1, location='Sinza, Ubungo, Dar es Salaam', price='500,000')
+        near = make_listing(2, location='Kariakoo, Ilala, Dar es Salaam', price='450,000')
+        far = make_listing(3, location='Mbezi, Ubungo, Dar es Salaam', price='2,000,000')
+        make_listing(4, location='Njiro, Arusha', price='500,000')
+        make_listing(5, location='Sinza, Ubungo, Dar es Salaam', price='500,000', is_available=False)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertEqual(get_similar_items(target), [near, far])
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(Scrape_MakaziListing.objects.get(pk=target.pk).similar_ids)
+
+    def test_rebuild_missing_only_fills_stale_objects(self):
+        apartment = make_apartment()
+        other = make_apartment(title='Apartment Sinza')
+        Apartment.objects.filter(pk=other.pk).update(similar_ids=[])
+
+        call_command('rebuild_similar', '--missing', stdout=io.StringIO())
+        self.assertEqual(Apartment.objects.get(pk=apartment.pk).similar_ids, [other.pk])
+        self.assertEqual(Apartment.objects.get(pk=other.pk).similar_ids, [])
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.renders = 0
+        self.rendered_tokens = []
+
+        @cache_anonymous_page(Scrape_MakaziListing)
+        def view(request):
+            self.renders += 1
+            # Each call masks the secret differently
+            tokens = [get_token(request), get_token(request)]
+            self.rendered_tokens += tokens
+            form = '<form><input type="hidden" name="csrfmiddlewaretoken" value="{}"></form>'
+            return HttpResponse(''.join(form.format(token) for token in tokens))
+
+        self.view = view
+
+    def get(self, path='/listings/', user=None, **extra):
+        request = self.factory.get(path, **extra)
+        request.user = user or AnonymousUser()
+        return self.view(request)
+
+    def tokens(self, response):
+        return re.findall(r'name="csrfmiddlewaretoken" value="([^"]*)"', response.content.decode())
+
+    def test_anonymous_miss_then_hit(self):
+        first = self.get()
+        self.assertEqual(self.get()['ETag'], first['ETag'])
+        # Tracking parameters and empty values don't change the page
+        self.get('/listings/?utm_source=whatsapp&q=')
+        self.assertEqual(self.renders, 1)
+        self.get('/listings/?q=sinza')
+        self.assertEqual(self.renders, 2)
+
+    def test_sessions_and_logged_in_users_bypass_the_cache(self):
+        self.get()
+        self.get(HTTP_COOKIE=f'{settings.SESSION_COOKIE_NAME}=abc')
+        self.get(user=User(username='asha'))
+        self.assertEqual(self.renders, 3)
+        request = self.factory.post('/listings/')
+        request.user = AnonymousUser()
+        self.view(request)
+        self.assertEqual(self.renders, 4)
+
+    def test_conditional_requests_get_304(self):
+        first = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+        self.assertEqual(self.renders, 1)
+
+    def test_version_bumps_invalidate_the_pages(self):
+        first = self.get()
+        invalidate_model(Apartment)
+        self.get()
+        self.assertEqual(self.renders, 1)
+
+        make_listing(1)
+        second = self.get()
+        self.assertEqual(self.renders, 2)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_every_form_gets_the_visitors_token(self):
+        for response in (self.get(), self.get()):
+            self.assertNotIn(CSRF_PLACEHOLDER, response.content.decode())
+            tokens = self.tokens(response)
+            self.assertEqual(len(tokens), 2)
+            # None of the tokens rendered into the cached page is served
+            self.assertFalse(set(tokens) & set(self.rendered_tokens))
+        self.assertEqual(self.renders, 1)
+
+
+class ListingApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.listing = make_listing(1, slug='nyumba-sinza', main_image_url='')
+        make_listing(2, slug='nyumba-mbezi')
+
+    def setUp(self):
+        cache.clear()
+
+    async def get_json(self, params):
+        response = await AsyncClient().get(reverse('makazi:filter_api'), {'sort': 'price', **params})
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        return json.loads(response.content)
+
+    async def test_fields_narrow_the_output(self):
+        data = await self.get_json({'fields': 'id,url,bogus'})
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['listings'][0], {'id': self.listing.pk, 'url': self.listing.get_absolute_url()})
+        self.assertEqual(set((await self.get_json({}))['listings'][0]), set(ListingSerializer.default_fields))
+
+    async def test_compact_and_streamed_responses_match(self):
+        compact = await self.get_json({'fields': 'id,title', 'format': 'compact'})
+        self.assertEqual(compact['fields'], ['id', 'title'])
+        self.assertEqual(compact['listings'][0], [self.listing.pk, self.listing.title])
+        self.assertEqual(await self.get_json({'fields': 'id,title', 'format': 'compact', 'stream': '1'}), compact)
+
+
+@override_settings(STATICFILES_STORAGE=PLAIN_STATIC_STORAGE)
+class ListingSlugTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_url_carries_slug_and_id(self):
+        listing = make_listing(1, title='Nyumba Nzuri Mbezi Beach')
+        self.assertEqual(listing.slug, 'nyumba-nzuri-mbezi-beach')
+        self.assertEqual(listing.get_absolute_url(), f'/listing/nyumba-nzuri-mbezi-beach-{listing.pk}/')
+        response = self.client.get(listing.get_absolute_url())
+        self.assertEqual(response.context['listing'], listing)
+
+    def test_old_and_bare_slugs_redirect(self):
+        listing = make_listing(1, title='Nyumba Nzuri Mbezi Beach')
+        canonical = listing.get_absolute_url()
+        for slug_id in [f'jina-la-zamani-{listing.pk}', 'nyumba-nzuri-mbezi-beach']:
+            response = self.client.get(reverse('makazi:property_detail', args=[slug_id]))
+            self.assertRedirects(response, canonical, status_code=301, fetch_redirect_response=False)
+
+    def test_unavailable_listing_is_gone(self):
+        listing = make_listing(1, is_available=False)
+        self.assertEqual(self.client.get(listing.get_absolute_url()).status_code, 404)
+        self.assertEqual(self.client.get('/listing/hakuna-kitu/').status_code, 404)
+
+
+class ProximitySearchTests(TestCase):
+    # Sinza, ~1.6 km from Mwenge, ~5.6 km from Masaki and ~580 km from Arusha
+    SINZA = (-6.779, 39.222)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mwenge = make_listing(1, latitude=Decimal('-6.768'), longitude=Decimal('39.232'))
+        cls.masaki = make_listing(2, latitude=Decimal('-6.745'), longitude=Decimal('39.265'))
+        cls.arusha = make_listing(3, latitude=Decimal('-3.3869'), longitude=Decimal('36.683'))
+        cls.unplaced = make_listing(4)
+
+    def test_geohash_is_stored_with_the_coordinates(self):
+        self.assertEqual(self.mwenge.geohash, encode_geohash(-6.768, 39.232))
+        self.assertEqual(self.unplaced.geohash, '')
+        self.assertEqual(encode_geohash(57.64911, 10.40744, precision=11), 'u4pruydqqvj')
+
+    def test_radius_search_is_ordered_by_distance(self):
+        rows = list(within_radius(Scrape_MakaziListing.objects.all(), *self.SINZA, 10))
+        self.assertEqual(rows, [self.mwenge, self.masaki])
+        self.assertAlmostEqual(rows[0].distance_km, 1.6, delta=0.1)
+        self.assertEqual(list(within_radius(Scrape_MakaziListing.objects.all(), *self.SINZA, 2)), [self.mwenge])
+
+    def test_nearest_widens_the_radius_until_k_are_found(self):
+        queryset = Scrape_MakaziListing.objects.all()
+        self.assertEqual(list(nearest(queryset, *self.SINZA, 1)), [self.mwenge])
+        self.assertEqual(list(nearest(queryset, *self.SINZA, 3)), [self.mwenge, self.masaki, self.arusha])
+
+    @override_settings(STATICFILES_STORAGE=PLAIN_STATIC_STORAGE)
+    def test_listings_page_sorts_point_searches_by_distance(self):
+        cache.clear()
+        response = self.client.get(reverse('makazi:listings'), {'lat': '-6.779', 'lng': '39.222', 'radius': '10'})
+        self.assertEqual(list(response.context['listings']), [self.mwenge, self.masaki])
+
+
+class GeocoderTests(TestCase):
+    def test_resolves_the_most_specific_known_level(self):
+        latitude, longitude, level = resolve_location('Sinza, Ubungo, Dar es Salaam')
+        self.assertEqual((round(latitude, 3), round(longitude, 3), level), (-6.779, 39.222, 'ward'))
+        self.assertEqual(resolve_location('Kijiji Kipya, Ubungo, Dar es Salaam')[2], 'district')
+        self.assertEqual(resolve_location('Arusha')[2], 'region')
+        self.assertIsNone(resolve_location('Atlantis'))
+
+    def test_geocode_queryset_updates_each_distinct_location(self):
+        for number in range(3):
+            make_listing(number, location='Sinza, Ubungo, Dar es Salaam')
+        make_listing(3, location='Atlantis')
+
+        counts = geocode_queryset(Scrape_MakaziListing.objects.all(), dry_run=True)
+        self.assertEqual((counts['ward'], counts['unresolved']), (3, 1))
+        self.assertFalse(Scrape_MakaziListing.objects.filter(latitude__isnull=False).exists())
+
+        geocode_queryset(Scrape_MakaziListing.objects.all())
+        placed = Scrape_MakaziListing.objects.filter(latitude__isnull=False)
+        self.assertEqual(placed.count(), 3)
+        self.assertEqual(placed.first().geohash, encode_geohash(-6.779, 39.222))
+
+
+class LocationAreaTests(TestCase):
+    def test_area_follows_the_location(self):
+        listing = make_listing(1, location='Sinza, Ubungo, Dar es Salaam')
+        self.assertEqual(listing.area.path, 'dar es salaam/ubungo/sinza')
+
+        listing = Scrape_MakaziListing.objects.get(pk=listing.pk)
+        listing.location = 'Mbezi, Ubungo, Dar es Salaam'
+        listing.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.area.path, 'dar es salaam/ubungo/mbezi')
+
+    def test_unchanged_location_is_not_looked_up(self):
+        listing = Scrape_MakaziListing.objects.get(pk=make_listing(1).pk)
+        listing.title = 'Nyumba nzuri'
+        with self.assertNumQueries(0):
+            listing.resolve_area()
+        deferred = Scrape_MakaziListing.objects.only('id', 'title').get(pk=listing.pk)
+        with self.assertNumQueries(0):
+            deferred.resolve_area()
+
+    def test_preload_fills_the_cache_in_one_query(self):
+        make_listing(1, location='Sinza, Ubungo, Dar es Salaam')
+        cache = {}
+        with self.assertNumQueries(1):
+            Location.objects.preload(['Sinza, Ubungo, Dar es Salaam', 'Kariakoo, Ilala, Dar es Salaam'], cache)
+        self.assertEqual(set(cache), {'dar es salaam', 'dar es salaam/ubungo', 'dar es salaam/ubungo/sinza'})
+        with self.assertNumQueries(0):
+            node = Location.objects.for_string('Sinza, Ubungo, Dar es Salaam', cache=cache)
+        self.assertEqual(node.path, 'dar es salaam/ubungo/sinza')
+
+
+class PriceFilterTests(TestCase):
+    def filtered(self, **params):
+        queryset = Scrape_MakaziListing.objects.order_by('price_value')
+        return [row.price_value for row in PropertyFilter(params, queryset=queryset).qs]
+
+    def test_range_compares_integers(self):
+        for number, price in enumerate(['90,000', '300,000', '1,200,000']):
+            make_listing(number, price=price)
+        # As strings '90000' > '300000'; as integers it is below the range
+        self.assertEqual(self.filtered(min_price='100000'), [300000, 1200000])
+        self.assertEqual(self.filtered(min_price='100000', max_price='500000'), [300000])
+        self.assertEqual(self.filtered(max_price='Sh.300,000'), [90000, 300000])
+
+    def test_invalid_price_is_a_form_error(self):
+        result = PropertyFilter({'min_price': 'nafuu'}, queryset=Scrape_MakaziListing.objects.all())
+        self.assertFalse(result.is_valid())
+        self.assertIn('min_price', result.errors)
+
+
+class AsgiMiddlewareTests(TestCase):
+    def test_middleware_chain_runs_without_sync_adaptation(self):
+        from django.conf import settings
+        from django.utils.module_loading import import_string
+
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+
+
+class RequestMetricsTests(TestCase):
+    def get(self):
+        return self.client.get(reverse('makazi:autocomplete_api'), {'q': 'm'})
+
+    def test_server_timing_can_be_turned_off(self):
+        with self.settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.get())
+        with self.settings(SERVER_TIMING=True):
+            self.assertIn('queries"', self.get()['Server-Timing'])
+
+    def test_only_slow_requests_log_above_debug(self):
+        with self.assertLogs('makazi.metrics', 'DEBUG') as logs:
+            self.get()
+        self.assertEqual([record.levelname for record in logs.records], ['DEBUG'])
+
+        with self.settings(SLOW_REQUEST_MS=-1), self.assertLogs('makazi.metrics', 'WARNING') as logs:
+            self.get()
+        self.assertIn('view=makazi:autocomplete_api', logs.output[0])
+
+
+@override_settings(AUTOCOMPLETE_ASYNC=False)
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+
+    def test_index_matches_prefixes_and_typos(self):
+        index = AutocompleteIndex([
+            ('Kinondoni, Dar Es Salaam', 'location', 5),
+            ('Kigamboni, Dar Es Salaam', 'location', 9),
+            ('Kinondoni studio near the beach', 'title', 1),
+        ])
+        self.assertEqual([s['text'] for s in index.suggest('kin')], [
+            'Kinondoni, Dar Es Salaam', 'Kinondoni studio near the beach',
+        ])
+        self.assertEqual(index.suggest('Kinondni')[0], {'text': 'Kinondoni, Dar Es Salaam', 'kind': 'location'})
+        # Every word has to match; only the last one by prefix
+        self.assertEqual([s['text'] for s in index.suggest('kinondoni stu')], ['Kinondoni studio near the beach'])
+        self.assertEqual(index.suggest('kin '), [])
+        self.assertEqual(index.suggest('zanzibar'), [])
+
+    def test_index_is_built_from_available_rows(self):
+        make_listing(1, title='Master bedroom Sinza', property_type='Room')
+        make_listing(2, title='Hidden listing', is_available=False)
+        make_hostel(university='Ardhi University')
+
+        self.assertEqual(autocomplete.suggest('sinza'), [
+            {'text': 'Sinza, Ubungo, Dar es Salaam', 'kind': 'location'},
+            {'text': 'Master bedroom Sinza', 'kind': 'title'},
+        ])
+        self.assertEqual(autocomplete.suggest('ardhi'), [{'text': 'Ardhi University', 'kind': 'university'}])
+        self.assertEqual(autocomplete.suggest('hidden'), [])
+        self.assertEqual(autocomplete.suggest('room'), [{'text': 'Room', 'kind': 'property_type'}])
+
+    def test_index_is_rebuilt_after_a_save(self):
+        self.assertEqual(autocomplete.suggest('mbezi'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            make_listing(1, title='Mbezi beach villa')
+        self.assertEqual(autocomplete.suggest('mbezi')[0]['text'], 'Mbezi beach villa')
+
+    def test_saves_that_keep_the_phrases_do_not_rebuild(self):
+        listing = make_listing(1, title='Mbezi beach villa')
+        index = autocomplete.get_autocomplete_index()
+        version = autocomplete.get_version()
+
+        listing.price = 'TSh 900,000'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            listing.save()
+            invalidate_model(Scrape_MakaziListing)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(autocomplete.get_version(), version)
+        self.assertIs(autocomplete.get_autocomplete_index(), index)
+
+        listing.title = 'Mbezi beach house'
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.save(update_fields=['title'])
+        self.assertIsNot(autocomplete.get_autocomplete_index(), index)
+        self.assertEqual(autocomplete.suggest('house')[0]['text'], 'Mbezi beach house')
+
+    def test_api_requires_two_characters(self):
+        make_listing(1, title='Mbezi beach villa')
+        response = self.client.get(reverse('makazi:autocomplete_api'), {'q': 'mb', 'limit': 'x'})
+        self.assertEqual(response.json()['suggestions'][0]['text'], 'Mbezi beach villa')
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('makazi:autocomplete_api'), {'q': 'm'}).json()['suggestions'], [])
+
+
+class AutocompleteRebuildTests(TransactionTestCase):
+    """The worker thread needs its own committed view of the database"""
+
+    def setUp(self):
+        cache.clear()
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+
+    def wait_for_rebuild(self):
+        autocomplete.get_executor().submit(lambda: None).result()
+
+    def test_save_rebuilds_in_a_worker(self):
+        self.assertEqual(autocomplete.suggest('mbezi'), [])
+        make_listing(1, title='Mbezi beach villa')
+        self.wait_for_rebuild()
+        self.assertEqual(autocomplete.suggest('mbezi')[0]['text'], 'Mbezi beach villa')
+
+    def test_stale_index_is_served_until_the_rebuild(self):
+        index = autocomplete.get_autocomplete_index()
+        # Another process changed a phrase: the request that notices the
+        # new version gets the old index back
+        cache.set(autocomplete.VERSION_KEY, autocomplete.get_version() + 1, None)
+        autocomplete._checked_at = 0.0
+        self.assertIs(autocomplete.get_autocomplete_index(), index)
+        self.wait_for_rebuild()
+        self.assertIsNot(autocomplete.get_autocomplete_index(), index)
+
+
+@override_settings(QUERY_BUDGET_RAISE=True, SIMILAR_ASYNC=False, STATICFILES_STORAGE=PLAIN_STATIC_STORAGE)
+class DetailQueryBudgetTests(TestCase):
+    """First (cold cache) views of the detail pages, which show the similar items fallback"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hostel_detail_within_budget(self):
+        hostel = make_hostel()
+        for number in range(4):
+            make_hostel(name=f'Hostel {number}')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('makazi:hostel_detail', args=[hostel.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['similar_hostels']), 3)
+        # Recomputed after the response
+        hostel.refresh_from_db()
+        self.assertEqual(len(hostel.similar_ids), 4)
+
+    def test_apartment_detail_within_budget(self):
+        apartment = make_apartment()
+        make_apartment(title='Apartment Sinza')
+        make_review(apartment, 4)
+        response = self.client.get(reverse('makazi:apartment_detail', args=[apartment.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(STATICFILES_STORAGE=PLAIN_STATIC_STORAGE)
+class BenchmarkTests(TestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 0.5), percentile(values, 0.99), percentile([], 0.5)), (50, 99, None))
+
+    def test_small_catalog_runs_every_scenario_within_budget(self):
+        cache.clear()
+        # The autocomplete scenario builds the process-wide index
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        catalog = SyntheticCatalog(60, seed=3)
+        catalog.generate()
+        self.assertEqual(Scrape_MakaziListing.objects.count(), 60)
+        self.assertTrue(Scrape_MakaziListing.objects.exclude(area=None).exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            scenarios = run_benchmarks(catalog, repeat=1, import_rows=10, import_path=f'{directory}/bench.csv')
+
+        names = [name for name, urls in view_scenarios()]
+        self.assertEqual(list(scenarios), names + ['import_makazi', 'import_makazi_unchanged'])
+        self.assertEqual([name for name in names if scenarios[name]['over_budget']], [])
+        # The import is rolled back so the catalog keeps its scale
+        self.assertEqual(Scrape_MakaziListing.objects.count(), 60)
+
+
+class RatingCounterTests(TestCase):
+    def assertRating(self, apartment, count, average):
+        apartment.refresh_from_db()
+        self.assertEqual(apartment.rating_count, count)
+        self.assertAlmostEqual(apartment.avg_rating, average)
+
+    def test_reviews_adjust_the_counters(self):
+        apartment = make_apartment()
+        make_review(apartment, 5)
+        review = make_review(apartment, 3)
+        make_review(apartment, 1, is_approved=False)
+        self.assertRating(apartment, 2, 4.0)
+
+        review.rating = 4
+        review.save()
+        self.assertRating(apartment, 2, 4.5)
+
+        review.delete()
+        self.assertRating(apartment, 1, 5.0)
+
+    def test_bulk_approval_adjusts_the_counters(self):
+        apartment = make_apartment()
+        for rating in (2, 4):
+            make_review(apartment, rating, is_approved=False)
+        self.assertEqual(set_reviews_approved(ApartmentReview.objects.all(), True), 2)
+        self.assertRating(apartment, 2, 3.0)
+        set_reviews_approved(ApartmentReview.objects.filter(rating=4), False)
+        self.assertRating(apartment, 1, 2.0)
+
+    def test_saving_a_stale_apartment_keeps_the_counters(self):
+        apartment = make_apartment()
+        stale = Apartment.objects.get(pk=apartment.pk)
+        make_review(apartment, 4)
+
+        stale.title = 'Edited in the admin'
+        stale.save()
+        self.assertRating(apartment, 1, 4.0)
+        self.assertEqual(apartment.title, 'Edited in the admin')
+
+    def test_saving_a_stale_hostel_keeps_the_counters(self):
+        hostel = make_hostel()
+        stale = Hostel.objects.get(pk=hostel.pk)
+        HostelReview.objects.create(
+            hostel=hostel, student_name='Baraka', student_course='BSc', student_year='2',
+            overall_rating=5, cleanliness=4, security=3, facilities=4, management=5,
+            review_title='Good', review_text='Good hostel', stay_duration='year', is_approved=True,
+        )
+        stale.name = 'Hostel Mlimani B'
+        stale.save()
+        hostel.refresh_from_db()
+        self.assertEqual((hostel.rating_count, hostel.avg_overall, hostel.avg_security), (1, 5.0, 3.0))
+
+    def test_refresh_ratings_command_recounts(self):
+        apartment = make_apartment()
+        make_review(apartment, 5)
+        Apartment.objects.filter(pk=apartment.pk).update(rating_count=7, avg_rating=1.0)
+        call_command('refresh_ratings', '--model', 'apartments', stdout=io.StringIO())
+        self.assertRating(apartment, 1, 5.0)
+
+
+class HostelOccupancyTests(TestCase):
+    def book(self, hostel, status='pending'):
+        return HostelBooking.objects.create(
+            student_name='Rehema', registration_number='2024-04-01234', student_email='rehema@example.com',
+            student_phone='0714000000', student_course='BCom', student_year='1', hostel=hostel,
+            booking_type='semester', academic_year='2026/2027', semester='sem1',
+            check_in_date=datetime.date(2026, 11, 1), status=status,
+        )
+
+    def assertOccupancy(self, hostel, occupancy, available_rooms):
+        hostel.refresh_from_db()
+        self.assertEqual((hostel.current_occupancy, hostel.available_rooms), (occupancy, available_rooms))
+
+    def test_confirmed_bookings_fill_rooms(self):
+        hostel = make_hostel(total_rooms=2)
+        bookings = [self.book(hostel, 'confirmed') for _ in range(4)]
+        self.book(hostel, 'pending')
+        self.assertOccupancy(hostel, 4, 1)
+
+        bookings[0].status = 'cancelled'
+        bookings[0].save()
+        bookings[1].delete()
+        self.assertOccupancy(hostel, 2, 2)
+
+    def test_stale_booking_copies_count_a_confirmation_once(self):
+        hostel = make_hostel()
+        booking = self.book(hostel)
+        first, second = HostelBooking.objects.get(pk=booking.pk), HostelBooking.objects.get(pk=booking.pk)
+        for copy in (first, second):
+            copy.status = 'confirmed'
+            copy.save()
+        self.assertOccupancy(hostel, 1, 10)
+
+    def test_moving_a_booking_moves_the_occupant(self):
+        old, new = make_hostel(), make_hostel(name='Hostel Mabibo')
+        booking = self.book(old, 'confirmed')
+        booking.hostel = new
+        booking.save()
+        self.assertOccupancy(old, 0, 10)
+        self.assertOccupancy(new, 1, 10)
+
+    def test_stale_hostel_save_keeps_the_occupancy(self):
+        hostel = make_hostel(total_rooms=1)
+        stale = Hostel.objects.get(pk=hostel.pk)
+        for _ in range(4):
+            self.book(hostel, 'confirmed')
+        stale.total_rooms = 3
+        stale.save()
+        self.assertOccupancy(hostel, 4, 2)
+
+    def test_reconcile_repairs_drift(self):
+        hostel = make_hostel()
+        self.book(hostel, 'confirmed')
+        Hostel.objects.filter(pk=hostel.pk).update(current_occupancy=9, available_rooms=0)
+        self.assertEqual(Hostel.objects.reconcile_occupancy(dry_run=True), [(hostel.pk, 9, 1)])
+        self.assertOccupancy(hostel, 9, 0)
+        Hostel.objects.reconcile_occupancy()
+        self.assertOccupancy(hostel, 1, 10)
+
+
+class BulkInvalidationTests(TestCase):
+    """update() paths send no signals, so they bump the page versions themselves"""
+
+    def assertBumps(self, model, pk, action):
+        before = get_version(model, pk)
+        action()
+        self.assertGreater(get_version(model, pk), before)
+
+    def test_rating_changes_bump_the_object(self):
+        apartment = make_apartment()
+        review = make_review(apartment, 4, is_approved=False)
+        self.assertBumps(Apartment, apartment.pk, lambda: set_reviews_approved(
+            ApartmentReview.objects.filter(pk=review.pk), True))
+        self.assertBumps(Apartment, None, lambda: call_command(
+            'refresh_ratings', '--model', 'apartments', stdout=io.StringIO()))
+
+    def test_occupancy_changes_bump_the_hostel(self):
+        hostel = make_hostel()
+        self.assertBumps(Hostel, hostel.pk, lambda: Hostel.objects.adjust_occupancy(hostel.pk, 3))
+        self.assertBumps(Hostel, None, lambda: call_command('reconcile_occupancy', stdout=io.StringIO()))
+
+
+class AmenityFilterTests(TestCase):
+    def test_every_selected_amenity_must_match(self):
+        both = make_apartment(amenities=['wifi', 'parking', 'security'])
+        make_apartment(amenities=['wifi'])
+        queryset = Apartment.objects.all()
+
+        self.assertEqual(list(with_amenities(queryset, ['wifi', 'parking'])), [both])
+        self.assertEqual(with_amenities(queryset, ['wifi']).count(), 2)
+        self.assertEqual(with_amenities(queryset, []).count(), 2)
+        self.assertFalse(with_amenities(queryset, ['sauna']).exists())
+
+    def test_mask_follows_edits(self):
+        apartment = make_apartment(amenities=['gym'])
+        apartment.amenities = ['pool']
+        apartment.save()
+        queryset = Apartment.objects.all()
+        self.assertFalse(with_amenities(queryset, ['gym']).exists())
+        self.assertTrue(with_amenities(queryset, ['pool']).exists())
+
+
+class GalleryImageTests(MediaRootMixin, TestCase):
+    def test_url_is_the_stored_file(self):
+        apartment = make_apartment()
+        first = ApartmentImage.objects.create(apartment=apartment, image=jpeg_upload())
+        # Same upload name: the storage saves it under a new name
+        second = ApartmentImage.objects.create(apartment=apartment, image=jpeg_upload(), position=1)
+
+        self.assertNotEqual(first.image.name, second.image.name)
+        for image in (first, second):
+            stored = ApartmentImage.objects.get(pk=image.pk)
+            self.assertEqual(stored.url, stored.image.url)
+            self.assertEqual(image.url, stored.url)
+
+    def test_variants_follow_the_upload(self):
+        apartment = make_apartment()
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ApartmentImage.objects.create(apartment=apartment, image=jpeg_upload())
+
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (800, 600))
+        self.assertTrue(image.has_variants)
+        self.assertEqual(image.variants['card']['width'], 480)
+        self.assertEqual(apartment.get_main_image(), image)
+
+    def test_variant_urls_fall_back_to_the_original(self):
+        apartment = make_apartment()
+        with self.captureOnCommitCallbacks(execute=False):
+            image = ApartmentImage.objects.create(apartment=apartment, image=jpeg_upload(size=(2000, 1500)))
+
+        self.assertFalse(image.has_variants)
+        self.assertEqual((image.card, image.srcset()), (image.url, ''))
+
+        process_images(ApartmentImage, image.pk)
+        image.refresh_from_db()
+        self.assertTrue(image.card.endswith('.card.jpg'))
+        self.assertEqual(image.srcset('webp'), (
+            f"{image.variants['gallery']['webp']} 960w, {image.variants['full']['webp']} 1600w"
+        ))
+
+    def test_replacing_the_file_deletes_the_old_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ApartmentImage.objects.create(apartment=make_apartment(), image=jpeg_upload())
+        old_card = variant_name(image.image.name, 'card', 'webp')
+        self.assertTrue(default_storage.exists(old_card))
+
+        image.refresh_from_db()
+        image.image = jpeg_upload('other.jpg', size=(400, 300))
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+
+        image.refresh_from_db()
+        self.assertFalse(default_storage.exists(old_card))
+        self.assertEqual((image.width, image.height, image.variants['source']), (400, 300, image.image.name))
+
+    def test_command_backfills_missing_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ApartmentImage.objects.create(apartment=make_apartment(), image=jpeg_upload())
+        ApartmentImage.objects.filter(pk=image.pk).update(variants={}, width=None, height=None)
+
+        out = io.StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('1 apartment images', out.getvalue())
+        image.refresh_from_db()
+        self.assertTrue(image.has_variants)
+
+        # Up to date rows are skipped unless forced
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('0 apartment images', out.getvalue())
+
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    """Serves a JPEG at /photo.jpg and /copy.jpg, HTML at /page.html, 404 elsewhere"""
+    photo = None
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path in ('/photo.jpg', '/copy.jpg'):
+            self.reply('image/jpeg', self.photo)
+        elif path == '/page.html':
+            self.reply('text/html', b'<html></html>')
+        else:
+            self.send_error(404)
+
+    def reply(self, content_type, body):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubImageServerMixin(MediaRootMixin):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        StubImageHandler.photo = jpeg_upload(size=(1200, 900)).read()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubImageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class ThumbnailFetchTests(StubImageServerMixin, TestCase):
+    def test_thumbnail_is_resized_and_stored_by_content(self):
+        listing = make_listing(1, main_image_url=f'{self.base_url}/photo.jpg')
+        copy = make_listing(2, main_image_url=f'{self.base_url}/copy.jpg')
+
+        digest = fetch_thumbnail(listing.main_image_url)
+        self.assertEqual(fetch_thumbnail(copy.main_image_url), digest)
+
+        with default_storage.open(storage_name(digest)) as file:
+            self.assertEqual(Image.open(file).size, THUMBNAIL_SIZE)
+        listing.refresh_from_db()
+        self.assertEqual((listing.thumbnail_hash, listing.thumbnail_source), (digest, listing.main_image_url))
+        self.assertEqual(listing.thumbnail_url, reverse('makazi:thumbnail_file', args=[digest]))
+
+    def test_failures_are_remembered(self):
+        for number, path in enumerate(['/page.html', '/missing.jpg']):
+            listing = make_listing(number, main_image_url=f'{self.base_url}{path}')
+            with self.assertLogs('makazi.thumbnails', 'WARNING'):
+                self.assertEqual(fetch_thumbnail(listing.main_image_url), '')
+            listing.refresh_from_db()
+            self.assertEqual((listing.thumbnail_hash, listing.thumbnail_source), ('', listing.main_image_url))
+            self.assertIsNone(listing.thumbnail_url)
+
+
+class ThumbnailWorkerTests(StubImageServerMixin, TransactionTestCase):
+    """The workers and the proxy view fetch in threads with their own connections"""
+
+    def test_fetch_pending_thumbnails(self):
+        for number in range(6):
+            make_listing(number, main_image_url=f'{self.base_url}/photo.jpg?n={number % 3}')
+        make_listing(7, main_image_url=f'{self.base_url}/missing.jpg')
+
+        with self.assertLogs('makazi.thumbnails', 'WARNING'):
+            fetcher = fetch_pending_thumbnails(workers=2)
+        self.assertEqual((fetcher.fetched, fetcher.failed), (3, 1))
+        self.assertEqual(Scrape_MakaziListing.objects.exclude(thumbnail_hash='').count(), 6)
+        # Nothing left to do, and failures only come back with retry_failed
+        self.assertEqual(fetch_pending_thumbnails(workers=2).fetched, 0)
+
+    def test_proxy_view_redirects_to_the_stored_file(self):
+        url = f'{self.base_url}/photo.jpg'
+        listing = make_listing(1, main_image_url=url)
+        # First view: the original image while the thumbnail is fetched
+        response = self.client.get(reverse('makazi:listing_thumbnail', args=[listing.pk]))
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertIn('max-age=60', response['Cache-Control'])
+        schedule_thumbnail(url).result()
+
+        response = self.client.get(reverse('makazi:listing_thumbnail', args=[listing.pk]))
+        listing.refresh_from_db()
+        self.assertRedirects(response, listing.thumbnail_url, fetch_redirect_response=False)
+
+        response = self.client.get(listing.thumbnail_url)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class ListEditableAdminTests(TestCase):
+    url = '/admin/makazi/scrape_makazilisting/'
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        make_listing(1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        for number in range(2, 12):
+            make_listing(number)
+        cache.clear()  # the cached count
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(many), len(few))
+
+    def test_saving_edits_loads_the_rows_once(self):
+        listings = [make_listing(number) for number in range(5)]
+        data = {'form-TOTAL_FORMS': 5, 'form-INITIAL_FORMS': 5, '_save': 'Save', 'action': ''}
+        for index, listing in enumerate(listings):
+            data[f'form-{index}-id'] = listing.pk
+            data[f'form-{index}-is_featured'] = 'on'
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Scrape_MakaziListing.objects.filter(is_featured=True).count(), 5)
+        table = Scrape_MakaziListing._meta.db_table
+        selects = [q['sql'] for q in queries if q['sql'].startswith(f'SELECT "{table}"."id"')]
+        self.assertEqual(len(selects), 1)
@@ -0,0 +1,222 @@
+# makazi/thumbnails.py
+import hashlib
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models import F, Q
+from PIL import Image, ImageOps
+
+from .models import Scrape_MakaziListing
+from .page_cache import invalidate_model
+
+
+logger = logging.getLogger('makazi.thumbnails')
+
+THUMBNAIL_SIZE = (480, 360)
+THUMBNAIL_QUALITY = 80
+
+# Remote images are fetched by at most this many threads per process
+THUMBNAIL_WORKERS = getattr(settings, 'THUMBNAIL_WORKERS', 8)
+FETCH_TIMEOUT = getattr(settings, 'THUMBNAIL_FETCH_TIMEOUT', 10)
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+USER_AGENT = 'NyumbaFasta thumbnailer'
+
+
+class ThumbnailError(Exception):
+    """The remote image could not be downloaded or decoded"""
+
+
+def storage_name(digest):
+    """Content-addressed path under MEDIA_ROOT, e.g. thumbnails/ab/ab12...ef.jpg"""
+    return f'thumbnails/{digest[:2]}/{digest}.jpg'
+
+
+def download(url):
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise ThumbnailError(f"unsupported URL {url!r}")
+    request = Request(url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            content_type = response.headers.get('Content-Type', '')
+            if content_type and not content_type.startswith('image/'):
+                raise ThumbnailError(f"{url} is {content_type}, not an image")
+            data = response.read(MAX_IMAGE_BYTES + 1)
+    except (URLError, OSError, ValueError) as error:
+        raise ThumbnailError(f"{url}: {error}") from error
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ThumbnailError(f"{url} is larger than {MAX_IMAGE_BYTES} bytes")
+    return data
+
+
+def make_thumbnail(data):
+    """JPEG bytes of the image cropped to THUMBNAIL_SIZE"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image = ImageOps.fit(image, THUMBNAIL_SIZE, Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ThumbnailError(str(error)) from error
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def store_thumbnail(thumbnail):
+    """Save thumbnail bytes under their SHA-256; identical images are stored once"""
+    digest = hashlib.sha256(thumbnail).hexdigest()
+    name = storage_name(digest)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(thumbnail))
+    return digest
+
+
+def fetch_thumbnail(url):
+    """Download, resize and store one remote image; returns its digest or '' on failure.
+
+    Every listing using the URL is updated, so a failure is remembered too
+    and not retried on each page view (see fetch_thumbnails --retry-failed).
+    """
+    digest = ''
+    try:
+        digest = store_thumbnail(make_thumbnail(download(url)))
+    except ThumbnailError as error:
+        logger.warning("No thumbnail for %s", error)
+    Scrape_MakaziListing.objects.filter(main_image_url=url).update(
+        thumbnail_hash=digest, thumbnail_source=url
+    )
+    return digest
+
+
+def _fetch_in_worker(url):
+    close_old_connections()
+    try:
+        return fetch_thumbnail(url)
+    finally:
+        close_old_connections()
+
+
+def pending_urls(queryset=None, retry_failed=False):
+    """Distinct image URLs whose thumbnail is missing or was made for an older URL"""
+    if queryset is None:
+        queryset = Scrape_MakaziListing.objects.all()
+    stale = ~Q(thumbnail_source=F('main_image_url'))
+    if retry_failed:
+        stale |= Q(thumbnail_hash='')
+    return (
+        queryset.exclude(main_image_url__isnull=True).exclude(main_image_url='')
+        .filter(stale).order_by().values_list('main_image_url', flat=True).distinct()
+    )
+
+
+class ThumbnailFetcher:
+    """Fetch many remote images with a bounded pool of threads.
+
+    URLs are submitted a few batches ahead of the workers rather than all
+    at once, so memory stays flat for any number of listings.
+    """
+
+    def __init__(self, workers=THUMBNAIL_WORKERS, stdout=None):
+        self.workers = max(1, workers)
+        self.stdout = stdout
+        self.fetched = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def run(self, urls):
+        window = self.workers * 4
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='makazi-thumbnails') as pool:
+            batch = []
+            for url in urls:
+                batch.append(url)
+                if len(batch) >= window:
+                    self.collect(pool.map(_fetch_in_worker, batch))
+                    batch = []
+            if batch:
+                self.collect(pool.map(_fetch_in_worker, batch))
+        return self
+
+    def collect(self, digests):
+        for digest in digests:
+            if digest:
+                self.fetched += 1
+            else:
+                self.failed += 1
+        if self.stdout:
+            self.stdout.write(f"  {self.fetched + self.failed} images, {self.failed} failed")
+
+    def summary(self):
+        return (
+            f"{self.fetched} thumbnails fetched, {self.failed} failed "
+            f"in {time.monotonic() - self.started:.2f}s"
+        )
+
+
+def fetch_pending_thumbnails(workers=THUMBNAIL_WORKERS, retry_failed=False, limit=None, stdout=None):
+    urls = pending_urls(retry_failed=retry_failed)
+    if limit:
+        urls = urls[:limit]
+    # Read the URLs up front: the workers update the rows being iterated
+    fetcher = ThumbnailFetcher(workers, stdout=stdout).run(list(urls))
+    if fetcher.fetched or fetcher.failed:
+        # Cached list pages still point the cards at the thumbnail proxy
+        invalidate_model(Scrape_MakaziListing)
+    return fetcher
+
+
+_pool = None
+_inflight = {}
+_lock = threading.Lock()
+
+
+def _shared_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='makazi-thumbnails')
+    return _pool
+
+
+def _forget(url):
+    with _lock:
+        _inflight.pop(url, None)
+
+
+def schedule_thumbnail(url):
+    """Fetch `url` in the shared pool; returns the future of the running fetch.
+
+    Concurrent requests for the same URL share one download.
+    """
+    with _lock:
+        future = _inflight.get(url)
+        if future is None:
+            future = _shared_pool().submit(_fetch_in_worker, url)
+            _inflight[url] = future
+            future.add_done_callback(lambda done: _forget(url))
+    return future
+
+
+def ensure_thumbnail(row):
+    """Digest of the thumbnail for a listing row, or '' while there is none.
+
+    `row` has main_image_url, thumbnail_hash and thumbnail_source. A missing
+    or outdated thumbnail is fetched in the background; the request that
+    finds it missing does not wait for the download.
+    """
+    url = row['main_image_url']
+    if not url:
+        return ''
+    if row['thumbnail_source'] == url:
+        return row['thumbnail_hash']
+
+    schedule_thumbnail(url)
+    return ''
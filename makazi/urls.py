@@ -15,6 +15,9 @@ urlpatterns = [
     path('contact/<int:listing_id>/', views.contact_about_listing, name='contact_about_listing'),
     path('api/filter/', views.filter_properties_api, name='filter_api'),
     path('api/search/', views.search_properties_api, name='search_api'),
+    path('api/autocomplete/', views.autocomplete_api, name='autocomplete_api'),
+    path('listing/<int:pk>/thumbnail/', views.listing_thumbnail, name='listing_thumbnail'),
+    path('thumbnails/<str:digest>.jpg', views.thumbnail_file, name='thumbnail_file'),
     path('dashboard/', views.dashboard, name='dashboard'),
 
 
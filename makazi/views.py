@@ -2,12 +2,24 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
 from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.http import require_GET
 from .models import Scrape_MakaziListing, ContactMessage
 from .filters import PropertyFilter
 from .forms import ContactForm
+from .page_cache import cache_anonymous_page
+from .autocomplete import suggest
+from .decorators import async_api_view
+from .thumbnails import ensure_thumbnail, storage_name as thumbnail_storage_name
+from .serializers import (
+    ApartmentSerializer, HostelSerializer, ListingSearchSerializer, ListingSerializer,
+    aserialized_response,
+)
+import base64
 import re
+from urllib.parse import urlsplit
 
 
 # Add at top of views.py
@@ -25,34 +37,26 @@ def get_default_image_url():
         # Return data URI for blue placeholder
         return 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iODAwIiBoZWlnaHQ9IjYwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSIjNDM2MWVlIi8+PHRleHQgeD0iNTAlIiB5PSI1MCUiIGZvbnQtZmFtaWx5PSJBcmlhbCIgZm9udC1zaXplPSIyNCIgZmlsbD0id2hpdGUiIHRleHQtYW5jaG9yPSJtaWRkbGUiIGR5PSIuM2VtIj5ObyBJbWFnZTwvdGV4dD48L3N2Zz4='
 
+@cache_anonymous_page(Scrape_MakaziListing)
 def home(request):
     """Home page with featured and latest listings"""
-    featured_listings = Scrape_MakaziListing.objects.filter(
+    available_listings = Scrape_MakaziListing.objects.filter(is_available=True)
+
+    featured_listings = available_listings.filter(
         is_featured=True
     ).order_by('-scraped_at')[:8]
     
-    latest_listings = Scrape_MakaziListing.objects.all().order_by('-scraped_at')[:12]
-    
-    # Get popular locations
-    popular_locations = Scrape_MakaziListing.objects.values(
-        'location'
-    ).annotate(
-        count=Count('id')
-    ).order_by('-count')[:8]
+    latest_listings = available_listings.order_by('-scraped_at')[:12]
     
-    # Property type counts
-    property_types = Scrape_MakaziListing.objects.values(
-        'property_type'
-    ).annotate(
-        count=Count('id')
-    ).exclude(property_type='')[:10]
+    # Popular locations and property type counts come from the facet cache
+    facets = get_listing_facets()
     
     context = {
         'featured_listings': featured_listings,
         'latest_listings': latest_listings,
-        'popular_locations': popular_locations,
-        'property_types': property_types,
-        'total_listings': Scrape_MakaziListing.objects.count(),
+        'popular_locations': facets['locations'][:8],
+        'property_types': facets['property_types'][:10],
+        'total_listings': facets['total'],
         'default_image_url': get_default_image_url(),
 
     }
@@ -117,169 +121,101 @@ from django.db.models.functions import Cast, Substr
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 from django.core.exceptions import ValidationError
-from .models import Scrape_MakaziListing, ContactMessage
+from .models import Location, Scrape_MakaziListing, ContactMessage, parse_price
 from .forms import ContactForm
+from .search import search_queryset
+from .similarity import get_similar_items
+from .facets import get_listing_facets, location_counts
+from .geo import anear_queryset, near_queryset
+from .pagination import (
+    CachedCountPaginator, KeysetPaginator, KEYSET_ORDERINGS, clamp_per_page,
+)
 import re
 
-def extract_numeric_price(price_str):
-    """Extract numeric value from price string"""
-    if not price_str:
-        return 0
-    
-    try:
-        # Remove all non-digit characters except commas
-        price_str = str(price_str).replace(',', '').strip()
-        # Extract first number found
-        numbers = re.findall(r'\d+', price_str)
-        if numbers:
-            return int(float(''.join(numbers)))
-        return 0
-    except (ValueError, TypeError):
-        return 0
+# Numbered ?page= links shown for keyset-capable sorts; past these the
+# listings are reached through cursor links only
+NUMBERED_PAGES = 5
 
+@cache_anonymous_page(Scrape_MakaziListing)
 def property_listings(request):
     """All listings with advanced filtering - FIXED VERSION"""
     
-    # Start with all listings
-    queryset = Scrape_MakaziListing.objects.all()
+    # Start with all listings still present in the feed
+    queryset = Scrape_MakaziListing.objects.filter(is_available=True)
     
     # Apply search filter
     search_query = request.GET.get('q', '').strip()
     if search_query:
-        queryset = queryset.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(location__icontains=search_query) |
-            Q(property_type__icontains=search_query)
-        )
-    
-    # Apply location filter
-    location = request.GET.get('location', '').strip()
-    if location:
-        queryset = queryset.filter(location__icontains=location)
-    
-    # Apply property type filter
-    property_type = request.GET.get('property_type', '').strip()
-    if property_type:
-        queryset = queryset.filter(property_type__iexact=property_type)
-    
-    # Apply bedrooms filter
-    bedrooms = request.GET.get('bedrooms', '').strip()
-    if bedrooms:
-        if bedrooms == '4':
-            # 4+ bedrooms
-            queryset = queryset.filter(bedrooms__gte=4)
-        else:
-            try:
-                bedrooms_num = int(bedrooms)
-                queryset = queryset.filter(bedrooms=bedrooms_num)
-            except ValueError:
-                pass
-    
-    # Apply price range filter
-    min_price = request.GET.get('min_price', '').strip()
-    max_price = request.GET.get('max_price', '').strip()
-    
-    if min_price or max_price:
-        # Create temporary numeric price field for filtering
-        listings_with_price = []
-        for listing in queryset:
-            price_num = extract_numeric_price(listing.price)
-            
-            # Check if price falls within range
-            include = True
-            if min_price:
-                try:
-                    min_val = int(min_price)
-                    if price_num < min_val:
-                        include = False
-                except ValueError:
-                    pass
-            
-            if max_price:
-                try:
-                    max_val = int(max_price)
-                    if price_num > max_val:
-                        include = False
-                except ValueError:
-                    pass
-            
-            if include:
-                listings_with_price.append(listing.id)
-        
-        queryset = queryset.filter(id__in=listings_with_price)
+        queryset = search_queryset(queryset, search_query)
     
-    # Apply featured filter
-    is_featured = request.GET.get('is_featured', '').strip()
-    if is_featured.lower() == 'true':
-        queryset = queryset.filter(is_featured=True)
+    # Location, type, bedroom, price range and flag filters; prices are
+    # compared as integers on the indexed price_value column
+    queryset = PropertyFilter(request.GET, queryset=queryset).qs
     
-    # Apply verified filter
-    is_verified = request.GET.get('is_verified', '').strip()
-    if is_verified.lower() == 'true':
-        queryset = queryset.filter(is_verified=True)
+    # Near a point (?lat=&lng= with ?radius= or ?nearest=), ordered by distance
+    queryset, near_point = near_queryset(queryset, request.GET)
     
-    # Apply has_images filter
-    has_images = request.GET.get('has_images', '').strip()
-    if has_images.lower() == 'true':
-        queryset = queryset.exclude(main_image_url='').exclude(main_image_url__isnull=True)
-    
-    # Apply sorting
-    sort_by = request.GET.get('sort', '-scraped_at')
+    # Apply sorting (searches default to relevance, point searches to distance)
+    default_sort = 'distance' if near_point else ('relevance' if search_query else '-scraped_at')
+    sort_by = request.GET.get('sort') or default_sort
     valid_sort_fields = ['-scraped_at', 'scraped_at', 'price', '-price', 'bedrooms', '-bedrooms', 'area_sqft', '-area_sqft']
     
-    if sort_by in valid_sort_fields:
+    if sort_by == 'relevance' and search_query:
+        pass
+    elif sort_by == 'distance' and near_point:
+        pass
+    elif sort_by in valid_sort_fields:
         if sort_by in ['price', '-price']:
-            # Custom sorting for price strings
-            listings_list = list(queryset)
-            listings_list.sort(
-                key=lambda x: extract_numeric_price(x.price),
-                reverse=(sort_by == '-price')
-            )
-            # Create a new queryset from sorted list
-            sorted_ids = [listing.id for listing in listings_list]
-            # Preserve order using MySQL FIELD function or Python
-            from django.db.models import Case, When
-            preserved = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(sorted_ids)])
-            queryset = Scrape_MakaziListing.objects.filter(id__in=sorted_ids).order_by(preserved)
+            # Sort on the parsed price column, not the display string
+            direction = '-' if sort_by == '-price' else ''
+            queryset = queryset.order_by(f'{direction}price_value', f'{direction}id')
         else:
             queryset = queryset.order_by(sort_by)
     else:
         queryset = queryset.order_by('-scraped_at')
     
-    # Pagination
-    per_page = request.GET.get('per_page', '12')
-    try:
-        per_page = int(per_page)
-    except ValueError:
-        per_page = 12
-    
-    paginator = Paginator(queryset, per_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Get unique values for filters
-    locations = Scrape_MakaziListing.objects.values_list(
-        'location', flat=True
-    ).distinct().exclude(location='').order_by('location')[:50]
-    
-    property_types = Scrape_MakaziListing.objects.values_list(
-        'property_type', flat=True
-    ).distinct().exclude(property_type='').order_by('property_type')
-    
-    # Get popular locations
-    popular_locations = Scrape_MakaziListing.objects.values(
-        'location'
-    ).annotate(
-        count=Count('id')
-    ).order_by('-count')[:10]
+    # Pagination: ?cursor= switches to keyset pages for date/price sorts,
+    # which stay fast however deep the visitor goes
+    per_page = clamp_per_page(request.GET.get('per_page'))
+    cursor = request.GET.get('cursor')
+    keyset_ordering = KEYSET_ORDERINGS.get(sort_by)
+    
+    previous_cursor = next_cursor = None
+    if cursor is not None and keyset_ordering:
+        paginator = KeysetPaginator(queryset, keyset_ordering, per_page)
+        page_obj = paginator.page(cursor)
+        page_links = []
+    else:
+        if keyset_ordering:
+            # Same order as the keyset pages, so the arrows can carry on
+            # from this page with a cursor instead of a deeper OFFSET
+            queryset = queryset.order_by(*keyset_ordering)
+        paginator = CachedCountPaginator(queryset, per_page)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+        page_links = [number for number in paginator.page_range
+                      if abs(number - page_obj.number) < 3]
+        if keyset_ordering:
+            previous_cursor, next_cursor = KeysetPaginator(
+                queryset, keyset_ordering, per_page).continue_from(page_obj)
+            page_links = [number for number in page_links if number <= NUMBERED_PAGES]
+    
+    # Get unique values for filters from the facet cache
+    facets = get_listing_facets()
+    locations = sorted(facet['location'] for facet in facets['locations'])[:50]
+    property_types = sorted(facet['property_type'] for facet in facets['property_types'])
     
     context = {
         'listings': page_obj,
         'locations': locations,
         'property_types': property_types,
-        'popular_locations': popular_locations,
-        'total_listings': queryset.count(),
+        'popular_locations': facets['locations'][:10],
+        'price_buckets': facets['price_buckets'],
+        'total_listings': paginator.count,
+        'cursor_pagination': isinstance(paginator, KeysetPaginator),
+        'previous_cursor': previous_cursor,
+        'next_cursor': next_cursor,
+        'page_links': page_links,
         'request': request,  # Pass request to template for filter display
     }
     
@@ -287,20 +223,41 @@ def property_listings(request):
 
 # Other functions remain the same...
 
+def split_slug_id(slug_id):
+    """Split "<slug>-<id>" into (slug, id); id is None for a bare slug"""
+    slug, _, tail = slug_id.rpartition('-')
+    if tail.isdigit():
+        return slug, int(tail)
+    return slug_id, None
+
+def listing_pk_from_slug(request, slug_id):
+    """Listing id embedded at the end of a detail slug"""
+    slug, listing_id = split_slug_id(slug_id)
+    return listing_id if listing_id is not None else f'slug:{slug}'
+
+def listing_last_modified(request, slug_id):
+    slug, listing_id = split_slug_id(slug_id)
+    lookup = {'pk': listing_id} if listing_id is not None else {'slug': slug}
+    return Scrape_MakaziListing.objects.filter(**lookup).values_list('scraped_at', flat=True).first()
+
+@cache_anonymous_page(Scrape_MakaziListing, object_pk=listing_pk_from_slug, last_modified=listing_last_modified)
 def property_detail(request, slug_id):
     """Property detail page"""
-    # Extract ID from slug
-    try:
-        listing_id = int(slug_id.split('-')[-1])
-        listing = get_object_or_404(Scrape_MakaziListing, id=listing_id)
-    except (ValueError, IndexError):
-        listing = get_object_or_404(Scrape_MakaziListing, slug_id=slug_id)
+    # "<slug>-<id>" resolves by primary key; a bare slug uses the slug index
+    slug, listing_id = split_slug_id(slug_id)
+    if listing_id is not None:
+        listing = get_object_or_404(Scrape_MakaziListing, pk=listing_id, is_available=True)
+    else:
+        listing = Scrape_MakaziListing.objects.filter(slug=slug, is_available=True).first()
+        if listing is None:
+            raise Http404("Listing not found")
+    
+    # Old or bare slugs redirect to the canonical URL
+    if listing.get_slug_id() != slug_id:
+        return redirect(listing, permanent=True)
     
-    # Get similar listings
-    similar_listings = Scrape_MakaziListing.objects.filter(
-        Q(location__icontains=listing.location.split(',')[0]) |
-        Q(property_type=listing.property_type)
-    ).exclude(id=listing.id).order_by('?')[:4]
+    # Get similar listings from the precomputed index
+    similar_listings = get_similar_items(listing, limit=4)
     
     # Parse price for display
     price_info = parse_price_info(listing.price)
@@ -335,19 +292,9 @@ def parse_price_info(price_str):
     if not price_str:
         return {'display': 'Bei: Tafadhali omba', 'numeric': 0}
     
-    price_str = str(price_str).lower()
-    
-    # Extract numbers
-    numbers = re.findall(r'[\d,]+', price_str)
-    if not numbers:
-        return {'display': price_str, 'numeric': 0}
-    
-    # Get the first number (usually the price)
-    num_str = numbers[0].replace(',', '')
-    try:
-        price_num = int(float(num_str))
-    except ValueError:
-        return {'display': price_str, 'numeric': 0}
+    price_num, period = parse_price(price_str)
+    if not price_num:
+        return {'display': str(price_str).lower(), 'numeric': 0}
     
     # Format for display
     if price_num >= 1000000000:
@@ -360,9 +307,9 @@ def parse_price_info(price_str):
         display = f"TSh {price_num:,}"
     
     # Add period if mentioned
-    if 'month' in price_str or 'mwezi' in price_str:
+    if period == 'month':
         display += "/mwezi"
-    elif 'year' in price_str or 'mwaka' in price_str:
+    elif period == 'year':
         display += "/mwaka"
     
     return {'display': display, 'numeric': price_num}
@@ -397,65 +344,124 @@ def contact_about_listing(request, listing_id):
     
     return JsonResponse({'success': False})
 
-@require_GET
-def filter_properties_api(request):
-    """API endpoint for filtering properties"""
-    filters = {}
-    
-    # Build filter dictionary
-    if request.GET.get('location'):
-        filters['location__icontains'] = request.GET.get('location')
-    if request.GET.get('property_type'):
-        filters['property_type'] = request.GET.get('property_type')
-    if request.GET.get('min_price'):
-        filters['price__gte'] = request.GET.get('min_price')
-    if request.GET.get('max_price'):
-        filters['price__lte'] = request.GET.get('max_price')
-    if request.GET.get('bedrooms'):
-        filters['bedrooms'] = request.GET.get('bedrooms')
-    
-    listings = Scrape_MakaziListing.objects.filter(**filters)[:20]
-    
-    data = []
-    for listing in listings:
-        data.append({
-            'id': listing.id,
-            'title': listing.title,
-            'price': listing.price,
-            'location': listing.location,
-            'image_url': listing.main_image_url or '',
-            'url': listing.get_absolute_url(),
-            'bedrooms': listing.bedrooms,
-            'property_type': listing.property_type,
+@async_api_view
+async def filter_properties_api(request):
+    """API endpoint for filtering properties, paginated with opaque cursors"""
+    # The location filter runs a lookup, so it is applied with the async ORM
+    # here rather than inside the (synchronous) FilterSet
+    params = request.GET.copy()
+    location = params.pop('location', [''])[-1]
+    queryset = PropertyFilter(
+        params, queryset=Scrape_MakaziListing.objects.filter(is_available=True)
+    ).qs
+    if location:
+        queryset = await Location.objects.afilter_area(queryset, location)
+    
+    # Point searches return the nearest listings with their distance
+    queryset, near_point = await anear_queryset(queryset, request.GET)
+    serializer = ListingSerializer(request.GET.get('fields'), distance=bool(near_point))
+    if near_point:
+        per_page = clamp_per_page(request.GET.get('per_page'), default=20)
+        listings = serializer.values(queryset)[:per_page]
+        return await aserialized_response(request, 'listings', listings, serializer, extra={
+            'point': near_point,
         })
     
-    return JsonResponse({'listings': data})
+    sort_by = request.GET.get('sort', '-scraped_at')
+    ordering = KEYSET_ORDERINGS.get(sort_by, KEYSET_ORDERINGS['-scraped_at'])
+    paginator = KeysetPaginator(
+        serializer.values(
+            queryset,
+            extra=[field.lstrip('-') for field in ordering],
+        ),
+        ordering,
+        clamp_per_page(request.GET.get('per_page'), default=20),
+    )
+    page = await paginator.apage(request.GET.get('cursor'))
+    
+    return await aserialized_response(request, 'listings', page.object_list, serializer, extra={
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'total': await paginator.acount(),
+    })
 
-@require_GET
-def search_properties_api(request):
+@async_api_view
+async def search_properties_api(request):
     """API endpoint for search"""
     query = request.GET.get('q', '')
     if not query:
         return JsonResponse({'results': []})
     
-    listings = Scrape_MakaziListing.objects.filter(
-        Q(title__icontains=query) |
-        Q(description__icontains=query) |
-        Q(location__icontains=query) |
-        Q(property_type__icontains=query)
-    )[:10]
-    
-    results = []
-    for listing in listings:
-        results.append({
-            'id': listing.id,
-            'title': listing.title,
-            'price': listing.price,
-            'location': listing.location,
-            'url': listing.get_absolute_url(),
-        })
+    serializer = ListingSearchSerializer(request.GET.get('fields'))
+    listings = serializer.values(search_queryset(
+        Scrape_MakaziListing.objects.filter(is_available=True), query
+    ))[:10]
     
-    return JsonResponse({'results': results})
+    return await aserialized_response(request, 'results', listings, serializer)
+
+
+@require_GET
+def autocomplete_api(request):
+    """Search-as-you-type suggestions from the in-memory autocomplete index"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+
+    suggestions = suggest(query, limit) if len(query) >= 2 else []
+    response = JsonResponse({'query': query, 'suggestions': suggestions})
+    # Same prefix, same answer: let browsers and proxies reuse it
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
+
+def default_image_response():
+    default = get_default_image_url()
+    if default.startswith('data:'):
+        header, data = default.split(',', 1)
+        return HttpResponse(base64.b64decode(data), content_type=header[5:].split(';')[0])
+    return redirect(default)
+
+
+@require_GET
+def listing_thumbnail(request, pk):
+    """Local thumbnail of a listing's scraped image, or the original while it is fetched"""
+    row = Scrape_MakaziListing.objects.filter(pk=pk).values(
+        'main_image_url', 'thumbnail_hash', 'thumbnail_source'
+    ).first()
+    if row is None:
+        raise Http404("Listing not found")
+
+    digest = ensure_thumbnail(row)
+    if digest:
+        response = redirect('makazi:thumbnail_file', digest=digest)
+        patch_cache_control(response, public=True, max_age=60 * 60)
+        return response
+
+    url = row['main_image_url']
+    if url and urlsplit(url).scheme in ('http', 'https') and row['thumbnail_source'] != url:
+        # The original image until the background fetch has stored ours
+        response = HttpResponseRedirect(url)
+    else:
+        response = default_image_response()
+    # Retry soon: the fetch may still be running
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+@require_GET
+def thumbnail_file(request, digest):
+    """A stored thumbnail; the name is its SHA-256, so it can be cached forever"""
+    if not re.fullmatch(r'[0-9a-f]{64}', digest):
+        raise Http404("Unknown thumbnail")
+    try:
+        file = default_storage.open(thumbnail_storage_name(digest), 'rb')
+    except FileNotFoundError:
+        raise Http404("Unknown thumbnail")
+    response = FileResponse(file, content_type='image/jpeg')
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
 
 def dashboard(request):
     """Admin dashboard"""
@@ -482,12 +488,14 @@ def dashboard(request):
 # makazi/views.py - Ongeza baada ya dashboard function
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Apartment, ApartmentBooking, ApartmentReview
+from .models import Apartment, ApartmentBooking, ApartmentReview, with_amenities
 from .forms import ApartmentFilterForm, ApartmentBookingForm, ApartmentReviewForm
+from .geo import near_queryset
 
+@cache_anonymous_page(Apartment)
 def apartments_list(request):
     """List all apartments with filtering"""
     apartments = Apartment.objects.filter(is_available=True)
@@ -499,12 +507,12 @@ def apartments_list(request):
     if filter_form.is_valid():
         data = filter_form.cleaned_data
         
-        # Location filter
+        # Location filter: the area hierarchy, or the address text
         if data.get('location'):
-            apartments = apartments.filter(
-                Q(location__icontains=data['location']) |
-                Q(address__icontains=data['location'])
-            )
+            area = Location.objects.subtree_filter(data['location'])
+            if area is None:
+                area = Q(location__icontains=data['location'])
+            apartments = apartments.filter(area | Q(address__icontains=data['location']))
         
         # Apartment type filter
         if data.get('apartment_type'):
@@ -530,26 +538,33 @@ def apartments_list(request):
         
         # Amenities filter
         if data.get('amenities'):
-            for amenity in data['amenities']:
-                apartments = apartments.filter(amenities__contains=amenity)
+            apartments = with_amenities(apartments, data['amenities'])
+    
+    # Near a point (?lat=&lng= with ?radius= or ?nearest=), ordered by distance
+    apartments, near_point = near_queryset(apartments, request.GET)
     
     # Sorting
-    sort_by = request.GET.get('sort', '-created_at')
+    sort_by = request.GET.get('sort') or ('distance' if near_point else '-created_at')
     valid_sorts = ['price_per_month', '-price_per_month', 'created_at', '-created_at', 
                    'bedrooms', '-bedrooms', 'area_sqft', '-area_sqft']
     
-    if sort_by in valid_sorts:
+    if sort_by == 'distance' and near_point:
+        pass
+    elif sort_by == '-avg_rating':
+        apartments = apartments.order_by('-avg_rating', '-rating_count', '-created_at')
+    elif sort_by in valid_sorts:
         apartments = apartments.order_by(sort_by)
     else:
         apartments = apartments.order_by('-created_at')
     
+    # One query loads the galleries of each page of cards
+    apartments = apartments.prefetch_related('gallery')
+    
     # Get featured apartments
     featured_apartments = apartments.filter(is_featured=True)[:3]
     
     # Get popular locations
-    popular_locations = Apartment.objects.values('location').annotate(
-        count=Count('id')
-    ).order_by('-count')[:10]
+    popular_locations = location_counts(Apartment.objects.all())[:10]
     
     # Pagination
     paginator = Paginator(apartments, 12)
@@ -569,17 +584,14 @@ def apartments_list(request):
 
 def apartment_detail(request, pk):
     """Apartment detail page with booking form"""
-    apartment = get_object_or_404(Apartment, pk=pk, is_available=True)
+    apartment = get_object_or_404(Apartment.objects.prefetch_related('gallery'), pk=pk, is_available=True)
     
-    # Get similar apartments
-    similar_apartments = Apartment.objects.filter(
-        Q(location__icontains=apartment.location) |
-        Q(apartment_type=apartment.apartment_type)
-    ).exclude(id=apartment.id).filter(is_available=True).order_by('?')[:4]
+    # Get similar apartments from the precomputed index
+    similar_apartments = get_similar_items(apartment, limit=4)
     
-    # Get reviews
+    # Latest reviews; the average covers every approved review
     reviews = apartment.reviews.filter(is_approved=True).order_by('-created_at')[:10]
-    average_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+    average_rating = apartment.avg_rating
     
     # Booking form
     booking_form = ApartmentBookingForm()
@@ -637,7 +649,9 @@ def apartment_detail(request, pk):
 @login_required
 def my_bookings(request):
     """View user's bookings"""
-    bookings = ApartmentBooking.objects.filter(customer_email=request.user.email).order_by('-booking_date')
+    bookings = ApartmentBooking.objects.filter(customer_email=request.user.email).order_by(
+        '-booking_date'
+    ).select_related('apartment').prefetch_related('apartment__gallery')
     
     context = {
         'bookings': bookings,
@@ -645,7 +659,8 @@ def my_bookings(request):
     
     return render(request, 'apartments/my_bookings.html', context)
 
-def apartment_search(request):
+@async_api_view
+async def apartment_search(request):
     """Search apartments API"""
     query = request.GET.get('q', '')
     location = request.GET.get('location', '')
@@ -653,32 +668,18 @@ def apartment_search(request):
     apartments = Apartment.objects.filter(is_available=True)
     
     if query:
-        apartments = apartments.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(location__icontains=query)
-        )
+        apartments = search_queryset(apartments, query)
     
     if location:
-        apartments = apartments.filter(location__icontains=location)
+        apartments = await Location.objects.afilter_area(apartments, location)
+    
+    apartments, near_point = await anear_queryset(apartments, request.GET)
     
     # Limit results
-    apartments = apartments[:10]
-    
-    data = []
-    for apartment in apartments:
-        data.append({
-            'id': apartment.id,
-            'title': apartment.title,
-            'location': apartment.location,
-            'price': float(apartment.price_per_month),
-            'type': apartment.get_apartment_type_display(),
-            'bedrooms': apartment.bedrooms,
-            'image': apartment.main_image.url if apartment.main_image else '',
-            'url': f"/apartments/{apartment.id}/"
-        })
+    serializer = ApartmentSerializer(request.GET.get('fields'), distance=bool(near_point))
+    apartments = serializer.values(apartments)[:10]
     
-    return JsonResponse({'apartments': data})
+    return await aserialized_response(request, 'apartments', apartments, serializer)
 
 # Ongeza URLs za apartments kwenye urls.py
 
@@ -687,12 +688,13 @@ def apartment_search(request):
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Avg, Count
+from django.db.models import Q, Count, prefetch_related_objects
 from django.core.paginator import Paginator
 from django.http import JsonResponse
-from .models import Hostel, HostelBooking, HostelReview  # ONDOA 'Room' KUTOKA HAPA
+from .models import Hostel, HostelBooking, HostelReview, with_amenities  # ONDOA 'Room' KUTOKA HAPA
 from .forms import HostelBookingForm, HostelReviewForm, HostelFilterForm
 
+@cache_anonymous_page(Hostel)
 def hostels_list(request):
     """List all hostels with filtering"""
     hostels = Hostel.objects.filter(is_available=True)
@@ -728,18 +730,27 @@ def hostels_list(request):
         
         # Amenities filter
         if data.get('amenities'):
-            for amenity in data['amenities']:
-                hostels = hostels.filter(amenities__contains=amenity)
+            hostels = with_amenities(hostels, data['amenities'])
+    
+    # Near a point, e.g. a campus (?lat=&lng= with ?radius= or ?nearest=)
+    hostels, near_point = near_queryset(hostels, request.GET)
     
     # Sorting
-    sort_by = request.GET.get('sort', '-created_at')
+    sort_by = request.GET.get('sort') or ('distance' if near_point else '-created_at')
     valid_sorts = ['price_per_semester', '-price_per_semester', 'created_at', '-created_at']
     
-    if sort_by in valid_sorts:
+    if sort_by == 'distance' and near_point:
+        pass
+    elif sort_by == '-avg_overall':
+        hostels = hostels.order_by('-avg_overall', '-rating_count', '-created_at')
+    elif sort_by in valid_sorts:
         hostels = hostels.order_by(sort_by)
     else:
         hostels = hostels.order_by('-created_at')
     
+    # One query loads the galleries of each page of cards
+    hostels = hostels.prefetch_related('gallery')
+    
     # Get featured hostels
     featured_hostels = hostels.filter(is_featured=True)[:3]
     
@@ -766,24 +777,22 @@ def hostels_list(request):
 
 def hostel_detail(request, pk):
     """Hostel detail page with booking form"""
-    hostel = get_object_or_404(Hostel, pk=pk, is_available=True)
+    hostel = get_object_or_404(Hostel.objects.prefetch_related('gallery'), pk=pk, is_available=True)
     
-    # Get similar hostels (ONDOA 'available_rooms' QUERY)
-    similar_hostels = Hostel.objects.filter(
-        Q(university__icontains=hostel.university) |
-        Q(location__icontains=hostel.location)
-    ).exclude(id=hostel.id).filter(is_available=True).order_by('?')[:3]
+    # Get similar hostels from the precomputed index
+    similar_hostels = get_similar_items(hostel, limit=3)
+    prefetch_related_objects(similar_hostels, 'gallery')
     
-    # Get reviews
+    # Latest reviews; the averages cover every approved review
     reviews = hostel.reviews.filter(is_approved=True).order_by('-created_at')[:10]
     
-    # Calculate average ratings
+    # Stored averages (see makazi/ratings.py)
     avg_ratings = {
-        'overall': reviews.aggregate(Avg('overall_rating'))['overall_rating__avg'] or 0,
-        'cleanliness': reviews.aggregate(Avg('cleanliness'))['cleanliness__avg'] or 0,
-        'security': reviews.aggregate(Avg('security'))['security__avg'] or 0,
-        'facilities': reviews.aggregate(Avg('facilities'))['facilities__avg'] or 0,
-        'management': reviews.aggregate(Avg('management'))['management__avg'] or 0,
+        'overall': hostel.avg_overall,
+        'cleanliness': hostel.avg_cleanliness,
+        'security': hostel.avg_security,
+        'facilities': hostel.avg_facilities,
+        'management': hostel.avg_management,
     }
     
     # Booking form
@@ -827,13 +836,9 @@ def hostel_detail(request, pk):
                 if request.user.is_authenticated:
                     booking.student = request.user
                 
+                # Occupancy is counted by HostelBooking.save once the booking is confirmed
                 booking.save()
                 
-                # Update hostel occupancy
-                hostel.current_occupancy += 1
-                hostel.available_rooms = max(0, hostel.total_rooms - (hostel.current_occupancy // 4))
-                hostel.save()
-                
                 messages.success(request, 'Booking submitted successfully! Please complete payment within 2 weeks.')
                 return redirect('makazi:booking_confirmation', booking_id=booking.id)
         
@@ -868,7 +873,7 @@ def my_bookings(request):
     bookings = HostelBooking.objects.filter(
         Q(student_email=request.user.email) |
         Q(student=request.user)
-    ).order_by('-booking_date')
+    ).order_by('-booking_date').select_related('hostel').prefetch_related('hostel__gallery')
     
     context = {'bookings': bookings}
     return render(request, 'hostels/my_bookings.html', context)
@@ -914,7 +919,8 @@ def university_hostels(request, university_name):
     
     return render(request, 'hostels/university_hostels.html', context)
 
-def search_hostels(request):
+@async_api_view
+async def search_hostels(request):
     """AJAX search for hostels"""
     query = request.GET.get('q', '')
     university = request.GET.get('university', '')
@@ -922,27 +928,15 @@ def search_hostels(request):
     hostels = Hostel.objects.filter(is_available=True)
     
     if query:
-        hostels = hostels.filter(
-            Q(name__icontains=query) |
-            Q(location__icontains=query) |
-            Q(description__icontains=query)
-        )
+        hostels = search_queryset(hostels, query)
     
     if university:
         hostels = hostels.filter(university__icontains=university)
     
-    hostels = hostels[:10]
-    
-    data = []
-    for hostel in hostels:
-        data.append({
-            'id': hostel.id,
-            'name': hostel.name,
-            'university': hostel.university,
-            'location': hostel.location,
-            'price_per_semester': float(hostel.price_per_semester),
-            'available_rooms': hostel.available_rooms,
-            'hostel_type': hostel.get_hostel_type_display(),
-        })
+    # e.g. ?lat=-6.7795&lng=39.2040&radius=2 for hostels near a campus
+    hostels, near_point = await anear_queryset(hostels, request.GET)
+    
+    serializer = HostelSerializer(request.GET.get('fields'), distance=bool(near_point))
+    hostels = serializer.values(hostels)[:10]
     
-    return JsonResponse({'hostels': data})
\ No newline at end of file
+    return await aserialized_response(request, 'hostels', hostels, serializer)
\ No newline at end of file
@@ -3,6 +3,18 @@ ASGI config for nyumbafasta project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The Procfile serves it with uvicorn workers under gunicorn:
+
+    gunicorn nyumbafasta.asgi:application -k uvicorn_worker.UvicornWorker --workers 2
+
+The JSON search/filter endpoints are async views, so each worker can keep
+many of them in flight; the HTML pages still run as sync views in Django's
+thread pool. That only holds while every MIDDLEWARE entry is async-capable
+(hence makazi.middleware.AsyncWhiteNoiseMiddleware): one sync-only
+middleware makes Django run the whole chain in a thread per request.
+
+Locally: ``uvicorn nyumbafasta.asgi:application --reload``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
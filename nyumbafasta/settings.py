@@ -28,7 +28,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Every middleware here must be async-capable, or the ASGI worker runs
+    # the async API views through a thread per request (see asgi.py)
+    'makazi.middleware.AsyncWhiteNoiseMiddleware',
+    'makazi.instrumentation.RequestMetricsMiddleware',  # Server-Timing + query budgets
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -41,7 +44,8 @@ ROOT_URLCONF = 'nyumbafasta.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to RequestMetricsMiddleware
+        'BACKEND': 'makazi.instrumentation.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -100,9 +104,89 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Card/gallery/full WebP and JPEG variants of uploaded images
+# (makazi/images.py), made by IMAGE_WORKERS threads per process after the
+# upload is saved. `manage.py generate_image_variants` backfills them.
+IMAGE_VARIANTS_ASYNC = True
+IMAGE_WORKERS = 2
+
+# Similar items (makazi/similarity.py): an object without stored neighbours
+# shows a bounded same-region fallback, and its neighbours are recomputed
+# by a worker thread after the response. `manage.py rebuild_similar
+# --missing` backfills every such object.
+SIMILAR_ASYNC = True
+
+# Autocomplete (makazi/autocomplete.py): changes to indexed phrases rebuild
+# the in-memory index in a worker thread while the old one is served
+AUTOCOMPLETE_ASYNC = True
+
+# Local thumbnails of scraped listing images (makazi/thumbnails.py): how
+# many images are downloaded at once, and how long a download may take
+THUMBNAIL_WORKERS = 8
+THUMBNAIL_FETCH_TIMEOUT = 10
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Africa/Dar_es_Salaam'
 USE_I18N = True
 USE_TZ = True
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Full-text search backend; defaults to SQLite FTS5 (see makazi/search.py)
+# SEARCH_BACKEND = 'makazi.search.SQLiteFTSBackend'
+
+# Cache for rendered pages, facet counts and paginator counts. Pages are
+# invalidated by bumping version keys stored here, so every process must
+# share it: the web workers and the management commands (import_makazi,
+# reconcile_occupancy, fetch_thumbnails, ...) that change rows in bulk.
+# The file cache is shared by the processes of one host; use Redis or
+# Memcached across hosts. A per-process backend such as LocMemCache only
+# suits a single process that never runs those commands.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+# The tests run against a LocMemCache (makazi/test_runner.py), so they
+# never clear or invalidate the cache above
+TEST_RUNNER = 'makazi.test_runner.MakaziTestRunner'
+
+# Request metrics (makazi/instrumentation.py): Server-Timing header (only
+# while DEBUG, as it shows visitors the site's internals), one
+# 'makazi.metrics' log line per request and query budgets per view name.
+# The per-request line is logged at DEBUG, or as a warning past
+# SLOW_REQUEST_MS. Over-budget views log a warning; set QUERY_BUDGET_RAISE
+# = True in test settings to make them raise QueryBudgetExceeded instead.
+# Detail pages include the first-view similar items fallback.
+SERVER_TIMING = DEBUG
+SLOW_REQUEST_MS = 500
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGETS = {
+    'makazi:home': 10,
+    'makazi:listings': 10,
+    'makazi:property_detail': 14,
+    'makazi:apartments_list': 14,
+    'makazi:apartment_detail': 13,
+    'makazi:hostels_list': 10,
+    'makazi:hostel_detail': 13,
+    'makazi:filter_api': 3,
+    'makazi:search_api': 2,
+    'makazi:apartment_search': 2,
+    'makazi:search_hostels': 2,
+    'makazi:listing_thumbnail': 1,
+    'makazi:thumbnail_file': 0,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'makazi.metrics': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}